@@ -0,0 +1,72 @@
+"""
+Background Analysis - Multi-PV search of the displayed position on a worker thread.
+
+The search runs on its own copy of the GameState, so the GUI can keep moving
+through the game while it thinks. Each line is published as soon as it is found,
+and the same Searcher (and transposition table) is kept across positions.
+"""
+
+import threading
+
+import ChessEngine
+import ChessSearch
+
+DEFAULT_LINES = 3
+MAX_DEPTH = 8
+
+
+class BackgroundAnalysis:
+    """Analyses one position at a time; start() on a new position replaces the old search"""
+
+    def __init__(self, lines=DEFAULT_LINES, max_depth=MAX_DEPTH):
+        self.lines = lines
+        self.max_depth = max_depth
+        self.searcher = ChessSearch.Searcher()
+        self.thread = None
+        self.result = None  # Latest SearchResult, replaced as a whole by the worker
+        self.white_to_move = True
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, gs):
+        """Begin analysing a copy of gs"""
+        self.stop()
+        position = ChessEngine.GameState()
+        position.restoreSnapshot(gs.getSnapshot())
+        self.white_to_move = position.whiteToMove
+        self.result = None
+        limits = ChessSearch.SearchLimits(depth=self.max_depth, multipv=self.lines)
+        self.thread = threading.Thread(target=self.run, args=(position, limits), daemon=True)
+        self.thread.start()
+
+    def run(self, position, limits):
+        self.result = self.searcher.search(position, limits, self.publish)
+
+    def publish(self, result):
+        self.result = result
+
+    def stop(self):
+        """Stop the running search and wait for the worker to exit"""
+        while self.running:
+            # The worker may not have reached search() (which clears the flag) yet
+            self.searcher.stop()
+            self.thread.join(0.01)
+        self.thread = None
+
+    def white_lines(self):
+        """Current (score from white's view, pv) lines and their depth"""
+        result = self.result
+        if result is None:
+            return [], 0
+        sign = 1 if self.white_to_move else -1
+        return [(sign * score, pv) for score, pv in result.lines], result.depth
+
+
+def format_score(score):
+    """Short score label from white's view, e.g. +0.35 or #-3"""
+    if ChessSearch.is_mate_score(score):
+        moves = (ChessSearch.MATE_SCORE - abs(score) + 1) // 2
+        return f"#{moves}" if score > 0 else f"#-{moves}"
+    return f"{score / 100:+.2f}"
@@ -0,0 +1,294 @@
+"""
+Analysis Server - Engine evaluations for other tools over a local socket.
+
+Clients send one JSON object per line and get one back per request, matched by
+"id" (responses to one connection can arrive out of order):
+
+    {"id": 1, "cmd": "analyse", "fen": "<fen>", "moves": ["e2e4"], "depth": 6}
+    {"id": 1, "ok": true, "best": "e7e5", "score": -20, "depth": 6, "pv": [...], "lines": [...],
+     "nodes": 5123, "cached": false, "coalesced": false, "ms": 412.7}
+    {"id": 2, "cmd": "stats"}
+
+"fen" defaults to the start position, and "movetime" (ms) can replace "depth";
+"multipv" asks for several ranked lines. Searches run on a pool of worker
+processes, each keeping its Searcher (and transposition table) between jobs.
+A request for a position (FEN and moves) and limit that is already being
+searched waits for that search instead of starting another one, and finished
+results are kept in an LRU cache. The event loop itself only parses requests;
+even replaying the moves happens in the worker, so stats and cache hits are
+answered immediately however busy the workers are.
+
+    python ChessAnalysisServer.py --port 8765 --workers 4
+    python ChessAnalysisServer.py --unix /tmp/chess-analysis.sock
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import socket
+import time
+from collections import OrderedDict, deque
+
+import ChessEngine
+import ChessSearch
+import ChessTime
+
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 10000  # Results
+MAX_DEPTH = 12
+MAX_MOVETIME = 60000  # ms
+MAX_PENDING = 1000  # Distinct searches queued or running before requests are turned away
+LATENCY_WINDOW = 10000  # Most recent requests the percentiles are taken over
+MAX_LINE = 1 << 20  # Longest request line, in bytes
+
+_searcher = None  # The worker process's Searcher
+
+
+def _init_worker():
+    global _searcher
+    _searcher = ChessSearch.Searcher(time_manager=ChessTime.TimeManager())
+
+
+def search_job(fen, moves, depth, movetime, multipv):
+    """Search a position in a worker process; returns a JSON-ready dict"""
+    gs = load_position(fen, moves)
+    limits = ChessSearch.SearchLimits(depth=depth, movetime=movetime, multipv=multipv)
+    result = _searcher.search(gs, limits)
+    return {
+        'best': result.best_move.getUciNotation() if result.best_move else None,
+        'score': result.score,
+        'depth': result.depth,
+        'pv': [move.getUciNotation() for move in result.pv],
+        'lines': [{'score': score, 'pv': [move.getUciNotation() for move in pv]} for score, pv in result.lines],
+        'nodes': result.nodes,
+    }
+
+
+def load_position(fen, moves):
+    """GameState for a FEN (None for the start position) and the moves played from it"""
+    gs = ChessEngine.GameState()
+    if fen:
+        gs.loadFen(fen)
+    for notation in moves:
+        # Promotions always make a queen in GameState, so the suffix is ignored
+        move = gs.get_move_from_notation(notation[:4])
+        if move is None:
+            raise ValueError(f"illegal move {notation}")
+        gs.makeMove(move)
+    return gs
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ResultCache:
+    """Least recently used results by (fen, moves, limit, multipv)"""
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class AnalysisServer:
+    """Serves analyse and stats requests, searching on a process pool"""
+
+    def __init__(self, workers=None, cache_size=DEFAULT_CACHE_SIZE):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=_init_worker)
+        self.cache = ResultCache(cache_size)
+        self.pending = {}  # Cache key -> asyncio.Future of the search in progress
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.coalesced = 0
+        self.searches = 0
+        self.clients = set()  # Writers of the open connections
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None):
+        # Fork the workers before listening: a worker forked later would inherit the
+        # open connections and keep them from closing
+        await asyncio.get_running_loop().run_in_executor(self.pool, int)
+        if unix_path:
+            self.server = await asyncio.start_unix_server(self.handle_client, unix_path, limit=MAX_LINE)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE)
+        return self.server
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            for writer in list(self.clients):
+                writer.close()
+            await self.server.wait_closed()
+        self.pool.shutdown(cancel_futures=True)
+
+    async def handle_client(self, reader, writer):
+        """Read requests from one connection, answering each as soon as it is done"""
+        self.clients.add(writer)
+        tasks = set()
+        lock = asyncio.Lock()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break  # Reset, or a line longer than MAX_LINE
+                if not line:
+                    break
+                task = asyncio.ensure_future(self.answer(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def answer(self, line, writer, lock):
+        start = time.perf_counter()
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            command = request.get('cmd', 'analyse')
+            if command == 'analyse':
+                response = await self.analyse(request)
+                self.latencies.append((time.perf_counter() - start) * 1000)
+            elif command == 'stats':
+                response = self.stats()
+            else:
+                raise ValueError(f"unknown command {command}")
+            response['ok'] = True
+        except (ValueError, TypeError, KeyError) as e:  # JSONDecodeError is a ValueError
+            response = {'ok': False, 'error': str(e)}
+        except Exception as e:
+            response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        response['id'] = request_id
+        response['ms'] = round((time.perf_counter() - start) * 1000, 2)
+        async with lock:  # Responses from concurrent requests must not interleave
+            try:
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    async def analyse(self, request):
+        fen = request.get('fen') or None
+        moves = tuple(request.get('moves', []))
+        if not (fen is None or isinstance(fen, str)) or not all(isinstance(move, str) for move in moves):
+            raise TypeError("fen and moves must be strings")
+        multipv = max(1, min(int(request.get('multipv', 1)), 10))
+        if request.get('movetime') is not None:
+            movetime = max(1, min(int(request['movetime']), MAX_MOVETIME))
+            depth, limit = None, ('movetime', movetime)
+        else:
+            depth = max(1, min(int(request.get('depth', 4)), MAX_DEPTH))
+            movetime, limit = None, ('depth', depth)
+        # Replaying the moves costs move generation, so it is left to the worker
+        key = (fen, moves, limit, multipv)
+
+        self.requests += 1
+        cached = self.cache.get(key)
+        if cached is not None:
+            return dict(cached, cached=True, coalesced=False)
+        future = self.pending.get(key)
+        coalesced = future is not None
+        if coalesced:
+            self.coalesced += 1
+        else:
+            if len(self.pending) >= MAX_PENDING:
+                raise ValueError("busy: too many searches queued")
+            self.searches += 1
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.pool, search_job, fen, moves, depth, movetime, multipv)
+            self.pending[key] = future
+            future.add_done_callback(lambda done: self.finish(key, done))
+        # A client hanging up must not cancel a search others are waiting for
+        result = await asyncio.shield(future)
+        return dict(result, cached=False, coalesced=coalesced)
+
+    def finish(self, key, future):
+        self.pending.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key, future.result())
+
+    def stats(self):
+        ordered = sorted(self.latencies)
+        return {
+            'workers': self.workers,
+            'connections': len(self.clients),
+            # Searches beyond one per worker are waiting in the pool's queue
+            'queue': max(0, len(self.pending) - self.workers),
+            'running': min(len(self.pending), self.workers),
+            'requests': self.requests,
+            'searches': self.searches,
+            'coalesced': self.coalesced,
+            'cache': {'size': len(self.cache.entries), 'hits': self.cache.hits, 'misses': self.cache.misses},
+            'latency_ms': {name: round(percentile(ordered, fraction), 2)
+                           for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))},
+        }
+
+
+def query(request, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None, timeout=None):
+    """Send one request to a running server and wait for its response (for scripts)"""
+    if unix_path:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        connection.connect(unix_path)
+    else:
+        connection = socket.create_connection((host, port), timeout)
+    with connection, connection.makefile('rwb') as stream:
+        stream.write((json.dumps(request) + "\n").encode())
+        stream.flush()
+        return json.loads(stream.readline())
+
+
+async def serve(args):
+    server = AnalysisServer(args.workers, args.cache)
+    await server.start(args.host, args.port, args.unix)
+    where = args.unix or f"{args.host}:{args.port}"
+    print(f"Analysis server on {where} with {server.workers} workers")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve engine analysis over a local socket")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument('--workers', type=int, default=None, help="Search processes (default: one per CPU)")
+    parser.add_argument('--cache', type=int, default=DEFAULT_CACHE_SIZE, help="Results kept in the cache")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
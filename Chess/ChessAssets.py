@@ -0,0 +1,107 @@
+"""
+Piece Assets - Builds one sprite atlas of pre-scaled pieces per square size and caches it on disk.
+
+The atlas is a single row of 12 squares. Its cache file name contains the square
+size and a signature of the source images (names and mtimes), so editing or
+adding a piece image rebuilds it, and each board size is only scaled once.
+"""
+
+import hashlib
+import os
+
+import pygame as p
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(PACKAGE_DIR, "Images")
+CACHE_DIR = os.path.join(PACKAGE_DIR, ".cache")
+
+PIECES = ['wp', 'wR', 'wN', 'wB', 'wK', 'wQ', 'bp', 'bR', 'bN', 'bB', 'bK', 'bQ']
+
+_atlases = {}
+
+
+class PieceAtlas:
+    """All piece sprites for one square size on a single surface"""
+
+    def __init__(self, surface, size):
+        self.surface = surface
+        self.size = size
+        self.rects = {piece: p.Rect(i * size, 0, size, size) for i, piece in enumerate(PIECES)}
+
+    def blit(self, target, piece, dest):
+        """Draw a piece onto target at dest from its sub-rect of the atlas"""
+        target.blit(self.surface, dest, self.rects[piece])
+
+
+def image_path(piece):
+    return os.path.join(IMAGES_DIR, f"{piece}.png")
+
+
+def source_signature():
+    """Short hash of which source images exist and when they were last modified"""
+    digest = hashlib.sha1()
+    for piece in PIECES:
+        path = image_path(piece)
+        mtime = os.path.getmtime(path) if os.path.exists(path) else 0
+        digest.update(f"{piece}:{mtime};".encode())
+    return digest.hexdigest()[:12]
+
+
+def cache_path(size, signature):
+    return os.path.join(CACHE_DIR, f"pieces_{size}_{signature}.png")
+
+
+def load_atlas(size, fallback):
+    """
+    Get the atlas for a square size, from memory, the disk cache or by building it.
+    `fallback(piece, size)` draws a surface for pieces without an image.
+    Needs a display mode to be set (for convert_alpha).
+    """
+    signature = source_signature()
+    key = (size, signature)
+    if key in _atlases:
+        return _atlases[key]
+
+    path = cache_path(size, signature)
+    surface = None
+    if os.path.exists(path):
+        try:
+            surface = p.image.load(path).convert_alpha()
+        except p.error as e:
+            print(f"Ignoring unreadable atlas cache {path}: {e}")
+
+    if surface is None:
+        surface = build_atlas(size, fallback)
+        save_atlas(surface, size, path)
+
+    atlas = PieceAtlas(surface, size)
+    _atlases[key] = atlas
+    return atlas
+
+
+def build_atlas(size, fallback):
+    """Scale every piece image (or its fallback drawing) into a fresh atlas surface"""
+    surface = p.Surface((size * len(PIECES), size), p.SRCALPHA).convert_alpha()
+    for i, piece in enumerate(PIECES):
+        sprite = None
+        if os.path.exists(image_path(piece)):
+            try:
+                sprite = p.transform.scale(p.image.load(image_path(piece)).convert_alpha(), (size, size))
+            except p.error as e:
+                print(f"Failed to load {piece}.png: {e}")
+        if sprite is None:
+            sprite = fallback(piece, size)
+        surface.blit(sprite, (i * size, 0))
+    return surface
+
+
+def save_atlas(surface, size, path):
+    """Write the atlas to the cache, replacing stale atlases of the same size"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        for name in os.listdir(CACHE_DIR):
+            if name.startswith(f"pieces_{size}_") and name.endswith(".png"):
+                os.remove(os.path.join(CACHE_DIR, name))
+        p.image.save(surface, path)
+    except (OSError, p.error) as e:
+        print(f"Could not cache piece atlas: {e}")
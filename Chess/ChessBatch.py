@@ -0,0 +1,171 @@
+"""
+Batch Evaluation - Encodes many GameStates as NumPy arrays and scores them all at once.
+
+Boards become an (N, 64) int8 array of piece codes (square 0 is a8, as in
+GameState.board), or (N, 12, 64) one-hot planes for training. Material and
+piece-square terms are one table lookup over the whole batch. Mobility packs
+each board into uint64 bitboards and shifts all N of them one step at a time
+along every ray, so the Python overhead does not grow with N.
+
+NumPy is only needed by this module; the rest of the engine runs without it.
+"""
+
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import ChessEval
+
+# Piece code 0 is an empty square; 1-6 are white and 7-12 black pieces
+PIECES = ['--', 'wp', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bp', 'bN', 'bB', 'bR', 'bQ', 'bK']
+PIECE_CODES = {piece: code for code, piece in enumerate(PIECES)}
+
+MOBILITY_WEIGHT = 4  # Centipawns per reachable square for knights, bishops, rooks and queens
+
+KNIGHT_STEPS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+DIAGONALS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+LINES = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("Batch evaluation needs NumPy (pip install numpy)")
+
+
+def build_value_table():
+    """(13, 64) material + piece-square value of each piece code on each square, from white's view"""
+    table = np.zeros((len(PIECES), 64), dtype=np.int32)
+    for code, piece in enumerate(PIECES[1:], start=1):
+        color, kind = piece
+        for square in range(64):
+            r, c = divmod(square, 8)
+            if color == 'w':
+                table[code, square] = ChessEval.PIECE_VALUES[kind] + ChessEval.PIECE_SQUARE_TABLES[kind][r][c]
+            else:
+                table[code, square] = -(ChessEval.PIECE_VALUES[kind] + ChessEval.PIECE_SQUARE_TABLES[kind][7 - r][c])
+    return table
+
+
+_tables = {}
+
+
+def tables():
+    """Lookup tables, built on first use"""
+    require_numpy()
+    if not _tables:
+        _tables['values'] = build_value_table()
+        # Piece code for every 2-byte piece name read as a little-endian uint16
+        codes = np.zeros(1 << 16, dtype=np.int8)
+        for code, piece in enumerate(PIECES):
+            codes[int.from_bytes(piece.encode('ascii'), 'little')] = code
+        _tables['codes'] = codes
+        # Squares a piece can land on after moving dc columns, by dc
+        _tables['columns'] = {}
+        for dc in range(-2, 3):
+            columns = [c for c in range(8) if 0 <= c - dc < 8]
+            _tables['columns'][dc] = np.uint64(sum(1 << (r * 8 + c) for r in range(8) for c in columns))
+        _tables['popcount'] = np.array([bin(i).count('1') for i in range(256)], dtype=np.int32)
+    return _tables
+
+
+def encode_boards(states):
+    """(N, 64) int8 piece codes for a sequence of GameStates"""
+    t = tables()
+    # Join every row of every board in C, then look each 2-byte name up as one uint16
+    rows = chain.from_iterable(gs.board for gs in states)
+    names = np.frombuffer("".join(map("".join, rows)).encode('ascii'), dtype='<u2')
+    return t['codes'][names].reshape(len(states), 64)
+
+
+def encode_sides(states):
+    """(N,) bool array, True where white is to move"""
+    require_numpy()
+    return np.fromiter((gs.whiteToMove for gs in states), dtype=bool, count=len(states))
+
+
+def to_planes(codes):
+    """(N, 12, 64) int8 one-hot planes from (N, 64) piece codes"""
+    require_numpy()
+    return (codes[:, None, :] == np.arange(1, 13, dtype=np.int8)[None, :, None]).astype(np.int8)
+
+
+def material_and_position(codes):
+    """(N,) material plus piece-square score from white's view"""
+    values = tables()['values']
+    return values[codes, np.arange(64)].sum(axis=1)
+
+
+def bitboards(mask):
+    """(N,) uint64 with bit r * 8 + c set where mask (N, 64) is true"""
+    return np.packbits(mask, axis=1, bitorder='little').view('<u8').ravel()
+
+
+def popcount(bits):
+    if hasattr(np, 'bitwise_count'):  # NumPy 2.0+
+        return np.bitwise_count(bits).astype(np.int32)
+    return tables()['popcount'][bits.view(np.uint8).reshape(-1, 8)].sum(axis=1, dtype=np.int32)
+
+
+def shift(bits, dr, dc):
+    """Move every set bit dr rows and dc columns, dropping bits that leave the board"""
+    offset = dr * 8 + dc
+    moved = bits << np.uint64(offset) if offset > 0 else bits >> np.uint64(-offset)
+    return moved & tables()['columns'][dc]
+
+
+def slider_mobility(movers, free, empty, directions):
+    """
+    Squares reachable by the pieces in movers along directions, stopping at blockers.
+    Rays of one direction never overlap (a ray stops at the first piece), so counting
+    the union of all movers' rays per direction counts every piece's moves exactly.
+    """
+    count = np.zeros(len(movers), dtype=np.int32)
+    for dr, dc in directions:
+        rays = movers
+        for _ in range(7):
+            rays = shift(rays, dr, dc)
+            count += popcount(rays & free)
+            rays &= empty
+            if not rays.any():
+                break
+    return count
+
+
+def mobility(codes, white):
+    """(N,) pseudo-legal knight, bishop, rook and queen moves for one color (pins and checks ignored)"""
+    require_numpy()
+    base = 0 if white else 6
+    free = bitboards((codes <= base) | (codes > base + 6))  # Empty or enemy
+    empty = bitboards(codes == 0)
+    knights = bitboards(codes == base + 2)
+    diagonal = bitboards((codes == base + 3) | (codes == base + 5))
+    line = bitboards((codes == base + 4) | (codes == base + 5))
+
+    # Like rays, the squares one knight step away in a fixed direction never overlap
+    count = np.zeros(len(codes), dtype=np.int32)
+    for dr, dc in KNIGHT_STEPS:
+        count += popcount(shift(knights, dr, dc) & free)
+    count += slider_mobility(diagonal, free, empty, DIAGONALS)
+    count += slider_mobility(line, free, empty, LINES)
+    return count
+
+
+def evaluate_codes(codes, mobility_weight=MOBILITY_WEIGHT):
+    """(N,) int32 scores from white's view for (N, 64) piece codes"""
+    codes = np.asarray(codes)
+    score = material_and_position(codes)
+    if mobility_weight:
+        score += mobility_weight * (mobility(codes, True) - mobility(codes, False))
+    return score.astype(np.int32)
+
+
+def evaluate_states(states, mobility_weight=MOBILITY_WEIGHT):
+    """
+    (N,) scores from each side to move's point of view, like ChessEval.evaluate.
+    Pawn structure is left out; it depends on the pawn hash cache, not the array.
+    """
+    scores = evaluate_codes(encode_boards(states), mobility_weight)
+    return np.where(encode_sides(states), scores, -scores)
@@ -0,0 +1,356 @@
+"""
+Binary formats - 16-bit moves, 32-byte positions and a compact game archive.
+
+Moves pack the start square, end square and promotion piece into 16 bits
+(square = row * 8 + col, row 0 being the 8th rank as in GameState.board).
+
+Positions are 64 four-bit square codes, two squares per byte. Codes 0-12 are
+ChessBatch.PIECES; the rest fold the remaining state into the board:
+    13  rook that still has its castling right (colour from its rank)
+    14  pawn that can be captured en passant (colour from its rank)
+    15  black king, with black to move (12 means white is to move)
+
+A game archive is a header, a string table (player names etc.), a table of
+uint32 game offsets and then one fixed header plus the packed moves per game.
+GameArchive reads it in place: opening one only decodes the string table, and
+the offset table and move lists are memoryview slices of the file's buffer. Run from the Chess directory to convert archives:
+
+    python ChessBinary.py to-binary chess_games.json chess_games.bcg
+    python ChessBinary.py to-json chess_games.bcg chess_games.json
+    python ChessBinary.py from-pgn games.pgn games.bcg
+    python ChessBinary.py to-pgn games.bcg games.pgn
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta
+
+import ChessBatch
+import ChessEngine
+import ChessPgn
+
+MAGIC = b'BCGA'
+VERSION = 1
+ARCHIVE_HEADER = struct.Struct('<4sBxHI')  # magic, version, string count, game count
+GAME_HEADER = struct.Struct('<IqBxHHHH')  # id, date (us since epoch), result, white, black, duration, moves
+POSITION_SIZE = 32
+
+RESULTS = ["1-0", "0-1", "1/2-1/2", "*"]
+PROMOTIONS = ['', 'q', 'r', 'b', 'n']  # 4-bit promotion field of a packed move
+
+ROOK_WITH_CASTLING = 13
+ENPASSANT_PAWN = 14
+BLACK_KING_TO_MOVE = 15
+
+SQUARE_NAMES = [file + rank for rank in "87654321" for file in "abcdefgh"]
+SQUARES = {name: square for square, name in enumerate(SQUARE_NAMES)}
+# Rook corner -> CastleRights attribute
+CASTLING_ROOKS = {63: 'wks', 56: 'wqs', 7: 'bks', 0: 'bqs'}
+
+EPOCH = datetime(1970, 1, 1)
+
+
+# Moves
+
+def pack_move(notation):
+    """16-bit code for a move like 'e2e4' or 'e7e8q'"""
+    return (SQUARES[notation[:2]] | SQUARES[notation[2:4]] << 6
+            | PROMOTIONS.index(notation[4:5]) << 12)
+
+
+def unpack_move(code):
+    return SQUARE_NAMES[code & 63] + SQUARE_NAMES[code >> 6 & 63] + PROMOTIONS[code >> 12]
+
+
+def pack_move_object(move):
+    """16-bit code for a ChessEngine.Move (promotions are always to a queen)"""
+    return (move.startRow * 8 + move.startCol | (move.endRow * 8 + move.endCol) << 6
+            | (1 if move.isPawnPromotion else 0) << 12)
+
+
+def little_endian_bytes(typecode, values):
+    packed = array(typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def view_array(data, typecode):
+    """Little-endian integers in data, as a memoryview into it when the host is little-endian"""
+    if sys.byteorder == 'little':
+        return memoryview(data).cast('B').cast(typecode)
+    values = array(typecode, bytes(data))
+    values.byteswap()
+    return values
+
+
+def pack_moves(notations):
+    """Packed moves as little-endian bytes"""
+    return little_endian_bytes('H', (pack_move(notation) for notation in notations))
+
+
+def unpack_moves(data):
+    """uint16 codes from packed move bytes, without copying when the host is little-endian"""
+    return view_array(data, 'H')
+
+
+# Positions
+
+def pack_position(gs):
+    """32-byte encoding of the board, side to move, castling rights and en passant square"""
+    codes = [ChessBatch.PIECE_CODES[piece] for row in gs.board for piece in row]
+    for square, right in CASTLING_ROOKS.items():
+        rook = 'wR' if square >= 56 else 'bR'
+        if getattr(gs.currentCastlingRight, right) and codes[square] == ChessBatch.PIECE_CODES[rook]:
+            codes[square] = ROOK_WITH_CASTLING
+    if gs.enpassantPossible:
+        # The capturable pawn stands just past the square it skipped
+        row, col = gs.enpassantPossible
+        pawn_row = row + 1 if row == 2 else row - 1
+        if codes[pawn_row * 8 + col] in (ChessBatch.PIECE_CODES['wp'], ChessBatch.PIECE_CODES['bp']):
+            codes[pawn_row * 8 + col] = ENPASSANT_PAWN
+    if not gs.whiteToMove:
+        codes[codes.index(ChessBatch.PIECE_CODES['bK'])] = BLACK_KING_TO_MOVE
+    return bytes(codes[i] | codes[i + 1] << 4 for i in range(0, 64, 2))
+
+
+def position_codes(data):
+    """The 64 raw square codes of a packed position"""
+    view = memoryview(data)
+    codes = []
+    for byte in view[:POSITION_SIZE]:
+        codes.append(byte & 15)
+        codes.append(byte >> 4)
+    return codes
+
+
+def position_to_fen(data):
+    """FEN for a packed position (halfmove clock 0, move number 1)"""
+    codes = position_codes(data)
+    white_to_move = BLACK_KING_TO_MOVE not in codes
+    castling = ""
+    enpassant = "-"
+    pieces = []
+    for square, code in enumerate(codes):
+        if code == ROOK_WITH_CASTLING:
+            right = CASTLING_ROOKS.get(square)
+            if right:
+                castling += {'wks': 'K', 'wqs': 'Q', 'bks': 'k', 'bqs': 'q'}[right]
+            code = ChessBatch.PIECE_CODES['wR' if square >= 32 else 'bR']
+        elif code == ENPASSANT_PAWN:
+            row, col = divmod(square, 8)
+            white_pawn = row == 4
+            enpassant = SQUARE_NAMES[(row + 1 if white_pawn else row - 1) * 8 + col]
+            code = ChessBatch.PIECE_CODES['wp' if white_pawn else 'bp']
+        elif code == BLACK_KING_TO_MOVE:
+            code = ChessBatch.PIECE_CODES['bK']
+        pieces.append(ChessBatch.PIECES[code])
+
+    ranks = []
+    for row in range(8):
+        rank, empty = "", 0
+        for piece in pieces[row * 8:row * 8 + 8]:
+            if piece == "--":
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            letter = 'P' if piece[1] == 'p' else piece[1]
+            rank += letter if piece[0] == 'w' else letter.lower()
+        ranks.append(rank + (str(empty) if empty else ""))
+    castling = "".join(sorted(castling, key="KQkq".index)) or "-"
+    return f"{'/'.join(ranks)} {'w' if white_to_move else 'b'} {castling} {enpassant} 0 1"
+
+
+def unpack_position(data):
+    """GameState for a packed position"""
+    gs = ChessEngine.GameState()
+    gs.loadFen(position_to_fen(data))
+    return gs
+
+
+# Game archives
+
+def date_to_micros(date):
+    return (datetime.fromisoformat(date) - EPOCH) // timedelta(microseconds=1)
+
+
+def micros_to_date(micros):
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+def write_archive(games, path):
+    """Write games (dicts in the chess_games.json layout) as a binary archive"""
+    with open(path, 'wb') as f:
+        f.write(encode_archive(games))
+
+
+def encode_archive(games):
+    strings = []
+    string_ids = {}
+
+    def string_id(text):
+        if text not in string_ids:
+            string_ids[text] = len(strings)
+            strings.append(text)
+        return string_ids[text]
+
+    records = []
+    for game in games:
+        moves = game['moves']
+        header = GAME_HEADER.pack(game['id'], date_to_micros(game['date']), RESULTS.index(game['result']),
+                                  string_id(game['white_player']), string_id(game['black_player']),
+                                  string_id(game.get('duration', "Unknown")), len(moves))
+        records.append(header + pack_moves(moves))
+
+    # Strings longer than 255 bytes are cut short, on a character boundary so they still decode
+    table = b"".join(bytes([len(encoded)]) + encoded
+                     for encoded in (text.encode('utf-8')[:255].decode('utf-8', 'ignore').encode('utf-8')
+                                     for text in strings))
+    table += bytes(-(ARCHIVE_HEADER.size + len(table)) % 4)  # Align the offset table
+
+    offsets = []
+    offset = ARCHIVE_HEADER.size + len(table) + 4 * len(records)
+    for record in records:
+        offsets.append(offset)
+        offset += len(record)
+    return (ARCHIVE_HEADER.pack(MAGIC, VERSION, len(strings), len(games)) + table
+            + little_endian_bytes('I', offsets) + b"".join(records))
+
+
+class GameArchive:
+    """Read-only view of a binary archive held in a bytes-like object (e.g. an mmap)"""
+
+    def __init__(self, data):
+        self.view = memoryview(data).cast('B')
+        magic, version, string_count, game_count = ARCHIVE_HEADER.unpack_from(self.view, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a game archive (or an unsupported version)")
+
+        offset = ARCHIVE_HEADER.size
+        self.strings = []
+        for _ in range(string_count):
+            length = self.view[offset]
+            self.strings.append(bytes(self.view[offset + 1:offset + 1 + length]).decode('utf-8'))
+            offset += 1 + length
+
+        offset += -offset % 4
+        self.offsets = view_array(self.view[offset:offset + 4 * game_count], 'I')  # Offset of every game header
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.game(index)
+
+    def header(self, index):
+        """(id, date, result, white, black, duration, move count) of one game"""
+        game_id, micros, result, white, black, duration, count = GAME_HEADER.unpack_from(self.view, self.offsets[index])
+        return (game_id, micros_to_date(micros), RESULTS[result],
+                self.strings[white], self.strings[black], self.strings[duration], count)
+
+    def move_codes(self, index):
+        """Packed uint16 moves of one game, as a view into the archive where possible"""
+        start = self.offsets[index] + GAME_HEADER.size
+        count = GAME_HEADER.unpack_from(self.view, self.offsets[index])[-1]
+        return unpack_moves(self.view[start:start + 2 * count])
+
+    def game(self, index):
+        """One game as a dict in the chess_games.json layout"""
+        game_id, date, result, white, black, duration, count = self.header(index)
+        return {
+            'id': game_id,
+            'date': date,
+            'white_player': white,
+            'black_player': black,
+            'moves': [unpack_move(code) for code in self.move_codes(index)],
+            'result': result,
+            'move_count': count,
+            'duration': duration,
+        }
+
+
+# Converters
+
+def json_to_archive(json_path, archive_path):
+    with open(json_path, 'r') as f:
+        games = json.load(f)
+    write_archive(games, archive_path)
+    return len(games)
+
+
+def archive_to_json(archive_path, json_path):
+    games = list(GameArchive.open(archive_path))
+    with open(json_path, 'w') as f:
+        json.dump(games, f, indent=2)
+    return len(games)
+
+
+def pgn_to_archive(pgn_path, archive_path):
+    games = []
+    for index, parsed in enumerate(ChessPgn.read_pgn(pgn_path)):
+        headers = parsed['headers']
+        try:
+            date = datetime.strptime(headers.get('Date', ""), "%Y.%m.%d").isoformat()
+        except ValueError:
+            date = datetime.now().isoformat()
+        games.append({
+            'id': index + 1,
+            'date': date,
+            'white_player': headers.get('White', "Human"),
+            'black_player': headers.get('Black', "Human"),
+            'moves': parsed['moves'],
+            'result': parsed['result'] if parsed['result'] in RESULTS else "*",
+            'move_count': len(parsed['moves']),
+            'duration': "Unknown",
+        })
+    write_archive(games, archive_path)
+    return len(games)
+
+
+def archive_to_pgn(archive_path, pgn_path):
+    archive = GameArchive.open(archive_path)
+    with open(pgn_path, 'w') as f:
+        for game in archive:
+            headers = {
+                'Date': datetime.fromisoformat(game['date']).strftime("%Y.%m.%d"),
+                'White': game['white_player'],
+                'Black': game['black_player'],
+            }
+            f.write(ChessPgn.game_to_pgn(game['moves'], game['result'], headers) + "\n\n")
+    return len(archive)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert saved games to and from the binary archive format")
+    parser.add_argument('command', choices=['to-binary', 'to-json', 'from-pgn', 'to-pgn'])
+    parser.add_argument('source')
+    parser.add_argument('target')
+    args = parser.parse_args()
+
+    convert = {
+        'to-binary': json_to_archive,
+        'to-json': archive_to_json,
+        'from-pgn': pgn_to_archive,
+        'to-pgn': archive_to_pgn,
+    }[args.command]
+    start = time.time()
+    count = convert(args.source, args.target)
+    print(f"Converted {count} games in {time.time() - start:.3f}s: "
+          f"{os.path.getsize(args.source)} -> {os.path.getsize(args.target)} bytes")
+
+
+if __name__ == "__main__":
+    main()
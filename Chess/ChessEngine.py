@@ -2,7 +2,38 @@
 Chess Engine - Stores game state, validates moves, and provides helpers for PGN/saved game loading.
 """
 
+import random
+
+# Zobrist keys: one random 64-bit number per piece/square, side, castling state and en passant file
+_zobristRandom = random.Random(20250815)
+ZOBRIST_PIECES = {color + kind: [[_zobristRandom.getrandbits(64) for c in range(8)] for r in range(8)]
+                  for color in 'wb' for kind in 'pNBRQK'}
+ZOBRIST_BLACK_TO_MOVE = _zobristRandom.getrandbits(64)
+ZOBRIST_CASTLING = [_zobristRandom.getrandbits(64) for i in range(16)]
+ZOBRIST_ENPASSANT = [_zobristRandom.getrandbits(64) for c in range(8)]
+
+# Piece values for static exchange evaluation; the king is only ever the last capturer
+SEE_PIECE_VALUES = {'p': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 20000}
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+DIAGONAL_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+ORTHOGONAL_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+def castlingKey(rights):
+    return ZOBRIST_CASTLING[rights.wks | rights.bks << 1 | rights.wqs << 2 | rights.bqs << 3]
+
+
+def enpassantKey(square):
+    return ZOBRIST_ENPASSANT[square[1]] if square else 0
+
+
 class GameState():
+    # Slots keep a game (and every Move and CastleRights in its logs) small when many are hosted at once
+    __slots__ = ('board', 'whiteToMove', 'moveLog', 'whiteKingLocation', 'blackKingLocation', 'checkMate',
+                 'staleMate', 'currentCastlingRight', 'castleRightsLog', 'enpassantPossible',
+                 'enpassantPossibleLog', 'halfmoveClock', 'halfmoveClockLog', 'zobristKey', 'zobristLog',
+                 'positionCounts', 'pawnKey', 'pawnKeyLog')
+
     def __init__(self):
         self.board = [
             ["bR","bN","bB","bQ","bK","bB","bN","bR"],
@@ -24,8 +55,34 @@ class GameState():
         self.currentCastlingRight = CastleRights(True, True, True, True)
         self.castleRightsLog = [CastleRights(True, True, True, True)]
         self.enpassantPossible = ()
+        self.enpassantPossibleLog = [()]
+
+        # Position hashes and the 50-move counter, one entry per ply like the logs above
+        self.halfmoveClock = 0
+        self.halfmoveClockLog = [0]
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = [self.zobristKey]
+        self.positionCounts = {self.zobristKey: 1}
+        self.pawnKey = self.computePawnKey()
+        self.pawnKeyLog = [self.pawnKey]
 
     def makeMove(self, move):
+        key = self.zobristKey ^ ZOBRIST_BLACK_TO_MOVE ^ castlingKey(self.currentCastlingRight) \
+            ^ enpassantKey(self.enpassantPossible)
+        key ^= ZOBRIST_PIECES[move.pieceMoved][move.startRow][move.startCol]
+        pawnKey = self.pawnKey
+        if move.pieceMoved[1] == 'p':
+            pawnKey ^= ZOBRIST_PIECES[move.pieceMoved][move.startRow][move.startCol]
+            if not move.isPawnPromotion:
+                pawnKey ^= ZOBRIST_PIECES[move.pieceMoved][move.endRow][move.endCol]
+        if move.pieceCaptured != '--':
+            captureRow = move.startRow if move.isEnpassantMove else move.endRow
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][captureRow][move.endCol]
+            if move.pieceCaptured[1] == 'p':
+                pawnKey ^= ZOBRIST_PIECES[move.pieceCaptured][captureRow][move.endCol]
+        self.pawnKey = pawnKey
+        self.pawnKeyLog.append(pawnKey)
+
         self.board[move.startRow][move.startCol] = "--"
         self.board[move.endRow][move.endCol] = move.pieceMoved
         self.moveLog.append(move)
@@ -39,13 +96,19 @@ class GameState():
         if move.isPawnPromotion:
             self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'
 
+        key ^= ZOBRIST_PIECES[self.board[move.endRow][move.endCol]][move.endRow][move.endCol]
+
         if move.isCastleMove:
             if move.endCol - move.startCol == 2:
                 self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1]
                 self.board[move.endRow][move.endCol+1] = '--'
+                rookFrom, rookTo = move.endCol+1, move.endCol-1
             else:
                 self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2]
                 self.board[move.endRow][move.endCol-2] = '--'
+                rookFrom, rookTo = move.endCol-2, move.endCol+1
+            rook = self.board[move.endRow][rookTo]
+            key ^= ZOBRIST_PIECES[rook][move.endRow][rookFrom] ^ ZOBRIST_PIECES[rook][move.endRow][rookTo]
 
         if move.isEnpassantMove:
             self.board[move.startRow][move.endCol] = '--'
@@ -56,10 +119,25 @@ class GameState():
             self.enpassantPossible = ()
 
         self.updateCastleRights(move)
-        self.castleRightsLog.append(CastleRights(self.currentCastlingRight.wks,
-                                                 self.currentCastlingRight.bks,
-                                                 self.currentCastlingRight.wqs,
-                                                 self.currentCastlingRight.bqs))
+        rights = self.currentCastlingRight
+        logged = self.castleRightsLog[-1]
+        if rights.wks == logged.wks and rights.bks == logged.bks and rights.wqs == logged.wqs \
+                and rights.bqs == logged.bqs:
+            self.castleRightsLog.append(logged)  # Logged rights are never changed, so unchanged ones are shared
+        else:
+            self.castleRightsLog.append(CastleRights(rights.wks, rights.bks, rights.wqs, rights.bqs))
+        self.enpassantPossibleLog.append(self.enpassantPossible)
+
+        key ^= castlingKey(self.currentCastlingRight) ^ enpassantKey(self.enpassantPossible)
+        self.zobristKey = key
+        self.zobristLog.append(key)
+        self.positionCounts[key] = self.positionCounts.get(key, 0) + 1
+
+        if move.pieceMoved[1] == 'p' or move.pieceCaptured != '--':
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
 
     def undoMove(self):
         if len(self.moveLog) != 0:
@@ -74,6 +152,7 @@ class GameState():
                 self.blackKingLocation = (move.startRow, move.startCol)
 
             if move.isEnpassantMove:
+                self.board[move.endRow][move.endCol] = '--'
                 self.board[move.startRow][move.endCol] = move.pieceCaptured
 
             if move.isCastleMove:
@@ -85,11 +164,215 @@ class GameState():
                     self.board[move.endRow][move.endCol+1] = '--'
 
             self.castleRightsLog.pop()
-            self.currentCastlingRight = self.castleRightsLog[-1]
+            # Copy so the next makeMove can't mutate the logged rights in place
+            rights = self.castleRightsLog[-1]
+            self.currentCastlingRight = CastleRights(rights.wks, rights.bks, rights.wqs, rights.bqs)
+
+            self.enpassantPossibleLog.pop()
+            self.enpassantPossible = self.enpassantPossibleLog[-1]
+
+            key = self.zobristLog.pop()
+            if self.positionCounts[key] == 1:
+                del self.positionCounts[key]
+            else:
+                self.positionCounts[key] -= 1
+            self.zobristKey = self.zobristLog[-1]
+
+            self.halfmoveClockLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog[-1]
+
+            self.pawnKeyLog.pop()
+            self.pawnKey = self.pawnKeyLog[-1]
 
             self.checkMate = False
             self.staleMate = False
 
+    def makeNullMove(self):
+        """
+        Pass the turn without moving (for null-move pruning in the search). The logs get
+        an entry like a real move so moves made from here undo correctly; the position
+        is not counted for repetitions. Must be taken back with undoNullMove.
+        """
+        self.whiteToMove = not self.whiteToMove
+        self.zobristKey ^= ZOBRIST_BLACK_TO_MOVE ^ enpassantKey(self.enpassantPossible)
+        self.enpassantPossible = ()
+        self.enpassantPossibleLog.append(())
+        rights = self.currentCastlingRight
+        self.castleRightsLog.append(CastleRights(rights.wks, rights.bks, rights.wqs, rights.bqs))
+        self.zobristLog.append(self.zobristKey)
+        self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        self.pawnKeyLog.append(self.pawnKey)
+
+    def undoNullMove(self):
+        self.whiteToMove = not self.whiteToMove
+        self.enpassantPossibleLog.pop()
+        self.enpassantPossible = self.enpassantPossibleLog[-1]
+        self.castleRightsLog.pop()
+        self.zobristLog.pop()
+        self.zobristKey = self.zobristLog[-1]
+        self.halfmoveClockLog.pop()
+        self.halfmoveClock = self.halfmoveClockLog[-1]
+        self.pawnKeyLog.pop()
+
+    def computeZobristKey(self):
+        """Hash the position from scratch (makeMove keeps zobristKey up to date incrementally)"""
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][r][c]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key ^ castlingKey(self.currentCastlingRight) ^ enpassantKey(self.enpassantPossible)
+
+    def computePawnKey(self):
+        """Hash of the pawns alone, used to cache pawn-structure evaluation"""
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece == 'wp' or piece == 'bp':
+                    key ^= ZOBRIST_PIECES[piece][r][c]
+        return key
+
+    def repetitionCount(self):
+        """How many times the current position has occurred (irreversible moves change the key)"""
+        return self.positionCounts.get(self.zobristKey, 0)
+
+    def isThreefoldRepetition(self):
+        return self.repetitionCount() >= 3
+
+    def isFiftyMoveRule(self):
+        return self.halfmoveClock >= 100
+
+    def isInsufficientMaterial(self):
+        """Neither side can mate: bare kings, a single minor piece, or bishops on one colour"""
+        minors = []
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece == "--" or piece[1] == 'K':
+                    continue
+                if piece[1] in 'pRQ':
+                    return False
+                minors.append((piece[1], (r + c) % 2))
+        if len(minors) <= 1:
+            return True
+        return all(kind == 'B' for kind, _ in minors) and len({shade for _, shade in minors}) == 1
+
+    def getDrawReason(self):
+        """Name of the draw rule that ends the game here, or None"""
+        if self.isThreefoldRepetition():
+            return "threefold repetition"
+        if self.isFiftyMoveRule():
+            return "50-move rule"
+        if self.isInsufficientMaterial():
+            return "insufficient material"
+        return None
+
+    def getSnapshot(self):
+        """Capture the current position so it can be restored without replaying moves"""
+        return Snapshot(self)
+
+    def restoreSnapshot(self, snapshot):
+        """Return to a position captured by getSnapshot"""
+        self.board = [list(row) for row in snapshot.board]
+        self.whiteToMove = snapshot.whiteToMove
+        self.moveLog = list(snapshot.moveLog)
+        self.whiteKingLocation = snapshot.whiteKingLocation
+        self.blackKingLocation = snapshot.blackKingLocation
+        self.castleRightsLog = [CastleRights(*rights) for rights in snapshot.castleRightsLog]
+        rights = self.castleRightsLog[-1]
+        self.currentCastlingRight = CastleRights(rights.wks, rights.bks, rights.wqs, rights.bqs)
+        self.enpassantPossibleLog = list(snapshot.enpassantPossibleLog)
+        self.enpassantPossible = self.enpassantPossibleLog[-1]
+        self.halfmoveClockLog = list(snapshot.halfmoveClockLog)
+        self.halfmoveClock = self.halfmoveClockLog[-1]
+        self.zobristLog = list(snapshot.zobristLog)
+        self.zobristKey = self.zobristLog[-1]
+        self.pawnKeyLog = list(snapshot.pawnKeyLog)
+        self.pawnKey = self.pawnKeyLog[-1]
+        self.positionCounts = {}
+        for key in self.zobristLog:
+            self.positionCounts[key] = self.positionCounts.get(key, 0) + 1
+        self.checkMate = False
+        self.staleMate = False
+
+    def loadFen(self, fen):
+        """Set up the position described by a FEN string"""
+        fields = fen.split()
+        placement = fields[0]
+        self.board = []
+        for rank in placement.split('/'):
+            row = []
+            for ch in rank:
+                if ch.isdigit():
+                    row.extend(["--"] * int(ch))
+                else:
+                    row.append(('w' if ch.isupper() else 'b') + (ch.upper() if ch.lower() != 'p' else 'p'))
+            self.board.append(row)
+        if len(self.board) != 8 or any(len(row) != 8 for row in self.board):
+            raise ValueError(f"Invalid FEN placement: {placement}")
+
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] == 'wK':
+                    self.whiteKingLocation = (r, c)
+                elif self.board[r][c] == 'bK':
+                    self.blackKingLocation = (r, c)
+
+        self.whiteToMove = len(fields) < 2 or fields[1] == 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        self.currentCastlingRight = CastleRights('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling)
+        self.castleRightsLog = [CastleRights('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling)]
+        enpassant = fields[3] if len(fields) > 3 else '-'
+        if enpassant != '-':
+            self.enpassantPossible = (Move.ranksToRows[enpassant[1]], Move.filesToCols[enpassant[0]])
+        else:
+            self.enpassantPossible = ()
+        self.enpassantPossibleLog = [self.enpassantPossible]
+        self.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = [self.zobristKey]
+        self.positionCounts = {self.zobristKey: 1}
+        self.pawnKey = self.computePawnKey()
+        self.pawnKeyLog = [self.pawnKey]
+        self.moveLog = []
+        self.checkMate = False
+        self.staleMate = False
+
+    def getFen(self):
+        """Describe the current position as a FEN string"""
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                letter = 'P' if piece[1] == 'p' else piece[1]
+                rank += letter if piece[0] == 'w' else letter.lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        rights = self.currentCastlingRight
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + \
+                   ("k" if rights.bks else "") + ("q" if rights.bqs else "")
+        enpassant = "-"
+        if self.enpassantPossible:
+            r, c = self.enpassantPossible
+            enpassant = Move.colsToFiles[c] + Move.rowsToRanks[r]
+        fullmove = len(self.moveLog) // 2 + 1
+        return f"{'/'.join(ranks)} {'w' if self.whiteToMove else 'b'} {castling or '-'} {enpassant} {self.halfmoveClock} {fullmove}"
+
     def updateCastleRights(self, move):
         if move.pieceMoved == 'wK':
             self.currentCastlingRight.wks = False
@@ -162,14 +445,75 @@ class GameState():
 
     def squareUnderAttack(self, r, c):
         """Check if square (r,c) is under attack by enemy"""
-        self.whiteToMove = not self.whiteToMove  # Switch to opponent's turn
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove  # Switch back
+        # Look outwards from the square instead of generating every enemy move
+        return self.leastValuableAttacker(r, c, not self.whiteToMove, ()) is not None
 
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c:
-                return True
-        return False
+    def staticExchangeEvaluation(self, move):
+        """
+        Material (centipawns) the mover wins with a capture once all recaptures on the
+        target square are played out, each side stopping when going on would lose.
+        Attackers uncovered behind sliders (x-rays) join in; the board is not changed.
+        """
+        removed = {(move.startRow, move.startCol)}
+        if move.isEnpassantMove:
+            removed.add((move.startRow, move.endCol))
+        captured = SEE_PIECE_VALUES[move.pieceCaptured[1]] if move.pieceCaptured != '--' else 0
+        return captured - self.exchangeGain(move.endRow, move.endCol, not self.whiteToMove,
+                                            move.pieceMoved, removed)
+
+    def exchangeGain(self, r, c, byWhite, piece=None, removed=()):
+        """
+        Best material one side wins by capturing the piece on (r, c) and exchanging on
+        from there, or 0 if it is better not to capture. Squares in `removed` are treated
+        as empty, and `piece` stands in for what is on (r, c).
+        """
+        piece = piece or self.board[r][c]
+        removed = set(removed)
+        captures = []  # Value of the piece taken by each capture in turn
+        value = SEE_PIECE_VALUES[piece[1]]
+        white = byWhite
+        while True:
+            attacker = self.leastValuableAttacker(r, c, white, removed)
+            if attacker is None:
+                break
+            ar, ac, kind = attacker
+            if kind == 'K' and self.leastValuableAttacker(r, c, not white, removed | {(ar, ac)}):
+                break  # The king can't capture onto a defended square
+            captures.append(value)
+            value = SEE_PIECE_VALUES[kind]
+            removed.add((ar, ac))
+            white = not white
+        gain = 0
+        for value in reversed(captures):
+            gain = max(0, value - gain)
+        return gain
+
+    def leastValuableAttacker(self, r, c, white, removed):
+        """(row, col, kind) of the cheapest piece of one color attacking (r, c), looking through removed squares"""
+        color = 'w' if white else 'b'
+        pawnRow = r + 1 if white else r - 1
+        if 0 <= pawnRow < 8:
+            for pc in (c - 1, c + 1):
+                if 0 <= pc < 8 and self.board[pawnRow][pc] == color + 'p' and (pawnRow, pc) not in removed:
+                    return pawnRow, pc, 'p'
+        for dr, dc in KNIGHT_OFFSETS:
+            nr, nc = r + dr, c + dc
+            if 0 <= nr < 8 and 0 <= nc < 8 and self.board[nr][nc] == color + 'N' and (nr, nc) not in removed:
+                return nr, nc, 'N'
+
+        best = None
+        for directions, sliders in ((DIAGONAL_DIRECTIONS, 'BQ'), (ORTHOGONAL_DIRECTIONS, 'RQ')):
+            for dr, dc in directions:
+                nr, nc, distance = r + dr, c + dc, 1
+                while 0 <= nr < 8 and 0 <= nc < 8:
+                    piece = self.board[nr][nc]
+                    if piece != "--" and (nr, nc) not in removed:
+                        if piece[0] == color and (piece[1] in sliders or (piece[1] == 'K' and distance == 1)):
+                            if best is None or SEE_PIECE_VALUES[piece[1]] < SEE_PIECE_VALUES[best[2]]:
+                                best = (nr, nc, piece[1])
+                        break
+                    nr, nc, distance = nr + dr, nc + dc, distance + 1
+        return best
 
     def getAllPossibleMoves(self):
         moves = []
@@ -338,7 +682,28 @@ class GameState():
         return None
 
 
+class Snapshot():
+    """Immutable copy of a GameState position, including the logs undoMove relies on"""
+    def __init__(self, gs):
+        self.board = tuple(tuple(row) for row in gs.board)
+        self.whiteToMove = gs.whiteToMove
+        self.moveLog = tuple(gs.moveLog)
+        self.whiteKingLocation = gs.whiteKingLocation
+        self.blackKingLocation = gs.blackKingLocation
+        self.castleRightsLog = tuple((r.wks, r.bks, r.wqs, r.bqs) for r in gs.castleRightsLog)
+        self.enpassantPossibleLog = tuple(gs.enpassantPossibleLog)
+        self.halfmoveClockLog = tuple(gs.halfmoveClockLog)
+        self.zobristLog = tuple(gs.zobristLog)
+        self.pawnKeyLog = tuple(gs.pawnKeyLog)
+
+    @property
+    def ply(self):
+        return len(self.moveLog)
+
+
 class CastleRights():
+    __slots__ = ('wks', 'bks', 'wqs', 'bqs')
+
     def __init__(self, wks, bks, wqs, bqs):
         self.wks = wks
         self.bks = bks
@@ -353,6 +718,8 @@ class Move():
     filesToCols = {"a":0, "b":1,"c":2,"d":3,
                    "e":4, "f":5,"g":6,"h":7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured', 'isPawnPromotion',
+                 'isCastleMove', 'isEnpassantMove', 'moveID')
 
     def __init__(self, startSq, endSq, board, isCastleMove=False, isEnpassantMove=False):
         self.startRow = startSq[0]
@@ -372,6 +739,10 @@ class Move():
     def getChessNotation(self):
         return self.getRankFile(self.startRow,self.startCol) + self.getRankFile(self.endRow, self.endCol)
 
+    def getUciNotation(self):
+        """Long algebraic notation with the promotion piece, e.g. 'e7e8q'"""
+        return self.getChessNotation() + ('q' if self.isPawnPromotion else '')
+
     def getRankFile(self,r,c):
         return self.colsToFiles[c] + self.rowsToRanks[r]
 
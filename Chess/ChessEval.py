@@ -0,0 +1,113 @@
+"""
+Chess Evaluation - Static evaluation of a GameState in centipawns.
+
+Piece values and piece-square tables are replaced by tuned ones from
+eval_weights.json (written by ChessTune.py) when that file exists.
+"""
+
+import json
+import os
+
+import ChessEngine
+import ChessPawns
+
+WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_weights.json")
+
+PIECE_VALUES = {'p': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+
+# Piece-square tables from white's point of view, row 0 is the 8th rank
+# (same orientation as GameState.board). Black mirrors them vertically.
+PIECE_SQUARE_TABLES = {
+    'p': [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [50, 50, 50, 50, 50, 50, 50, 50],
+        [10, 10, 20, 30, 30, 20, 10, 10],
+        [5, 5, 10, 25, 25, 10, 5, 5],
+        [0, 0, 0, 20, 20, 0, 0, 0],
+        [5, -5, -10, 0, 0, -10, -5, 5],
+        [5, 10, 10, -20, -20, 10, 10, 5],
+        [0, 0, 0, 0, 0, 0, 0, 0],
+    ],
+    'N': [
+        [-50, -40, -30, -30, -30, -30, -40, -50],
+        [-40, -20, 0, 0, 0, 0, -20, -40],
+        [-30, 0, 10, 15, 15, 10, 0, -30],
+        [-30, 5, 15, 20, 20, 15, 5, -30],
+        [-30, 0, 15, 20, 20, 15, 0, -30],
+        [-30, 5, 10, 15, 15, 10, 5, -30],
+        [-40, -20, 0, 5, 5, 0, -20, -40],
+        [-50, -40, -30, -30, -30, -30, -40, -50],
+    ],
+    'B': [
+        [-20, -10, -10, -10, -10, -10, -10, -20],
+        [-10, 0, 0, 0, 0, 0, 0, -10],
+        [-10, 0, 5, 10, 10, 5, 0, -10],
+        [-10, 5, 5, 10, 10, 5, 5, -10],
+        [-10, 0, 10, 10, 10, 10, 0, -10],
+        [-10, 10, 10, 10, 10, 10, 10, -10],
+        [-10, 5, 0, 0, 0, 0, 5, -10],
+        [-20, -10, -10, -10, -10, -10, -10, -20],
+    ],
+    'R': [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [5, 10, 10, 10, 10, 10, 10, 5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [0, 0, 0, 5, 5, 0, 0, 0],
+    ],
+    'Q': [
+        [-20, -10, -10, -5, -5, -10, -10, -20],
+        [-10, 0, 0, 0, 0, 0, 0, -10],
+        [-10, 0, 5, 5, 5, 5, 0, -10],
+        [-5, 0, 5, 5, 5, 5, 0, -5],
+        [0, 0, 5, 5, 5, 5, 0, -5],
+        [-10, 5, 5, 5, 5, 5, 0, -10],
+        [-10, 0, 5, 0, 0, 0, 0, -10],
+        [-20, -10, -10, -5, -5, -10, -10, -20],
+    ],
+    'K': [
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-20, -30, -30, -40, -40, -30, -30, -20],
+        [-10, -20, -20, -20, -20, -20, -20, -10],
+        [20, 20, 0, 0, 0, 0, 20, 20],
+        [20, 30, 10, 0, 0, 10, 30, 20],
+    ],
+}
+
+
+def evaluate(gs):
+    """Score the position in centipawns from the side to move's point of view"""
+    score = ChessPawns.evaluate_pawns(gs)
+    for r, row in enumerate(gs.board):
+        for c, piece in enumerate(row):
+            if piece == "--":
+                continue
+            kind = piece[1]
+            if piece[0] == 'w':
+                score += PIECE_VALUES[kind] + PIECE_SQUARE_TABLES[kind][r][c]
+            else:
+                score -= PIECE_VALUES[kind] + PIECE_SQUARE_TABLES[kind][7 - r][c]
+    return score if gs.whiteToMove else -score
+
+
+def load_weights(path=WEIGHTS_PATH):
+    """Use the piece values and piece-square tables from a weights file"""
+    with open(path, 'r') as f:
+        weights = json.load(f)
+    PIECE_VALUES.update(weights['piece_values'])
+    for kind, table in weights['piece_square_tables'].items():
+        PIECE_SQUARE_TABLES[kind][:] = [list(row) for row in table]
+    # Exchanges (and so sacrifice sounds) are counted with the same values; the king stays priceless
+    for kind, value in weights['piece_values'].items():
+        if kind != 'K':
+            ChessEngine.SEE_PIECE_VALUES[kind] = value
+
+
+if os.path.exists(WEIGHTS_PATH):
+    load_weights()
@@ -0,0 +1,89 @@
+"""
+Opening Explorer - Moves played from every position of the saved games, keyed by Zobrist key.
+
+Each game is replayed once when it is added; every position it passes through
+gets the move played from it counted under the game's result. Looking a
+position up is a single dict access, so it is cheap enough to do every frame.
+Saved games were legal when they were recorded, so they are replayed without
+generating the legal moves for every ply.
+"""
+
+import ChessBinary
+import ChessEngine
+
+RESULT_INDEX = {"1-0": 0, "1/2-1/2": 1, "0-1": 2}  # Anything else counts as unfinished (3)
+
+
+class MoveStats:
+    """How one move from one position scored, as shown by the explorer"""
+
+    def __init__(self, move, counts):
+        self.move = move
+        self.games = sum(counts)
+        decided = counts[0] + counts[1] + counts[2]
+        self.white = 100 * counts[0] / decided if decided else 0.0
+        self.draw = 100 * counts[1] / decided if decided else 0.0
+        self.black = 100 * counts[2] / decided if decided else 0.0
+
+
+def trusted_move(gs, notation):
+    """Move for 'e2e4' style notation without checking that it is legal"""
+    start = (ChessEngine.Move.ranksToRows[notation[1]], ChessEngine.Move.filesToCols[notation[0]])
+    end = (ChessEngine.Move.ranksToRows[notation[3]], ChessEngine.Move.filesToCols[notation[2]])
+    piece = gs.board[start[0]][start[1]]
+    if piece == "--":
+        return None
+    castle = piece[1] == 'K' and abs(end[1] - start[1]) == 2
+    enpassant = piece[1] == 'p' and start[1] != end[1] and gs.board[end[0]][end[1]] == "--"
+    return ChessEngine.Move(start, end, gs.board, isCastleMove=castle, isEnpassantMove=enpassant)
+
+
+class OpeningExplorer:
+    """Zobrist key -> {move notation: [white wins, draws, black wins, unfinished]}"""
+
+    def __init__(self, max_plies=None):
+        self.max_plies = max_plies  # None indexes every position of every game
+        self.positions = {}
+        self.game_count = 0
+
+    def add_games(self, games):
+        """Index games in the chess_games.json layout"""
+        for game in games:
+            self.add_game(game['moves'], game['result'])
+
+    def add_archive(self, archive):
+        """Index every game of a ChessBinary.GameArchive"""
+        for index in range(len(archive)):
+            result = archive.header(index)[2]
+            self.add_game([ChessBinary.unpack_move(code) for code in archive.move_codes(index)], result)
+
+    def add_game(self, moves, result, weight=1):
+        """Count one game (weight -1 takes it back out again)"""
+        column = RESULT_INDEX.get(result, 3)
+        gs = ChessEngine.GameState()
+        for notation in moves[:self.max_plies]:
+            move = trusted_move(gs, notation)
+            if move is None:
+                break
+            moves_played = self.positions.setdefault(gs.zobristKey, {})
+            counts = moves_played.setdefault(notation, [0, 0, 0, 0])
+            counts[column] += weight
+            if not any(counts):
+                # No game plays this move (or reaches this position) any more
+                del moves_played[notation]
+                if not moves_played:
+                    del self.positions[gs.zobristKey]
+            gs.makeMove(move)
+        self.game_count += weight
+
+    def remove_game(self, moves, result):
+        self.add_game(moves, result, weight=-1)
+
+    def lookup(self, key):
+        """MoveStats for every move played from the position with this key, most played first"""
+        moves_played = self.positions.get(key)
+        if not moves_played:
+            return []
+        stats = [MoveStats(notation, counts) for notation, counts in moves_played.items()]
+        stats.sort(key=lambda stat: -stat.games)
+        return stats
@@ -0,0 +1,416 @@
+"""
+Game Server - Hosts many concurrent human games over a local socket, without a GUI.
+
+Clients send one JSON object per line and get one back per request, in order;
+events for the games a connection has joined are pushed in between:
+
+    {"cmd": "create", "white": "Alice", "black": "Bob", "tc": "5+3"}
+        -> {"ok": true, "game": 7, "white_token": "...", "black_token": "..."}
+    {"cmd": "join", "game": 7, "token": "..."}         (no token: join as a spectator)
+    {"cmd": "move", "game": 7, "token": "...", "move": "e2e4"}
+    {"cmd": "resign" | "draw", "game": 7, "token": "..."}   (draw offers, or accepts an offer)
+    {"cmd": "state", "game": 7}  {"cmd": "stats"}
+    pushed: {"event": "move", "game": 7, "move": "e2e4", "ply": 1, "clock": [298.2, 300.0]}
+            {"event": "end", "game": 7, "result": "1-0", "reason": "checkmate"}
+
+Moves are validated and games decided by GameState's rules (checkmate,
+stalemate, repetition, 50 moves, insufficient material) plus resignation,
+agreed draws and ChessTime clocks, whose flag falls on a timer scheduled for
+the side to move, so no game is polled. Each game keeps only its GameState
+and clock; the GameState of a finished game is dropped at once. Finished
+games are appended to a JSON-lines game store (one chess_games.json record
+per line) in batches, written from a thread so the event loop never waits on
+the disk.
+
+    python ChessGameServer.py --port 8766 --store hosted_games.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import socket
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import ChessEngine
+import ChessTime
+
+DEFAULT_PORT = 8766
+DEFAULT_STORE = "hosted_games.jsonl"
+BATCH_SIZE = 200  # Finished games written to the store at once
+FLUSH_INTERVAL = 5.0  # Seconds a finished game waits at most before it is written
+FINISHED_KEPT = 1000  # Results of recently finished games still answered by state
+MAX_BUFFER = 1 << 20  # Bytes of unsent events after which a connection is dropped
+MAX_LINE = 1 << 16
+
+
+def notation_id(notation):
+    """Move.moveID of a move like 'e2e4' (a promotion suffix is ignored: GameState always makes a queen)"""
+    try:
+        squares = [(ChessEngine.Move.ranksToRows[notation[i + 1]], ChessEngine.Move.filesToCols[notation[i]])
+                   for i in (0, 2)]
+    except (KeyError, IndexError):
+        raise ValueError(f"not a move: {notation}")
+    (start_row, start_col), (end_row, end_col) = squares
+    return start_row * 1000 + start_col * 100 + end_row * 10 + end_col
+
+
+class HostedGame:
+    """One game in progress: its position, clock, seat tokens and connections to notify"""
+
+    __slots__ = ('id', 'white', 'black', 'tokens', 'gs', 'legal_moves', 'clock', 'flag_timer', 'watchers',
+                 'draw_offer', 'started', 'result', 'reason')
+
+    def __init__(self, game_id, white, black, control=None):
+        self.id = game_id
+        self.white = white
+        self.black = black
+        self.tokens = {secrets.token_hex(8): True, secrets.token_hex(8): False}  # token -> plays white
+        self.gs = ChessEngine.GameState()
+        self.legal_moves = None  # Generated when the last move was checked for mate, kept for the next move
+        self.clock = ChessTime.GameClock(control) if control else None
+        self.flag_timer = None
+        self.watchers = set()  # Writers of the connections that joined
+        self.draw_offer = None  # Side whose draw offer stands
+        self.started = time.time()
+        self.result = "*"
+        self.reason = None
+
+    def token_for(self, white):
+        return next(token for token, plays_white in self.tokens.items() if plays_white == white)
+
+    def clock_times(self):
+        if self.clock is None:
+            return None
+        return [0.0 if self.clock.flagged == white else round(max(0.0, self.clock.time_left(white)), 1)
+                for white in (True, False)]
+
+    def state(self):
+        return {'game': self.id, 'white': self.white, 'black': self.black, 'fen': self.gs.getFen(),
+                'moves': [move.getUciNotation() for move in self.gs.moveLog], 'clock': self.clock_times(),
+                'result': self.result, 'reason': self.reason}
+
+    def record(self):
+        """The finished game in the chess_games.json layout"""
+        moves = [move.getChessNotation() for move in self.gs.moveLog]
+        return {'id': self.id, 'date': datetime.fromtimestamp(self.started).isoformat(),
+                'white_player': self.white, 'black_player': self.black, 'moves': moves,
+                'result': self.result, 'reason': self.reason, 'move_count': len(moves),
+                'duration': f"{int(time.time() - self.started)}s",
+                'time_control': str(self.clock.control) if self.clock else None}
+
+
+class GameStore:
+    """Appends finished games to a JSON-lines file in batches, writing from a worker thread"""
+
+    def __init__(self, path, batch_size=BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+        self.written = 0
+        self.lock = asyncio.Lock()  # One batch at a time, in order
+
+    def next_id(self):
+        """Id after the highest one in the store, so ids stay unique across runs"""
+        last = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        last = max(last, json.loads(line)['id'])
+        return last + 1
+
+    def add(self, record):
+        self.pending.append(record)
+        if len(self.pending) >= self.batch_size:
+            asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        async with self.lock:
+            batch, self.pending = self.pending, []
+            if batch:
+                await asyncio.get_running_loop().run_in_executor(None, self.write, batch)
+                self.written += len(batch)
+
+    def write(self, batch):
+        text = "".join(json.dumps(record) + "\n" for record in batch)
+        with open(self.path, 'a') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class GameServer:
+    """Serves create, join, move, resign, draw, state and stats requests for every hosted game"""
+
+    def __init__(self, store_path=DEFAULT_STORE, batch_size=BATCH_SIZE):
+        self.store = GameStore(store_path, batch_size)
+        self.games = {}  # id -> HostedGame in progress
+        self.finished = OrderedDict()  # id -> state of recently finished games
+        self.next_id = self.store.next_id()
+        self.clients = {}  # Writer -> ids of the games its connection joined
+        self.requests = 0
+        self.started = time.time()
+        self.server = None
+        self.flusher = None
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None):
+        if unix_path:
+            self.server = await asyncio.start_unix_server(self.handle_client, unix_path, limit=MAX_LINE)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE)
+        self.flusher = asyncio.ensure_future(self.flush_periodically())
+        return self.server
+
+    async def close(self):
+        """Stop serving and write every finished game; games in progress are not stored"""
+        if self.server:
+            self.server.close()
+            for writer in list(self.clients):
+                writer.close()
+            await self.server.wait_closed()
+        if self.flusher:
+            self.flusher.cancel()
+        for game in self.games.values():
+            if game.flag_timer:
+                game.flag_timer.cancel()
+        await self.store.flush()
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await self.store.flush()
+
+    async def handle_client(self, reader, writer):
+        self.clients[writer] = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                response = self.answer(line, writer)
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in self.clients.pop(writer):
+                if game_id in self.games:
+                    self.games[game_id].watchers.discard(writer)
+            writer.close()
+
+    def answer(self, line, writer):
+        self.requests += 1
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a JSON object")
+            handler = self.COMMANDS.get(request.get('cmd'))
+            if handler is None:
+                raise ValueError(f"unknown command {request.get('cmd')}")
+            response = handler(self, request, writer)
+            response['ok'] = True
+        except (ValueError, TypeError, KeyError) as e:
+            response = {'ok': False, 'error': str(e)}
+        return response
+
+    # Commands
+
+    def create(self, request, writer):
+        control = ChessTime.TimeControl.parse(str(request['tc'])) if request.get('tc') else None
+        game = HostedGame(self.next_id, str(request.get('white', "White")), str(request.get('black', "Black")),
+                          control)
+        self.next_id += 1
+        self.games[game.id] = game
+        return {'game': game.id, 'white_token': game.token_for(True), 'black_token': game.token_for(False)}
+
+    def join(self, request, writer):
+        game = self.game(request)
+        if request.get('token') is not None:
+            self.seat(game, request)
+        game.watchers.add(writer)
+        self.clients[writer].add(game.id)
+        return game.state()
+
+    def move(self, request, writer):
+        game = self.game(request)
+        white = self.seat(game, request)
+        gs = game.gs
+        if white != gs.whiteToMove:
+            raise ValueError("not your move")
+        notation = str(request['move'])
+        move_id = notation_id(notation)
+        move = next((move for move in game.legal_moves or gs.getValidMoves() if move.moveID == move_id), None)
+        if move is None:
+            raise ValueError(f"illegal move {notation}")
+        if game.clock is not None:
+            game.clock.press(white)
+            if game.clock.flagged is not None:
+                self.finish(game, "0-1" if white else "1-0", "time forfeit")
+                return {'result': game.result, 'reason': game.reason}
+        gs.makeMove(move)
+        game.legal_moves = gs.getValidMoves()
+        game.draw_offer = None
+        self.broadcast(game, {'event': 'move', 'game': game.id, 'move': move.getUciNotation(),
+                              'ply': len(gs.moveLog), 'clock': game.clock_times()})
+        if not game.legal_moves:
+            if gs.checkMate:
+                self.finish(game, "1-0" if white else "0-1", "checkmate")
+            else:
+                self.finish(game, "1/2-1/2", "stalemate")
+        elif gs.getDrawReason():
+            self.finish(game, "1/2-1/2", gs.getDrawReason())
+        elif game.clock is not None:
+            self.schedule_flag(game)
+        return {'ply': len(gs.moveLog), 'clock': game.clock_times(), 'result': game.result, 'reason': game.reason}
+
+    def resign(self, request, writer):
+        game = self.game(request)
+        white = self.seat(game, request)
+        self.finish(game, "0-1" if white else "1-0", "resignation")
+        return {'result': game.result, 'reason': game.reason}
+
+    def draw(self, request, writer):
+        game = self.game(request)
+        white = self.seat(game, request)
+        if game.draw_offer == (not white):
+            self.finish(game, "1/2-1/2", "agreement")
+            return {'result': game.result, 'reason': game.reason}
+        game.draw_offer = white
+        self.broadcast(game, {'event': 'draw_offer', 'game': game.id, 'white': white})
+        return {'offered': True}
+
+    def state(self, request, writer):
+        game_id = request['game']
+        if game_id in self.finished:
+            return self.finished[game_id]
+        return self.game(request).state()
+
+    def stats(self, request, writer):
+        uptime = time.time() - self.started
+        return {'games': len(self.games), 'connections': len(self.clients), 'requests': self.requests,
+                'requests_per_second': round(self.requests / uptime, 1) if uptime else 0.0,
+                'unsaved': len(self.store.pending), 'stored': self.store.written}
+
+    COMMANDS = {'create': create, 'join': join, 'move': move, 'resign': resign, 'draw': draw,
+                'state': state, 'stats': stats}
+
+    # Games
+
+    def game(self, request):
+        game = self.games.get(request['game'])
+        if game is None:
+            raise ValueError("no game in progress with that id")
+        return game
+
+    def seat(self, game, request):
+        """Side the request's token plays (True for white)"""
+        white = game.tokens.get(request.get('token'))
+        if white is None:
+            raise ValueError("not a player in this game")
+        return white
+
+    def schedule_flag(self, game):
+        """
+        Make sure the flag is checked by the time the side to move's clock runs out. A
+        timer due earlier is kept (it checks again when it wakes), so most moves leave
+        the loop's timer heap alone instead of filling it with cancelled timers.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max(0.0, game.clock.time_left(game.gs.whiteToMove)) + 0.01
+        if game.flag_timer is not None:
+            if game.flag_timer.when() <= deadline:
+                return
+            game.flag_timer.cancel()
+        game.flag_timer = loop.call_at(deadline, self.check_flag, game)
+
+    def check_flag(self, game):
+        game.flag_timer = None
+        if game.result != "*":
+            return
+        white = game.gs.whiteToMove
+        if game.clock.check_flag(white):
+            self.finish(game, "0-1" if white else "1-0", "time forfeit")
+        else:
+            self.schedule_flag(game)  # Woke up early
+
+    def finish(self, game, result, reason):
+        game.result = result
+        game.reason = reason
+        if game.clock is not None:
+            game.clock.stop()
+        if game.flag_timer:
+            game.flag_timer.cancel()
+            game.flag_timer = None
+        game.legal_moves = None
+        self.broadcast(game, {'event': 'end', 'game': game.id, 'result': result, 'reason': reason})
+        self.store.add(game.record())
+        self.finished[game.id] = game.state()
+        while len(self.finished) > FINISHED_KEPT:
+            self.finished.popitem(last=False)
+        del self.games[game.id]
+
+    def broadcast(self, game, event):
+        line = (json.dumps(event) + "\n").encode()
+        for writer in list(game.watchers):
+            if writer.transport.get_write_buffer_size() > MAX_BUFFER:
+                # A client that stopped reading would otherwise hold its events in memory forever
+                game.watchers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+
+def query(requests, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None, timeout=None):
+    """Send requests over one connection and return their responses, skipping pushed events (for scripts)"""
+    if unix_path:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        connection.connect(unix_path)
+    else:
+        connection = socket.create_connection((host, port), timeout)
+    responses = []
+    with connection, connection.makefile('rwb') as stream:
+        for request in requests:
+            stream.write((json.dumps(request) + "\n").encode())
+            stream.flush()
+            while True:
+                response = json.loads(stream.readline())
+                if 'event' not in response:
+                    responses.append(response)
+                    break
+    return responses
+
+
+async def serve(args):
+    server = GameServer(args.store, args.batch)
+    await server.start(args.host, args.port, args.unix)
+    print(f"Game server on {args.unix or f'{args.host}:{args.port}'}, storing finished games in {args.store}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many concurrent games over a local socket")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument('--store', default=DEFAULT_STORE, help="JSON-lines file finished games are appended to")
+    parser.add_argument('--batch', type=int, default=BATCH_SIZE, help="Finished games written at once")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
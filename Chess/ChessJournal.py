@@ -0,0 +1,224 @@
+"""
+Game Journal - Crash-safe saving without blocking the GUI.
+
+Every move of the game in progress is appended to a small journal file as it
+is played, so a crash loses at most the moves still in the write queue. All
+disk work happens on one DiskWriter thread, in the order it was queued: the
+GUI only puts lines and files on a queue. The writer appends whatever lines
+are waiting and then fsyncs each journal it touched once, so a burst of moves
+costs one fsync. The game archive is replaced by writing a temporary file,
+fsyncing it and renaming it over the old one, so a crash leaves either the old
+or the new archive, never half of one; a save queued behind a newer save of
+the same file is skipped.
+
+A journal is removed once its game has been written to the archive. Journals
+still on disk at startup belong to games that never got there; recover()
+replays them into game records.
+"""
+
+import json
+import os
+import queue
+import threading
+from datetime import datetime
+
+import ChessEngine
+
+JOURNAL_DIR = "chess_journal"
+JOURNAL_SUFFIX = ".journal"
+UNDO = "undo"
+
+_STOP = object()
+
+
+class DiskWriter:
+    """Background thread that does the journal and archive writes in the order they are queued"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.files = {}  # Journal path -> open file
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def append(self, path, text):
+        """Append text to a journal (opened on first use)"""
+        self.queue.put(('append', path, text))
+
+    def replace(self, path, make_text):
+        """Atomically replace a file with make_text(), which is called on the writer thread"""
+        self.queue.put(('replace', path, make_text))
+
+    def remove(self, path):
+        self.queue.put(('remove', path, None))
+
+    def flush(self):
+        """Wait until everything queued so far is on disk"""
+        self.queue.join()
+
+    def close(self):
+        """Write everything queued and stop the thread"""
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            try:
+                self.write_batch([job for job in batch if job is not _STOP])
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if stop:
+                for f in self.files.values():
+                    f.close()
+                return
+
+    def write_batch(self, jobs):
+        # A save is skipped when a later one replaces the same file before any journal is
+        # removed; a removal has to wait until the save holding its game is on disk
+        superseded = set()
+        later = set()
+        for index in range(len(jobs) - 1, -1, -1):
+            kind, path, _ = jobs[index]
+            if kind == 'remove':
+                later.clear()
+            elif kind == 'replace':
+                if path in later:
+                    superseded.add(index)
+                later.add(path)
+        dirty = set()
+        for index, (kind, path, payload) in enumerate(jobs):
+            try:
+                if kind == 'append':
+                    f = self.files.get(path)
+                    if f is None:
+                        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                        f = self.files[path] = open(path, 'a')
+                    f.write(payload)
+                    dirty.add(path)
+                elif kind == 'replace':
+                    if index not in superseded:
+                        self.sync(dirty)  # Journal lines queued before the save land first
+                        write_atomic(path, payload())
+                else:
+                    self.sync(dirty)
+                    f = self.files.pop(path, None)
+                    if f is not None:
+                        f.close()
+                    if os.path.exists(path):
+                        os.remove(path)
+            except Exception as e:
+                print(f"Error writing {path}: {e}")
+        self.sync(dirty)
+
+    def sync(self, dirty):
+        for path in dirty:
+            f = self.files.get(path)
+            if f is not None:
+                f.flush()
+                os.fsync(f.fileno())
+        dirty.clear()
+
+
+def write_atomic(path, text):
+    """Replace path with text so that a crash leaves either the old or the new contents"""
+    directory = os.path.dirname(path) or '.'
+    temp = os.path.join(directory, f".{os.path.basename(path)}.tmp")
+    with open(temp, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+    if hasattr(os, 'O_DIRECTORY'):
+        # Make the rename itself durable
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class MoveJournal:
+    """
+    Journal of the game in progress: a JSON header line, then one line per move
+    ('e2e4') or 'undo'. It is started by the first move, so empty games leave no file.
+    """
+
+    def __init__(self, writer, directory=JOURNAL_DIR):
+        self.writer = writer
+        self.directory = directory
+        self.path = None
+
+    def move(self, gs, white_player="Human", black_player="Human"):
+        """Record the last move of gs; a new journal starts with every move made so far"""
+        if self.path is None:
+            name = datetime.now().strftime('%Y%m%d_%H%M%S_%f') + JOURNAL_SUFFIX
+            self.path = os.path.join(self.directory, name)
+            header = {'date': datetime.now().isoformat(), 'white_player': white_player,
+                      'black_player': black_player}
+            lines = [json.dumps(header)] + [move.getChessNotation() for move in gs.moveLog]
+            self.writer.append(self.path, "\n".join(lines) + "\n")
+        else:
+            self.writer.append(self.path, gs.moveLog[-1].getChessNotation() + "\n")
+
+    def undo(self):
+        if self.path is not None:
+            self.writer.append(self.path, UNDO + "\n")
+
+    def finish(self):
+        """The game has been archived (queued before this): drop its journal"""
+        if self.path is not None:
+            self.writer.remove(self.path)
+            self.path = None
+
+
+def replay_journal(path):
+    """
+    Game record (chess_games.json layout, without an id) of a journal, or None when it
+    holds no moves. Reading stops at the first line that doesn't replay, such as a line
+    torn by the crash.
+    """
+    with open(path, 'r') as f:
+        lines = f.read().split("\n")
+    try:
+        header = json.loads(lines[0])
+    except ValueError:
+        return None
+    gs = ChessEngine.GameState()
+    for line in lines[1:]:
+        if line == UNDO:
+            gs.undoMove()
+            continue
+        move = gs.get_move_from_notation(line)
+        if move is None:
+            break
+        gs.makeMove(move)
+    if not gs.moveLog:
+        return None
+
+    if not gs.getValidMoves():
+        result = ("0-1" if gs.whiteToMove else "1-0") if gs.checkMate else "1/2-1/2"
+    elif gs.getDrawReason():
+        result = "1/2-1/2"
+    else:
+        result = "*"
+    moves = [move.getChessNotation() for move in gs.moveLog]
+    return {'date': header.get('date', datetime.now().isoformat()),
+            'white_player': header.get('white_player', "Human"),
+            'black_player': header.get('black_player', "Human"),
+            'moves': moves, 'result': result, 'move_count': len(moves), 'duration': "Recovered"}
+
+
+def recover(directory=JOURNAL_DIR):
+    """(journal path, game record or None) for every journal left behind, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                   if name.endswith(JOURNAL_SUFFIX))
+    return [(path, replay_journal(path)) for path in paths]
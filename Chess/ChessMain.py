@@ -37,7 +37,20 @@ import json
 import time
 from datetime import datetime
 # Import your fixed ChessEngine
+import ChessAnalysis
+import ChessAssets
 import ChessEngine
+import ChessEval
+import ChessExplorer
+import ChessJournal
+import ChessOpponent
+import ChessPgn
+import ChessProfiler
+import ChessReplay
+import ChessSounds
+import ChessStats
+import ChessTablebase
+import ChessTime
 
 # Initialize pygame mixer FIRST
 p.mixer.pre_init(frequency=44100, size=-16, channels=2, buffer=512)
@@ -57,6 +70,9 @@ DIMENSION = 8
 SQ_SIZE = BOARD_SIZE // DIMENSION
 MAX_FPS = 60
 
+# Time controls cycled with Ctrl+T (None plays without a clock)
+TIME_CONTROLS = [None, "1+0", "3+2", "5+3", "10+5", "40/90+30"]
+
 # Chess.com inspired color palette
 COLORS = {
     # Board colors (chess.com green theme)
@@ -90,9 +106,6 @@ COLORS = {
     'divider': p.Color("#3c3936"),  # Section dividers
 }
 
-IMAGES = {}
-SOUNDS = {}
-
 
 class GameManager:
     """Manages saved games and game history"""
@@ -100,6 +113,12 @@ class GameManager:
     def __init__(self):
         self.games_file = "chess_games.json"
         self.games = self.load_games()
+        self.explorer = ChessExplorer.OpeningExplorer()
+        self.explorer.add_games(self.games)
+        # All file writes go through one background thread; the game in progress is journaled
+        self.writer = ChessJournal.DiskWriter()
+        self.journal = ChessJournal.MoveJournal(self.writer)
+        self.recovered = self.recover_games()
 
     def load_games(self):
         """Load saved games from file"""
@@ -107,33 +126,55 @@ class GameManager:
             if os.path.exists(self.games_file):
                 with open(self.games_file, 'r') as f:
                     return json.load(f)
+        except ValueError as e:
+            # Keep the damaged file rather than overwriting it on the next save
+            os.replace(self.games_file, self.games_file + ".corrupt")
+            print(f"Error loading games: {e} (moved to {self.games_file}.corrupt)")
         except Exception as e:
             print(f"Error loading games: {e}")
         return []
 
     def save_games(self):
-        """Save games to file"""
-        try:
-            with open(self.games_file, 'w') as f:
-                json.dump(self.games, f, indent=2)
-        except Exception as e:
-            print(f"Error saving games: {e}")
-
-    def add_game(self, moves, result, white_player="Human", black_player="Human"):
+        """Queue an atomic rewrite of the games file; the JSON is encoded on the writer thread"""
+        games = list(self.games)
+        self.writer.replace(self.games_file, lambda: json.dumps(games, indent=2))
+
+    def recover_games(self):
+        """Add the games of journals left by a crash to the collection; returns them, newest first"""
+        recovered = []
+        for path, game in ChessJournal.recover():
+            if game is not None:
+                self.add_game(game['moves'], game['result'], game['white_player'], game['black_player'],
+                              date=game['date'], duration=game['duration'])
+                recovered.insert(0, self.games[0])
+            self.writer.remove(path)
+        if recovered:
+            print(f"✓ Recovered {len(recovered)} unfinished game(s) from the journal")
+        return recovered
+
+    def close(self):
+        """Wait for every queued write"""
+        self.writer.close()
+
+    def add_game(self, moves, result, white_player="Human", black_player="Human", date=None,
+                 duration="Unknown"):
         """Add a new game to the collection"""
         game_data = {
             'id': len(self.games) + 1,
-            'date': datetime.now().isoformat(),
+            'date': date or datetime.now().isoformat(),
             'white_player': white_player,
             'black_player': black_player,
             'moves': moves,
             'result': result,
             'move_count': len(moves),
-            'duration': "Unknown"  # Could track game duration
+            'duration': duration  # Could track game duration
         }
 
         self.games.insert(0, game_data)  # Add to beginning
+        self.explorer.add_game(moves, result)
         if len(self.games) > 100:  # Keep only last 100 games
+            for dropped in self.games[100:]:
+                self.explorer.remove_game(dropped['moves'], dropped['result'])
             self.games = self.games[:100]
         self.save_games()
 
@@ -143,9 +184,18 @@ class GameManager:
 
     def delete_game(self, game_id):
         """Delete a game by ID"""
+        for game in self.games:
+            if game['id'] == game_id:
+                self.explorer.remove_game(game['moves'], game['result'])
         self.games = [g for g in self.games if g['id'] != game_id]
         self.save_games()
 
+    def clear(self):
+        """Delete every saved game"""
+        self.games = []
+        self.explorer = ChessExplorer.OpeningExplorer()
+        self.save_games()
+
 
 class ChessComGame:
     """Chess.com style chess game"""
@@ -173,13 +223,43 @@ class ChessComGame:
         self.selected_game_id = None
         self.hovered_game_index = -1
 
+        # Review state for loaded games (None while playing live)
+        self.replay = None
+        self.dragging_slider = False
+
+        # Engine lines for the displayed position (Ctrl+A), searched on a worker thread
+        self.analysis = ChessAnalysis.BackgroundAnalysis()
+        self.show_analysis = False
+
+        # Opening explorer over the saved games (Ctrl+O), shares the panel with the engine lines
+        self.show_explorer = False
+
+        # Engine opponent (Ctrl+E), pondering on the expected reply while it waits
+        self.opponent = None
+        self.engine_plays_white = False
+
+        # Endgame tablebase verdict for the current position, probed when it changes
+        self.tablebase_hint = None
+
+        # Chess clock (Ctrl+T picks the time control); the engine plans its moves on it
+        self.time_control = None
+        self.game_clock = None
+
+        # Frame profiler (F2 toggles, F4 exports a trace)
+        self.profiler = ChessProfiler.FrameProfiler(MAX_FPS)
+
+        # Engine stats overlay (F3)
+        self.show_stats = False
+        self.previous_stats = None
+
         # Animation state
         self.animation_time = 0
         self.animated_squares = set()
 
-        # Load resources
+        # Load resources (sounds are decoded on first use)
+        self.atlas = None
         self.load_images()
-        self.load_sounds()
+        self.sounds = ChessSounds.SoundBank()
 
         # Fonts (chess.com uses clean sans-serif)
         self.font_large = p.font.Font(None, 28)
@@ -187,6 +267,7 @@ class ChessComGame:
         self.font_small = p.font.Font(None, 18)
         self.font_tiny = p.font.Font(None, 16)
         self.font_header = p.font.Font(None, 24)
+        self.font_mono = p.font.SysFont("monospace", 13)
 
         # UI elements
         self.buttons = self.create_buttons()
@@ -194,23 +275,17 @@ class ChessComGame:
         # Game start time
         self.game_start_time = time.time()
 
-    def load_images(self):
-        """Load piece images with chess.com style fallbacks"""
-        pieces = ['wp', 'wR', 'wN', 'wB', 'wK', 'wQ', 'bp', 'bR', 'bN', 'bB', 'bK', 'bQ']
+        # Continue the latest game a crash interrupted
+        if self.game_manager.recovered:
+            self.load_game(self.game_manager.recovered[0])
 
-        for piece in pieces:
-            try:
-                img_path = os.path.join("images", f"{piece}.png")
-                if os.path.exists(img_path):
-                    IMAGES[piece] = p.transform.scale(p.image.load(img_path), (SQ_SIZE, SQ_SIZE))
-                else:
-                    self.create_chess_com_piece(piece)
-            except Exception as e:
-                self.create_chess_com_piece(piece)
+    def load_images(self, size=SQ_SIZE):
+        """Load the piece atlas for a square size, with chess.com style fallbacks"""
+        self.atlas = ChessAssets.load_atlas(size, self.create_chess_com_piece)
 
-    def create_chess_com_piece(self, piece):
+    def create_chess_com_piece(self, piece, size=SQ_SIZE):
         """Create chess.com style piece graphics"""
-        surf = p.Surface((SQ_SIZE, SQ_SIZE), p.SRCALPHA)
+        surf = p.Surface((size, size), p.SRCALPHA)
 
         # Chess.com style colors
         if piece[0] == 'w':
@@ -220,7 +295,7 @@ class ChessComGame:
             main_color = p.Color("#2c2c2c")
             border_color = p.Color("#1a1a1a")
 
-        center = SQ_SIZE // 2
+        center = size // 2
 
         # Draw piece based on type with chess.com styling
         if piece[1] == 'p':  # Pawn
@@ -302,28 +377,7 @@ class ChessComGame:
         text_rect = text.get_rect(center=(center, center + 5))
         surf.blit(text, text_rect)
 
-        IMAGES[piece] = surf
-
-    def load_sounds(self):
-        """Load chess sound effects"""
-        sound_files = {
-            'move': 'move.wav',
-            'capture': 'capture.wav',
-            'check': 'check.wav',
-            'checkmate': 'checkmate.wav',
-            'castle': 'castle.wav',
-            'promotion': 'promotion.wav',
-            'game_start': 'game_start.wav',
-            'game_end': 'game_end.wav'
-        }
-
-        for sound_name, filename in sound_files.items():
-            try:
-                sound_path = os.path.join("sounds", filename)
-                if os.path.exists(sound_path):
-                    SOUNDS[sound_name] = p.mixer.Sound(sound_path)
-            except Exception as e:
-                pass  # Silent fallback
+        return surf
 
     def create_buttons(self):
         """Create simplified buttons"""
@@ -375,13 +429,23 @@ class ChessComGame:
 
             elif event.type == p.MOUSEBUTTONDOWN:
                 if event.button == 1:  # Left click
-                    self.handle_mouse_click(event.pos)
+                    if self.replay and self.get_slider_rect().inflate(0, 16).collidepoint(event.pos):
+                        self.dragging_slider = True
+                        self.scrub_to(event.pos[0])
+                    else:
+                        self.handle_mouse_click(event.pos)
                 elif event.button == 4:  # Scroll up
                     self.game_list_scroll = max(0, self.game_list_scroll - 3)
                 elif event.button == 5:  # Scroll down
                     self.game_list_scroll += 3
 
+            elif event.type == p.MOUSEBUTTONUP:
+                if event.button == 1:
+                    self.dragging_slider = False
+
             elif event.type == p.MOUSEMOTION:
+                if self.dragging_slider:
+                    self.scrub_to(event.pos[0])
                 self.handle_mouse_motion(event.pos)
 
             elif event.type == p.KEYDOWN:
@@ -393,6 +457,30 @@ class ChessComGame:
                     self.save_current_game()
                 elif event.key == p.K_f and p.key.get_pressed()[p.K_LCTRL]:
                     self.flip_board()
+                elif event.key == p.K_a and p.key.get_pressed()[p.K_LCTRL]:
+                    self.toggle_analysis()
+                elif event.key == p.K_e and p.key.get_pressed()[p.K_LCTRL]:
+                    self.toggle_opponent()
+                elif event.key == p.K_o and p.key.get_pressed()[p.K_LCTRL]:
+                    self.toggle_explorer()
+                elif event.key == p.K_t and p.key.get_pressed()[p.K_LCTRL]:
+                    self.cycle_time_control()
+                elif event.key == p.K_F2:
+                    self.profiler.toggle()
+                elif event.key == p.K_F3:
+                    self.toggle_stats_overlay()
+                elif event.key == p.K_F4 and self.profiler.enabled:
+                    self.export_profile()
+                elif self.replay:
+                    # Move navigation for loaded games
+                    if event.key == p.K_LEFT:
+                        self.go_to_ply(self.replay.ply - 1)
+                    elif event.key == p.K_RIGHT:
+                        self.go_to_ply(self.replay.ply + 1)
+                    elif event.key == p.K_HOME:
+                        self.go_to_ply(0)
+                    elif event.key == p.K_END:
+                        self.go_to_ply(self.replay.length)
 
         return True
 
@@ -474,6 +562,9 @@ class ChessComGame:
 
     def attempt_move(self):
         """Attempt to make a chess move"""
+        if self.is_flagged():
+            self.player_clicks = []
+            return
         move = ChessEngine.Move(self.player_clicks[0], self.player_clicks[1], self.gs.board)
 
         for valid_move in self.valid_moves:
@@ -486,7 +577,10 @@ class ChessComGame:
 
     def make_move(self, move):
         """Execute a chess move"""
+        # Playing a move while reviewing branches off into a live game
+        self.replay = None
         self.gs.makeMove(move)
+        self.game_manager.journal.move(self.gs, *self.get_players())
         self.last_move = move
         self.move_made = True
         self.sq_selected = ()
@@ -496,33 +590,19 @@ class ChessComGame:
         self.animated_squares.add((move.endRow, move.endCol))
         self.animation_time = time.time()
 
-        self.play_sound(move)
+        if self.game_clock:
+            self.game_clock.press(not self.gs.whiteToMove)
 
-    def play_sound(self, move):
-        """Play move sound effect"""
-        if self.gs.checkMate:
-            sound = SOUNDS.get('checkmate') or SOUNDS.get('game_end')
-        elif self.gs.inCheck():
-            sound = SOUNDS.get('check')
-        elif move.isCastleMove:
-            sound = SOUNDS.get('castle')
-        elif move.isPawnPromotion:
-            sound = SOUNDS.get('promotion')
-        elif move.pieceCaptured != '--':
-            sound = SOUNDS.get('capture')
-        else:
-            sound = SOUNDS.get('move')
-
-        if sound:
-            sound.play()
+        self.sounds.play_move(move, self.gs)
 
     def new_game(self):
         """Start a new game"""
-        # Auto-save current game if it has moves
-        if len(self.gs.moveLog) > 0:
+        # Auto-save current game if it has moves (loaded games are already saved)
+        if len(self.gs.moveLog) > 0 and not self.replay:
             result = self.get_game_result()
             moves = [move.getChessNotation() for move in self.gs.moveLog]
-            self.game_manager.add_game(moves, result)
+            self.game_manager.add_game(moves, result, *self.get_players())
+        self.game_manager.journal.finish()
 
         # Reset game state
         self.gs = ChessEngine.GameState()
@@ -532,20 +612,27 @@ class ChessComGame:
         self.last_move = None
         self.move_made = True
         self.selected_game_id = None
+        self.replay = None
         self.game_start_time = time.time()
+        self.reset_clock()
 
         # Play new game sound
-        if SOUNDS.get('game_start'):
-            SOUNDS['game_start'].play()
+        self.sounds.play('game_start')
 
     def undo_move(self):
         """Undo the last move"""
-        if self.gs.moveLog:
+        if self.replay:
+            self.go_to_ply(self.replay.ply - 1)
+        elif self.gs.moveLog:
             self.gs.undoMove()
+            self.game_manager.journal.undo()
             self.move_made = True
             self.sq_selected = ()
             self.player_clicks = []
             self.last_move = self.gs.moveLog[-1] if self.gs.moveLog else None
+            if self.game_clock and self.game_clock.flagged is None:
+                # Time is not given back, the clock just switches to the side to move
+                self.game_clock.start(self.gs.whiteToMove)
 
     def flip_board(self):
         """Flip the board orientation"""
@@ -558,7 +645,7 @@ class ChessComGame:
         if len(self.gs.moveLog) > 0:
             result = self.get_game_result()
             moves = [move.getChessNotation() for move in self.gs.moveLog]
-            self.game_manager.add_game(moves, result)
+            self.game_manager.add_game(moves, result, *self.get_players())
             print("✓ Game saved successfully!")
         else:
             print("⚠ No moves to save")
@@ -566,25 +653,13 @@ class ChessComGame:
     def load_game(self, game_data):
         """Load a saved game"""
         try:
-            # Reset to new game state
-            self.gs = ChessEngine.GameState()
-
-            # Replay all moves from the saved game
-            for move_notation in game_data['moves']:
-                # Find the corresponding move object
-                valid_moves = self.gs.getValidMoves()
-                move_found = False
-
-                for move in valid_moves:
-                    if move.getChessNotation() == move_notation:
-                        self.gs.makeMove(move)
-                        self.last_move = move
-                        move_found = True
-                        break
-
-                if not move_found:
-                    print(f"⚠ Could not replay move: {move_notation}")
-                    break
+            # The live game is left for the loaded one, so it is no longer journaled
+            self.game_manager.journal.finish()
+
+            # Replay all moves once, caching snapshots for later navigation
+            self.replay = ChessReplay.GameReplay(game_data['moves'])
+            self.gs = self.replay.gs
+            self.last_move = self.replay.last_move
 
             # Update game state
             self.valid_moves = self.gs.getValidMoves()
@@ -594,6 +669,8 @@ class ChessComGame:
 
             # Update game start time (approximate)
             self.game_start_time = time.time()
+            if self.game_clock:
+                self.game_clock.stop()
 
             print(f"✓ Loaded game with {len(game_data['moves'])} moves")
 
@@ -602,6 +679,26 @@ class ChessComGame:
             # Reset to new game if loading fails
             self.new_game()
 
+    def go_to_ply(self, ply):
+        """Jump to a ply of the loaded game"""
+        if not self.replay:
+            return
+        self.replay.go_to(ply)
+        self.last_move = self.replay.last_move
+        self.sq_selected = ()
+        self.player_clicks = []
+        self.move_made = True
+
+    def get_slider_rect(self):
+        """Get the rectangle of the review slider in the footer"""
+        return p.Rect(260, WINDOW_HEIGHT - 23, 340, 6)
+
+    def scrub_to(self, x):
+        """Jump to the ply under an x position on the review slider"""
+        slider = self.get_slider_rect()
+        fraction = min(1.0, max(0.0, (x - slider.left) / slider.width))
+        self.go_to_ply(round(fraction * self.replay.length))
+
     def save_current_game(self):
         """Export current game as PGN"""
         if not self.gs.moveLog:
@@ -609,31 +706,14 @@ class ChessComGame:
             return
 
         # Create PGN content
-        pgn_lines = [
-            f'[Date "{datetime.now().strftime("%Y.%m.%d")}"]',
-            '[White "Human"]',
-            '[Black "Human"]',
-            f'[Result "{self.get_game_result()}"]',
-            '[TimeControl "-"]',
-            '',
-        ]
-
-        # Add moves
-        move_text = ""
-        for i, move in enumerate(self.gs.moveLog):
-            if i % 2 == 0:
-                move_text += f"{i // 2 + 1}. {move.getChessNotation()} "
-            else:
-                move_text += f"{move.getChessNotation()} "
-
-        move_text += self.get_game_result()
-        pgn_lines.append(move_text)
+        moves = [move.getChessNotation() for move in self.gs.moveLog]
+        pgn_text = ChessPgn.game_to_pgn(moves, self.get_game_result())
 
         # Save to file
         filename = f"chess_game_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pgn"
         try:
             with open(filename, 'w') as f:
-                f.write('\n'.join(pgn_lines))
+                f.write(pgn_text)
             print(f"✓ Game exported to {filename}")
         except Exception as e:
             print(f"✗ Export failed: {e}")
@@ -644,8 +724,7 @@ class ChessComGame:
 
     def clear_games(self):
         """Clear all saved games"""
-        self.game_manager.games = []
-        self.game_manager.save_games()
+        self.game_manager.clear()
         self.selected_game_id = None
         print("🗑️ All games cleared")
 
@@ -653,8 +732,10 @@ class ChessComGame:
         """Get current game result in PGN format"""
         if self.gs.checkMate:
             return "0-1" if self.gs.whiteToMove else "1-0"
-        elif self.gs.staleMate:
+        elif self.gs.staleMate or self.gs.getDrawReason():
             return "1/2-1/2"
+        elif self.game_clock and self.game_clock.flagged is not None:
+            return "0-1" if self.game_clock.flagged else "1-0"
         else:
             return "*"
 
@@ -672,12 +753,23 @@ class ChessComGame:
         self.screen.fill(COLORS['bg_primary'])
 
         # Draw components
-        self.draw_header()
-        self.draw_board()
-        self.draw_pieces()
-        self.draw_highlights()
-        self.draw_sidebar()
-        self.draw_footer()
+        profiler = self.profiler
+        with profiler.section('draw_header'):
+            self.draw_header()
+        with profiler.section('draw_board'):
+            self.draw_board()
+        with profiler.section('draw_pieces'):
+            self.draw_pieces()
+        with profiler.section('draw_highlights'):
+            self.draw_highlights()
+        with profiler.section('draw_sidebar'):
+            self.draw_sidebar()
+        with profiler.section('draw_footer'):
+            self.draw_footer()
+        if self.show_stats:
+            self.draw_stats_overlay()
+        if profiler.enabled:
+            self.draw_profiler_overlay()
 
         # Clean up old animations
         current_time = time.time()
@@ -701,6 +793,8 @@ class ChessComGame:
             status = f"Checkmate! {winner} wins! 🏆"
         elif self.gs.staleMate:
             status = "Stalemate - Draw! 🤝"
+        elif self.gs.getDrawReason():
+            status = f"Draw by {self.gs.getDrawReason()}! 🤝"
         elif self.gs.inCheck():
             status += " - Check! ⚠️"
 
@@ -789,7 +883,7 @@ class ChessComGame:
                     display_col = 7 - col if self.board_flipped else col
 
                     piece_rect = p.Rect(display_col * SQ_SIZE, board_y + display_row * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-                    self.screen.blit(IMAGES[piece], piece_rect)
+                    self.atlas.blit(self.screen, piece, piece_rect)
 
     def draw_highlights(self):
         """Draw move hints and highlights (chess.com style)"""
@@ -841,9 +935,14 @@ class ChessComGame:
             text_rect = text_surf.get_rect(center=button['rect'].center)
             self.screen.blit(text_surf, text_rect)
 
-        # Game information section
+        # Game information section (or the engine lines / opening explorer)
         info_y = HEADER_HEIGHT + 200
-        self.draw_game_info_section(sidebar_x + 20, info_y)
+        if self.show_analysis:
+            self.draw_analysis_section(sidebar_x + 20, info_y)
+        elif self.show_explorer:
+            self.draw_explorer_section(sidebar_x + 20, info_y)
+        else:
+            self.draw_game_info_section(sidebar_x + 20, info_y)
 
         # Games history section
         games_y = info_y + 120
@@ -862,6 +961,16 @@ class ChessComGame:
             f"Turn: {'White' if self.gs.whiteToMove else 'Black'}",
             f"Duration: {self.get_game_duration()}",
         ]
+        if self.game_clock:
+            stats.append(f"Clock ({self.game_clock.control}): "
+                         f"White {ChessTime.format_clock(self.game_clock.time_left(True))} - "
+                         f"Black {ChessTime.format_clock(self.game_clock.time_left(False))}")
+        if self.tablebase_hint:
+            stats.append(f"Tablebase: {self.tablebase_hint}")
+        if self.opponent:
+            stats.append(f"Engine: {self.opponent.status()} "
+                         f"(ponder hits {self.opponent.ponder_hits}/"
+                         f"{self.opponent.ponder_hits + self.opponent.ponder_misses})")
 
         for stat in stats:
             stat_surf = self.font_small.render(stat, True, COLORS['text_secondary'])
@@ -876,6 +985,144 @@ class ChessComGame:
         material_surf = self.font_small.render(material_text, True, COLORS['text_secondary'])
         self.screen.blit(material_surf, (x, y))
 
+    def draw_analysis_section(self, x, y):
+        """Draw the engine's best lines for the displayed position"""
+        lines, depth = self.analysis.white_lines()
+        title = self.font_medium.render("Engine Lines", True, COLORS['text_primary'])
+        self.screen.blit(title, (x, y))
+        status = f"depth {depth}" if lines else "thinking..."
+        if not self.analysis.running and lines:
+            status += " (done)"
+        status_surf = self.font_tiny.render(status, True, COLORS['text_muted'])
+        self.screen.blit(status_surf, (x + SIDEBAR_WIDTH - 40 - status_surf.get_width(), y + 4))
+        y += 30
+
+        for score, pv in lines:
+            if not pv:
+                continue
+            score_surf = self.font_small.render(ChessAnalysis.format_score(score), True, COLORS['text_primary'])
+            self.screen.blit(score_surf, (x, y))
+            moves = " ".join(move.getChessNotation() for move in pv[:5])
+            moves_surf = self.font_tiny.render(moves, True, COLORS['text_secondary'])
+            self.screen.blit(moves_surf, (x + 55, y + 2))
+            y += 20
+
+    def toggle_analysis(self):
+        """Show or hide the engine lines, searching only while they are shown"""
+        self.show_analysis = not self.show_analysis
+        if self.show_analysis:
+            self.show_explorer = False
+            self.analysis.start(self.gs)
+        else:
+            self.analysis.stop()
+
+    def toggle_explorer(self):
+        """Show or hide the opening explorer in place of the game info"""
+        self.show_explorer = not self.show_explorer
+        if self.show_explorer and self.show_analysis:
+            self.toggle_analysis()
+
+    def draw_explorer_section(self, x, y):
+        """Draw the moves played from the current position in the saved games"""
+        stats = self.game_manager.explorer.lookup(self.gs.zobristKey)
+        title = self.font_medium.render("Opening Explorer", True, COLORS['text_primary'])
+        self.screen.blit(title, (x, y))
+        games = sum(stat.games for stat in stats)
+        count_surf = self.font_tiny.render(f"{games} games", True, COLORS['text_muted'])
+        self.screen.blit(count_surf, (x + SIDEBAR_WIDTH - 40 - count_surf.get_width(), y + 4))
+        y += 30
+
+        if not stats:
+            empty = self.font_small.render("No saved games reach this position", True, COLORS['text_muted'])
+            self.screen.blit(empty, (x, y))
+            return
+
+        bar_width = 120
+        for stat in stats[:4]:
+            move_surf = self.font_small.render(f"{stat.move}  {stat.games}", True, COLORS['text_primary'])
+            self.screen.blit(move_surf, (x, y))
+
+            # White / draw / black share of the decided games
+            bar_x = x + SIDEBAR_WIDTH - 40 - bar_width
+            white = int(bar_width * stat.white / 100)
+            draw = int(bar_width * stat.draw / 100)
+            p.draw.rect(self.screen, COLORS['text_primary'], (bar_x, y + 3, white, 10))
+            p.draw.rect(self.screen, COLORS['text_muted'], (bar_x + white, y + 3, draw, 10))
+            p.draw.rect(self.screen, COLORS['bg_primary'], (bar_x + white + draw, y + 3, bar_width - white - draw, 10))
+            p.draw.rect(self.screen, COLORS['border'], (bar_x, y + 3, bar_width, 10), 1)
+            y += 20
+
+    def toggle_opponent(self):
+        """Let the engine play the side that is not to move, or hand it back to a human"""
+        if self.opponent:
+            self.opponent.stop()
+            self.opponent = None
+            print("👥 Engine opponent off")
+        else:
+            self.opponent = ChessOpponent.EngineOpponent()
+            self.engine_plays_white = not self.gs.whiteToMove
+            self.move_made = True  # Let update_opponent react to the current position
+            print(f"🤖 Engine plays {'White' if self.engine_plays_white else 'Black'}")
+
+    def update_opponent(self, position_changed):
+        """Start, continue or collect the engine's search for the current position"""
+        if not self.opponent:
+            return
+        game_over = not self.valid_moves or self.gs.getDrawReason() or self.is_flagged()
+        engine_to_move = self.gs.whiteToMove == self.engine_plays_white
+
+        if position_changed:
+            if self.replay or game_over:
+                self.opponent.stop()
+            elif engine_to_move:
+                self.opponent.think(self.gs, self.game_clock)
+            else:
+                self.opponent.ponder(self.gs, self.game_clock)
+
+        if engine_to_move and not self.replay and not game_over:
+            notation = self.opponent.take_move(self.gs)
+            move = self.gs.get_move_from_notation(notation) if notation else None
+            if move:
+                self.make_move(move)
+
+    def cycle_time_control(self):
+        """Switch to the next time control and restart the clock with it"""
+        index = TIME_CONTROLS.index(self.time_control)
+        self.time_control = TIME_CONTROLS[(index + 1) % len(TIME_CONTROLS)]
+        self.reset_clock()
+        print(f"⏱️ Time control: {self.time_control or 'none'}")
+
+    def reset_clock(self):
+        """Fresh clock for a new game; it starts with White's first move"""
+        self.game_clock = None
+        if self.time_control:
+            self.game_clock = ChessTime.GameClock(ChessTime.TimeControl.parse(self.time_control))
+
+    def is_flagged(self):
+        """Whether a side has run out of time (checking the running clock)"""
+        if not self.game_clock:
+            return False
+        if self.game_clock.running is not None:
+            self.game_clock.check_flag(self.game_clock.running)
+        return self.game_clock.flagged is not None
+
+    def update_clock(self, position_changed):
+        """Stop the clock when the game ends and report a side running out of time"""
+        if not self.game_clock or self.game_clock.running is None:
+            return
+        if position_changed and (not self.valid_moves or self.gs.getDrawReason()):
+            self.game_clock.stop()
+        elif self.is_flagged():
+            side = "White" if self.game_clock.flagged else "Black"
+            print(f"⏱️ {side} lost on time")
+            self.sounds.play('game_end')
+
+    def get_players(self):
+        """(white, black) player names for saving the current game"""
+        if not self.opponent:
+            return "Human", "Human"
+        return ("Engine", "Human") if self.engine_plays_white else ("Human", "Engine")
+
     def draw_games_section(self, sidebar_x, y):
         """Draw saved games list"""
         list_area = self.get_game_list_area()
@@ -976,31 +1223,108 @@ class ChessComGame:
             status_msg = "Game Over - Checkmate!"
         elif self.gs.staleMate:
             status_msg = "Game Over - Stalemate!"
+        elif self.gs.getDrawReason():
+            status_msg = f"Game Over - Draw by {self.gs.getDrawReason()}"
+        elif self.game_clock and self.game_clock.flagged is not None:
+            status_msg = f"Game Over - {'White' if self.game_clock.flagged else 'Black'} lost on time"
         elif self.gs.inCheck():
             status_msg = "Check!"
         elif self.last_move:
             status_msg = f"Last move: {self.last_move.getChessNotation()}"
 
+        if self.replay:
+            status_msg = f"Reviewing ply {self.replay.ply}/{self.replay.length}"
+            self.draw_review_slider()
+
         status_surf = self.font_small.render(status_msg, True, COLORS['text_secondary'])
         self.screen.blit(status_surf, (20, WINDOW_HEIGHT - 25))
 
         # Keyboard shortcuts hint
-        shortcuts = "Ctrl+N: New | Ctrl+Z: Undo | Ctrl+S: Save"
+        shortcuts = "Ctrl+N: New | Ctrl+Z: Undo | Ctrl+S: Save | Ctrl+E: Engine | Ctrl+T: Clock"
+        if self.replay:
+            shortcuts = "←/→: Step | Home/End: First/Last | Ctrl+A: Lines | Ctrl+O: Openings"
         shortcuts_surf = self.font_tiny.render(shortcuts, True, COLORS['text_muted'])
         shortcuts_x = WINDOW_WIDTH - shortcuts_surf.get_width() - 20
         self.screen.blit(shortcuts_surf, (shortcuts_x, WINDOW_HEIGHT - 25))
 
+    def draw_review_slider(self):
+        """Draw the ply slider used to scrub through a loaded game"""
+        slider = self.get_slider_rect()
+        p.draw.rect(self.screen, COLORS['bg_card'], slider)
+        p.draw.rect(self.screen, COLORS['border'], slider, 1)
+
+        fraction = self.replay.ply / self.replay.length if self.replay.length else 0
+        filled = p.Rect(slider.left, slider.top, int(slider.width * fraction), slider.height)
+        p.draw.rect(self.screen, COLORS['accent'], filled)
+        p.draw.circle(self.screen, COLORS['text_primary'], (filled.right, slider.centery), 7)
+
+    def toggle_stats_overlay(self):
+        """Show or hide the engine stats overlay, instrumenting the engine only while shown"""
+        self.show_stats = not self.show_stats
+        if self.show_stats:
+            ChessStats.enable()
+        elif not os.environ.get('CHESS_STATS_DUMP'):
+            ChessStats.disable()
+        self.previous_stats = None
+
+    def draw_stats_overlay(self):
+        """Draw frame time and per-frame engine timings over the board"""
+        current = ChessStats.stats()['counters']
+        previous = self.previous_stats or current
+        self.previous_stats = current
+
+        def frame_delta(name, field):
+            if name not in current:
+                return 0
+            return current[name][field] - previous[name][field]
+
+        lines = [
+            f"Frame: {self.clock.get_time()} ms ({self.clock.get_fps():.0f} fps)",
+            f"Movegen: {frame_delta('getValidMoves', 'total_ms'):.2f} ms "
+            f"({frame_delta('getValidMoves', 'calls')} calls)",
+            f"Attack checks: {frame_delta('squareUnderAttack', 'calls')}",
+            f"Moves allocated: {frame_delta('Move', 'calls')}",
+        ]
+
+        overlay = p.Surface((260, 20 * len(lines) + 10), p.SRCALPHA)
+        overlay.fill((0, 0, 0, 180))
+        for i, line in enumerate(lines):
+            overlay.blit(self.font_small.render(line, True, COLORS['text_primary']), (8, 6 + i * 20))
+        self.screen.blit(overlay, (10, HEADER_HEIGHT + 10))
+
+    def draw_profiler_overlay(self):
+        """Draw rolling frame-section percentiles and the dropped frame count"""
+        summary = self.profiler.summary()
+        lines = [f"Frames: {self.profiler.frame_count}  Dropped: {self.profiler.dropped}",
+                 "section          p50    p95    p99 (ms)"]
+        for name, (p50, p95, p99) in summary.items():
+            lines.append(f"{name:<15}{p50:6.2f} {p95:6.2f} {p99:6.2f}")
+
+        overlay = p.Surface((300, 18 * len(lines) + 10), p.SRCALPHA)
+        overlay.fill((0, 0, 0, 180))
+        for i, line in enumerate(lines):
+            overlay.blit(self.font_mono.render(line, True, COLORS['text_primary']), (8, 6 + i * 18))
+        self.screen.blit(overlay, (BOARD_SIZE - 310, HEADER_HEIGHT + 10))
+
+    def export_profile(self):
+        """Save the buffered frame timings as a Chrome trace file"""
+        filename = f"frame_trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        try:
+            frames = self.profiler.export_trace(filename)
+            print(f"✓ Exported {frames} frames to {filename}")
+        except OSError as e:
+            print(f"✗ Trace export failed: {e}")
+
     def count_material(self, color):
-        """Count material for given color"""
-        values = {'p': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 0}
+        """Count material for given color, in pawns by the evaluation's piece values"""
         total = 0
 
         for row in self.gs.board:
             for piece in row:
                 if piece != "--" and piece[0] == color:
-                    total += values.get(piece[1], 0)
+                    total += ChessEval.PIECE_VALUES.get(piece[1], 0)
 
-        return total
+        return round(total / 100)
 
     def get_game_duration(self):
         """Get formatted game duration"""
@@ -1014,42 +1338,54 @@ class ChessComGame:
         running = True
 
         # Play start sound
-        if SOUNDS.get('game_start'):
-            SOUNDS['game_start'].play()
+        self.sounds.play('game_start')
 
         while running:
-            running = self.handle_events()
+            self.profiler.begin_frame()
+            with self.profiler.section('handle_events'):
+                running = self.handle_events()
 
             # Update game state if move was made
+            position_changed = self.move_made
             if self.move_made:
-                self.valid_moves = self.gs.getValidMoves()
+                with self.profiler.section('valid_moves'):
+                    self.valid_moves = self.gs.getValidMoves()
                 self.move_made = False
+                self.tablebase_hint = ChessTablebase.describe(self.gs)
+                if self.show_analysis:
+                    self.analysis.start(self.gs)
+            self.update_clock(position_changed)
+            self.update_opponent(position_changed)
 
             # Draw everything
             self.draw_everything()
 
             # Update display
+            with self.profiler.section('display_flip'):
+                p.display.flip()
+            self.profiler.end_frame()
             self.clock.tick(MAX_FPS)
-            p.display.flip()
 
         # Auto-save on quit
-        if len(self.gs.moveLog) > 0:
+        if len(self.gs.moveLog) > 0 and not self.replay:
             result = self.get_game_result()
             moves = [move.getChessNotation() for move in self.gs.moveLog]
-            self.game_manager.add_game(moves, result)
-
+            self.game_manager.add_game(moves, result, *self.get_players())
+        self.game_manager.journal.finish()
+        self.game_manager.close()
+
+        self.analysis.stop()
+        if self.opponent:
+            self.opponent.stop()
+        ChessStats.stop_dump()
         p.quit()
         sys.exit()
 
 
 def main():
     """Main function"""
-    # Create necessary directories
-    os.makedirs("images", exist_ok=True)
-    os.makedirs("sounds", exist_ok=True)
-
     print("🎮 Starting Chess Desktop...")
-    print("📁 Image/sound directories created")
+    ChessStats.enable_from_environment()
     print("⌨️  Keyboard shortcuts: Ctrl+N (New), Ctrl+Z (Undo), Ctrl+S (Save)")
 
     game = ChessComGame()
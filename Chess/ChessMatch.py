@@ -0,0 +1,226 @@
+"""
+Self-play match runner - Plays engine configurations against each other across a process pool.
+
+Example (run from the Chess directory):
+    python ChessMatch.py --engine name=base,depth=2 --engine name=deep,depth=3 \\
+        --openings openings.txt --games 40 --movetime 500 --workers 8 --pgn match.pgn
+
+Selective search features can be switched off per engine, e.g. name=plain,off=null_move+lmr.
+With --tc 1+0.1 the games are played on a chess clock instead of a fixed movetime,
+and a side that runs out of time loses.
+
+Each line of the openings file is either a FEN or a list of moves like 'e2e4 e7e5'.
+Every opening is played twice with colours reversed.
+"""
+
+import argparse
+import math
+import multiprocessing
+import time
+
+import ChessEngine
+import ChessPgn
+import ChessSearch
+import ChessTime
+
+MAX_PLIES = 400
+# Extra time a move may take over its budget before it counts as a time forfeit
+TIME_MARGIN = 0.5
+
+
+class EngineConfig:
+    """Search settings for one side of the match"""
+
+    def __init__(self, name, depth=None, movetime=None, nodes=None, off=()):
+        self.name = name
+        self.depth = depth
+        self.movetime = movetime
+        self.nodes = nodes
+        self.features = set(ChessSearch.SELECTIVE_FEATURES) - set(off)
+
+    @classmethod
+    def parse(cls, text):
+        """Build a config from 'name=base,depth=3,movetime=500,off=lmr+futility'"""
+        fields = dict(part.split('=', 1) for part in text.split(',') if part)
+        name = fields.pop('name', text)
+        off = fields.pop('off', '').split('+')
+        unknown = set(off) - set(ChessSearch.SELECTIVE_FEATURES) - {''}
+        if unknown:
+            raise ValueError(f"Unknown search features {sorted(unknown)} in '{text}'")
+        return cls(name, off=off, **{key: int(value) for key, value in fields.items()})
+
+    def limits(self, default_movetime, clock=None, white=True):
+        if clock is not None:
+            return ChessSearch.SearchLimits(depth=self.depth, nodes=self.nodes, **clock.search_limits(white))
+        movetime = self.movetime if self.movetime is not None else default_movetime
+        return ChessSearch.SearchLimits(depth=self.depth, movetime=movetime, nodes=self.nodes)
+
+
+def load_openings(path):
+    """Read starting positions, skipping blank lines and '#' comments"""
+    if path is None:
+        return [""]
+    with open(path, 'r') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def setup_position(opening):
+    """Create a GameState for an opening line, returning it and the moves played"""
+    gs = ChessEngine.GameState()
+    if opening.count('/') == 7:
+        gs.loadFen(opening)
+        return gs, []
+
+    moves = []
+    for notation in opening.split():
+        move = gs.get_move_from_notation(notation[:4])
+        if move is None:
+            raise ValueError(f"Illegal opening move {notation} in '{opening}'")
+        gs.makeMove(move)
+        moves.append(notation[:4])
+    return gs, moves
+
+
+def play_game(job):
+    """Play one game; runs inside a pool worker with its own GameState"""
+    opening, white, black, movetime, time_control = job
+    gs, _ = setup_position(opening)
+    clock = ChessTime.GameClock(ChessTime.TimeControl.parse(time_control)) if time_control else None
+    configs = {True: white, False: black}
+    searchers = {True: ChessSearch.Searcher(features=white.features),
+                 False: ChessSearch.Searcher(features=black.features)}
+    stats = {white.name: [0, 0.0], black.name: [0, 0.0]}
+    result, reason = "1/2-1/2", "max plies"
+
+    for _ in range(MAX_PLIES):
+        if not gs.getValidMoves():
+            if gs.checkMate:
+                result, reason = ("0-1" if gs.whiteToMove else "1-0"), "checkmate"
+            else:
+                reason = "stalemate"
+            break
+        draw_reason = gs.getDrawReason()
+        if draw_reason:
+            reason = draw_reason
+            break
+
+        config = configs[gs.whiteToMove]
+        if clock is not None and clock.running is None:
+            clock.start(gs.whiteToMove)
+        limits = config.limits(movetime, clock, gs.whiteToMove)
+        search = searchers[gs.whiteToMove].search(gs, limits)
+        stats[config.name][0] += search.nodes
+        stats[config.name][1] += search.elapsed
+
+        if clock is not None:
+            clock.press(gs.whiteToMove)
+            forfeit = clock.flagged is not None
+        else:
+            budget = limits.time_budget(gs.whiteToMove)
+            forfeit = budget is not None and search.elapsed > budget + TIME_MARGIN
+        if forfeit:
+            result, reason = ("0-1" if gs.whiteToMove else "1-0"), "time forfeit"
+            break
+
+        gs.makeMove(search.best_move)
+
+    return {
+        'opening': opening,
+        'white': white.name,
+        'black': black.name,
+        'result': result,
+        'reason': reason,
+        'moves': [move.getChessNotation() for move in gs.moveLog],  # Includes the opening moves
+        'stats': stats,
+    }
+
+
+def elo_difference(wins, draws, losses):
+    """Elo difference and 95% error margin from a win/draw/loss record"""
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+
+    def to_elo(s):
+        s = min(max(s, 1e-6), 1 - 1e-6)
+        return -400 * math.log10(1 / s - 1)
+
+    return to_elo(score), (to_elo(score + margin) - to_elo(score - margin)) / 2
+
+
+def run_match(first, second, openings, games, movetime, workers, pgn_path=None, time_control=None):
+    """Play `games` games between two configs and print the aggregated results"""
+    jobs = []
+    for i in range(games):
+        opening = openings[(i // 2) % len(openings)]
+        white, black = (first, second) if i % 2 == 0 else (second, first)
+        jobs.append((opening, white, black, movetime, time_control))
+
+    record = [0, 0, 0]  # Wins, draws, losses from the first config's point of view
+    totals = {first.name: [0, 0.0], second.name: [0, 0.0]}
+    reasons = {}
+    start = time.time()
+
+    pgn_file = open(pgn_path, 'a') if pgn_path else None
+    try:
+        with multiprocessing.Pool(workers) as pool:
+            for n, game in enumerate(pool.imap_unordered(play_game, jobs), 1):
+                if game['result'] == "1/2-1/2":
+                    record[1] += 1
+                elif (game['result'] == "1-0") == (game['white'] == first.name):
+                    record[0] += 1
+                else:
+                    record[2] += 1
+                reasons[game['reason']] = reasons.get(game['reason'], 0) + 1
+                for name, (nodes, seconds) in game['stats'].items():
+                    totals[name][0] += nodes
+                    totals[name][1] += seconds
+
+                if pgn_file:
+                    headers = {'White': game['white'], 'Black': game['black'],
+                               'Termination': game['reason'], 'Opening': game['opening']}
+                    if game['opening'].count('/') == 7:
+                        headers['FEN'] = game['opening']  # The moves start from it
+                    pgn_file.write(ChessPgn.game_to_pgn(game['moves'], game['result'], headers) + "\n\n")
+                    pgn_file.flush()
+                print(f"Game {n}/{games}: {game['white']} vs {game['black']} "
+                      f"{game['result']} ({game['reason']})")
+    finally:
+        if pgn_file:
+            pgn_file.close()
+
+    elo, margin = elo_difference(*record)
+    print(f"\n{first.name} vs {second.name}: +{record[0]} ={record[1]} -{record[2]}")
+    print(f"Elo difference: {elo:+.1f} +/- {margin:.1f}")
+    print("Results: " + ", ".join(f"{reason} {count}" for reason, count in sorted(reasons.items())))
+    for name, (nodes, seconds) in totals.items():
+        nps = int(nodes / seconds) if seconds else 0
+        print(f"{name}: {nodes} nodes in {seconds:.1f}s, {nps} nps")
+    print(f"Wall time: {time.time() - start:.1f}s")
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Self-play match between two engine configurations")
+    parser.add_argument('--engine', action='append', required=True,
+                        help="Engine config like name=base,depth=3,movetime=500 (give exactly two)")
+    parser.add_argument('--openings', help="File with one FEN or move list per line")
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--movetime', type=int, default=1000, help="Default per-move budget in ms")
+    parser.add_argument('--tc', help="Play on a clock instead, e.g. 1+0.1 (minutes + increment seconds)")
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--pgn', help="Append every game to this PGN file")
+    args = parser.parse_args()
+
+    if len(args.engine) != 2:
+        parser.error("exactly two --engine configs are required")
+    first, second = (EngineConfig.parse(text) for text in args.engine)
+    run_match(first, second, load_openings(args.openings), args.games,
+              args.movetime, args.workers, args.pgn, args.tc)
+
+
+if __name__ == "__main__":
+    main()
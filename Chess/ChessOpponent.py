@@ -0,0 +1,115 @@
+"""
+Engine Opponent - Plays one side in the GUI and ponders on the human's expected reply.
+
+After the engine moves it keeps searching the position after the reply its
+principal variation predicts. If the human plays that move the running search
+is switched over to the clock (a ponder hit) instead of being restarted; on a
+miss it is stopped and a fresh search starts. Both reuse one Searcher, so the
+transposition table and move-ordering tables carry over from move to move.
+"""
+
+import threading
+
+import ChessEngine
+import ChessSearch
+
+DEFAULT_MOVETIME = 1500  # ms per move
+
+
+class EngineOpponent:
+    """Background searches for the GUI; poll take_move() once a frame"""
+
+    def __init__(self, movetime=DEFAULT_MOVETIME):
+        self.movetime = movetime
+        self.searcher = ChessSearch.Searcher()
+        self.thread = None
+        self.result = None
+        self.state = 'idle'  # 'idle', 'thinking' or 'pondering'
+        self.search_key = None  # Zobrist key of the position being searched
+        self.ponder_move = None  # Expected reply (notation) and the key of the position it leads to
+        self.ponder_key = None
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+
+    def status(self):
+        if self.state == 'pondering':
+            return f"pondering {self.ponder_move}"
+        return self.state
+
+    def start(self, position, limits):
+        self.result = None
+        self.search_key = position.zobristKey
+        self.thread = threading.Thread(target=self.run, args=(position, limits), daemon=True)
+        self.thread.start()
+
+    def run(self, position, limits):
+        self.result = self.searcher.search(position, limits)
+
+    def stop(self):
+        """Abandon any running search"""
+        while self.thread is not None and self.thread.is_alive():
+            self.searcher.stop()
+            self.thread.join(0.01)
+        self.thread = None
+        self.state = 'idle'
+
+    def limits(self, gs, clock=None, ponder=False):
+        """Search limits from the game clock (a ChessTime.GameClock), or the fixed movetime without one"""
+        if clock is None:
+            return ChessSearch.SearchLimits(movetime=self.movetime, ponder=ponder)
+        return ChessSearch.SearchLimits(ponder=ponder, **clock.search_limits(gs.whiteToMove))
+
+    def think(self, gs, clock=None):
+        """Find a move for gs, continuing the ponder search when it predicted this position"""
+        if self.state == 'thinking' and self.search_key == gs.zobristKey:
+            return
+        if self.state == 'pondering' and self.search_key == gs.zobristKey:
+            self.ponder_hits += 1
+            self.searcher.ponderhit()
+            self.state = 'thinking'
+            return
+        if self.state == 'pondering':
+            self.ponder_misses += 1
+        self.stop()
+        self.start(copy_position(gs), self.limits(gs, clock))
+        self.state = 'thinking'
+
+    def take_move(self, gs):
+        """The engine's move (notation) for gs once the search is done, else None"""
+        if self.state != 'thinking' or self.search_key != gs.zobristKey or self.result is None:
+            return None
+        self.thread = None
+        self.state = 'idle'
+        result = self.result
+        if result.best_move is None:
+            return None
+
+        self.ponder_move = self.ponder_key = None
+        if len(result.pv) > 1:
+            position = copy_position(gs)
+            position.makeMove(result.best_move)
+            self.ponder_key = position.zobristKey
+            self.ponder_move = result.pv[1].getChessNotation()
+        return result.best_move.getChessNotation()
+
+    def ponder(self, gs, clock=None):
+        """Search the expected reply while the human thinks about gs"""
+        if self.state == 'pondering' and self.ponder_key == gs.zobristKey:
+            return  # Already pondering on this position
+        self.stop()
+        if self.ponder_key != gs.zobristKey:
+            return
+        position = copy_position(gs)
+        move = position.get_move_from_notation(self.ponder_move)
+        if move is None:
+            return
+        position.makeMove(move)
+        self.start(position, self.limits(position, clock, ponder=True))
+        self.state = 'pondering'
+
+
+def copy_position(gs):
+    """Independent GameState for a search thread"""
+    position = ChessEngine.GameState()
+    position.restoreSnapshot(gs.getSnapshot())
+    return position
@@ -0,0 +1,99 @@
+"""
+Pawn Structure - Doubled, isolated and passed pawn terms, cached by GameState.pawnKey.
+
+Pawn structure only changes on pawn moves, pawn captures and promotions, so
+almost every evaluation during a search is answered from the cache.
+"""
+
+DOUBLED_PAWN_PENALTY = 10
+ISOLATED_PAWN_PENALTY = 15
+# Bonus for a passed pawn by the number of ranks it has advanced
+PASSED_PAWN_BONUS = [0, 5, 10, 20, 35, 60, 100, 0]
+
+PAWN_CACHE_SIZE = 1 << 14
+
+
+class PawnCache:
+    """Fixed-size, always-replace table of pawn scores indexed by the low bits of the pawn key"""
+
+    def __init__(self, size=PAWN_CACHE_SIZE):
+        if size & (size - 1):
+            raise ValueError("Pawn cache size must be a power of two")
+        self.mask = size - 1
+        self.keys = [None] * size
+        self.scores = [0] * size
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, key):
+        """Cached score for a pawn key, or None"""
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.scores[index]
+        self.misses += 1
+        return None
+
+    def store(self, key, score):
+        index = key & self.mask
+        self.keys[index] = key
+        self.scores[index] = score
+
+    def hit_rate(self):
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def clear(self):
+        self.keys = [None] * len(self.keys)
+        self.hits = 0
+        self.misses = 0
+
+
+pawn_cache = PawnCache()
+
+
+def pawn_structure_score(board):
+    """Pawn-structure score in centipawns from white's point of view"""
+    files = {'w': [[] for _ in range(8)], 'b': [[] for _ in range(8)]}
+    for r in range(8):
+        for c in range(8):
+            piece = board[r][c]
+            if piece == 'wp' or piece == 'bp':
+                files[piece[0]][c].append(r)
+
+    score = 0
+    for color, sign in (('w', 1), ('b', -1)):
+        own = files[color]
+        enemy = files['b' if color == 'w' else 'w']
+        for c in range(8):
+            rows = own[c]
+            if not rows:
+                continue
+            if len(rows) > 1:
+                score -= sign * DOUBLED_PAWN_PENALTY * (len(rows) - 1)
+
+            neighbours = [f for f in (c - 1, c + 1) if 0 <= f < 8]
+            if not any(own[f] for f in neighbours):
+                score -= sign * ISOLATED_PAWN_PENALTY * len(rows)
+
+            for r in rows:
+                # Passed: no enemy pawn ahead on this or an adjacent file
+                if color == 'w':
+                    blocked = any(er < r for f in neighbours + [c] for er in enemy[f])
+                    advanced = 6 - r
+                else:
+                    blocked = any(er > r for f in neighbours + [c] for er in enemy[f])
+                    advanced = r - 1
+                if not blocked:
+                    score += sign * PASSED_PAWN_BONUS[advanced]
+    return score
+
+
+def evaluate_pawns(gs, cache=None):
+    """Pawn-structure score for the position, looked up by pawn key before computing it"""
+    cache = cache if cache is not None else pawn_cache
+    score = cache.probe(gs.pawnKey)
+    if score is None:
+        score = pawn_structure_score(gs.board)
+        cache.store(gs.pawnKey, score)
+    return score
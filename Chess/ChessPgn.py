@@ -0,0 +1,86 @@
+"""
+PGN helpers - Writes and reads games in the coordinate-notation PGN used by the exporter.
+"""
+
+import re
+from datetime import datetime
+
+TAG_PATTERN = re.compile(r'\[(\w+)\s+"(.*)"\]')
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+
+def game_to_pgn(moves, result, headers=None):
+    """
+    Build PGN text from a list of 'e2e4' style moves. With a 'FEN' header the moves
+    start from that position: SetUp is added and the numbering follows the FEN.
+    """
+    tags = {
+        'Date': datetime.now().strftime("%Y.%m.%d"),
+        'White': "Human",
+        'Black': "Human",
+        'Result': result,
+        'TimeControl': "-",
+    }
+    tags.update(headers or {})
+    tags['Result'] = result
+
+    first_move, black_first = 1, False
+    if tags.get('FEN'):
+        tags['SetUp'] = "1"
+        fields = tags['FEN'].split()
+        black_first = len(fields) > 1 and fields[1] == 'b'
+        if len(fields) > 5 and fields[5].isdigit():
+            first_move = int(fields[5])
+
+    lines = [f'[{name} "{value}"]' for name, value in tags.items()]
+    lines.append('')
+
+    move_text = f"{first_move}. ... " if black_first and moves else ""
+    for i, move in enumerate(moves, int(black_first)):
+        if i % 2 == 0:
+            move_text += f"{first_move + i // 2}. {move} "
+        else:
+            move_text += f"{move} "
+    move_text += result
+    lines.append(move_text)
+    return '\n'.join(lines)
+
+
+def read_pgn(path):
+    """Read every game in a PGN file as dicts with 'headers', 'moves' and 'result'"""
+    with open(path, 'r') as f:
+        return parse_pgn(f.read())
+
+
+def parse_pgn(text):
+    """Parse PGN text containing one or more games"""
+    games = []
+    headers = {}
+    moves = []
+
+    def finish(result):
+        games.append({'headers': headers, 'moves': moves, 'result': result})
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        tag = TAG_PATTERN.match(line)
+        if tag:
+            if moves:
+                # Tags after move text start the next game
+                finish(headers.get('Result', "*"))
+                headers, moves = {}, []
+            headers[tag.group(1)] = tag.group(2)
+            continue
+
+        for token in line.split():
+            if token in RESULTS:
+                finish(token)
+                headers, moves = {}, []
+            elif not token.endswith('.'):
+                moves.append(token)
+
+    if moves or headers:
+        finish(headers.get('Result', "*"))
+    return games
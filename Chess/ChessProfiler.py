@@ -0,0 +1,115 @@
+"""
+Frame Profiler - Per-section frame timings in a ring buffer, with percentiles and trace export.
+
+While disabled, section() hands back a shared no-op context manager, so the
+instrumented game loop costs one attribute check per section.
+"""
+
+import json
+import time
+from collections import deque
+
+
+class _NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class _Section:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class FrameProfiler:
+    """Keeps the timings of the last `history` frames"""
+
+    def __init__(self, target_fps=60, history=600):
+        self.budget = 1.0 / target_fps
+        self.frames = deque(maxlen=history)  # (frame start, frame end, [(section, start, end)])
+        self.enabled = False
+        self.dropped = 0
+        self.frame_count = 0
+        self.frame_start = None
+        self.sections = []
+        self.last_frame_start = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frames.clear()
+        self.dropped = 0
+        self.frame_count = 0
+        self.last_frame_start = None
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        # A frame is dropped when the previous one took noticeably longer than the budget
+        if self.last_frame_start is not None and now - self.last_frame_start > self.budget * 1.5:
+            self.dropped += 1
+        self.last_frame_start = now
+        self.frame_start = now
+        self.sections = []
+
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        self.frames.append((self.frame_start, time.perf_counter(), self.sections))
+        self.frame_count += 1
+        self.frame_start = None
+
+    def section(self, name):
+        """Context manager timing one part of the current frame"""
+        if not self.enabled:
+            return _NULL_SECTION
+        return _Section(self, name)
+
+    def record(self, name, start, end):
+        if self.frame_start is not None:
+            self.sections.append((name, start, end))
+
+    def summary(self):
+        """{section: (p50, p95, p99)} in milliseconds, plus 'frame' for the whole frame"""
+        timings = {'frame': [(end - start) * 1000 for start, end, _ in self.frames]}
+        for _, _, sections in self.frames:
+            for name, start, end in sections:
+                timings.setdefault(name, []).append((end - start) * 1000)
+        return {name: (percentile(values, 0.5), percentile(values, 0.95), percentile(values, 0.99))
+                for name, values in timings.items()}
+
+    def export_trace(self, path):
+        """Write the buffered frames as a Chrome trace (open in chrome://tracing or Perfetto)"""
+        events = []
+        for index, (frame_start, frame_end, sections) in enumerate(self.frames):
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1,
+                           'ts': frame_start * 1e6, 'dur': (frame_end - frame_start) * 1e6,
+                           'args': {'index': index}})
+            for name, start, end in sections:
+                events.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1,
+                               'ts': start * 1e6, 'dur': (end - start) * 1e6})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(self.frames)
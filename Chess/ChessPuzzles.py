@@ -0,0 +1,330 @@
+"""
+Puzzle Miner - Turns saved games into tactics puzzles with a two-stage process pipeline.
+
+    reader -> [games] -> screen workers -> [results] -> main -> [candidates] -> verify workers
+                                                           ^                                |
+                                                           +---------- [results] -----------+
+
+The reader streams games from chess_games.json, PGN files or binary archives.
+Screen workers replay each game and give every position a cheap shallow
+search; a move that throws away a lot of evaluation leaves the opponent a
+candidate puzzle. Candidates come back to the main process, which passes each
+position (by Zobrist key) on once, so repeated games and positions mined by
+earlier runs are never verified again. Only those reach the verify workers,
+which look for a forced mate with the mate solver and otherwise search deeply
+for a single clearly best move. The games and candidates queues are bounded,
+so the reader can't run ahead of the search; the main process drains the
+results queue all the time.
+
+Example (run from the Chess directory):
+    python ChessPuzzles.py chess_games.json match.pgn --out puzzles.jsonl --screen-workers 6
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import ChessBinary
+import ChessEngine
+import ChessPgn
+import ChessSearch
+import ChessSolver
+import ChessTime
+
+SCREEN_DEPTH = 2
+VERIFY_DEPTH = 4
+SKIP_PLIES = 6  # Opening moves that are never screened
+SWING = 200  # Centipawns a move has to lose by the screen to leave a candidate
+MIN_ADVANTAGE = 250  # Score the side to move needs for a puzzle
+UNIQUE_GAP = 150  # How much better the solution has to be than the second best move
+MATE_MOVES = 3  # Longest mate the verifier proves with the mate solver
+MATE_NODES = 20000
+SOLUTION_PLIES = 5
+QUEUE_SIZE = 32
+POLL_SECONDS = 1.0  # How often the main process checks that the workers are still alive
+DONE = None  # End of a queue's input
+
+
+def read_games(path):
+    """Yield (source, start FEN or None, moves, result) for every game in a .json, .jsonl, .pgn or .bcg file"""
+    name = os.path.basename(path)
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.bcg':
+        archive = ChessBinary.GameArchive.open(path)
+        for index in range(len(archive)):
+            header = archive.header(index)
+            moves = [ChessBinary.unpack_move(code) for code in archive.move_codes(index)]
+            yield f"{name}#{header[0]}", None, moves, header[2]
+    elif extension == '.pgn':
+        for index, game in enumerate(ChessPgn.read_pgn(path), 1):
+            yield f"{name}#{index}", game['headers'].get('FEN'), game['moves'], game['result']
+    elif extension == '.jsonl':
+        # One chess_games.json record per line, as ChessGameServer stores them
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    game = json.loads(line)
+                    yield f"{name}#{game.get('id')}", None, game['moves'], game.get('result', "*")
+    else:
+        with open(path, 'r') as f:
+            for game in json.load(f):
+                yield f"{name}#{game.get('id')}", None, game['moves'], game.get('result', "*")
+
+
+def quiet_searcher():
+    """Searcher for a worker process: no time log, no shared state"""
+    return ChessSearch.Searcher(time_manager=ChessTime.TimeManager())
+
+
+def screen_game(searcher, fen, moves, depth=SCREEN_DEPTH, swing=SWING):
+    """
+    Replay a game and return (positions screened, candidates). A candidate is the
+    position after a move that lost at least `swing` by a shallow search, with the
+    opponent now at least MIN_ADVANTAGE up: (fen, zobrist key, ply, move played).
+    """
+    gs = ChessEngine.GameState()
+    if fen:
+        gs.loadFen(fen)
+    limits = ChessSearch.SearchLimits(depth=depth)
+    candidates = []
+    screened = 0
+    previous = None  # Score before the last move, from its mover's side
+    for ply in range(len(moves) + 1):
+        score = None
+        if ply >= SKIP_PLIES:
+            score = searcher.search(gs, limits).score
+            screened += 1
+            lost = previous + score if previous is not None else 0
+            if lost >= swing and score >= MIN_ADVANTAGE and gs.getValidMoves():
+                candidates.append((gs.getFen(), gs.zobristKey, ply, moves[ply - 1]))
+        if ply == len(moves):
+            break
+        move = gs.get_move_from_notation(moves[ply][:4])
+        if move is None:
+            break  # Corrupt or illegal game record: stop replaying it
+        gs.makeMove(move)
+        previous = score
+    return screened, candidates
+
+
+def verify(searcher, solver, fen, depth=VERIFY_DEPTH):
+    """
+    Puzzle dict for a candidate position, or None when it has no forced mate and no
+    single move that keeps a winning advantage
+    """
+    gs = ChessEngine.GameState()
+    gs.loadFen(fen)
+    mate = solver.solve(gs, MATE_MOVES, node_limit=MATE_NODES)
+    if mate.mate:
+        return {'fen': fen, 'theme': f"mate in {mate.mate_in}",
+                'solution': [move.getUciNotation() for move in mate.moves],
+                'score': ChessSearch.MATE_SCORE - len(mate.moves)}
+
+    result = searcher.search(gs, ChessSearch.SearchLimits(depth=depth, multipv=2))
+    best, pv = result.lines[0]
+    second = result.lines[1][0] if len(result.lines) > 1 else -ChessSearch.INFINITY
+    if best < MIN_ADVANTAGE or best - second < UNIQUE_GAP:
+        return None
+    # The solution ends on one of the solver's own moves
+    plies = min(len(pv), SOLUTION_PLIES)
+    plies -= 1 - plies % 2
+    return {'fen': fen, 'theme': "advantage", 'solution': [move.getUciNotation() for move in pv[:plies]],
+            'score': best}
+
+
+def screen_worker(index, games, results, depth, swing):
+    """
+    Screen games until DONE, sending candidates and finally its totals to results. A game
+    that fails to replay (a bad FEN, say) is skipped with an error message.
+    """
+    screened = 0
+    busy = 0.0
+    try:
+        searcher = quiet_searcher()
+        while True:
+            game = games.get()
+            if game is DONE:
+                break
+            source, fen, moves, _ = game
+            start = time.time()
+            try:
+                positions, game_candidates = screen_game(searcher, fen, moves, depth, swing)
+            except Exception as e:
+                results.put(('error', f"skipped {source}: {type(e).__name__}: {e}"))
+                continue
+            finally:
+                busy += time.time() - start
+            screened += positions
+            for candidate_fen, key, ply, played in game_candidates:
+                results.put(('candidate', source, candidate_fen, key, ply, played))
+    finally:
+        results.put(('screened', index, screened, busy))
+
+
+def verify_worker(index, candidates, results, depth):
+    """Verify candidates until DONE, sending every puzzle found and finally its totals to results"""
+    verified = 0
+    busy = 0.0
+    try:
+        searcher = quiet_searcher()
+        solver = ChessSolver.MateSolver()
+        while True:
+            candidate = candidates.get()
+            if candidate is DONE:
+                break
+            source, fen, key, ply, played = candidate
+            start = time.time()
+            try:
+                puzzle = verify(searcher, solver, fen, depth)
+            except Exception as e:
+                results.put(('error', f"skipped {source} ply {ply}: {type(e).__name__}: {e}"))
+                continue
+            finally:
+                busy += time.time() - start
+            verified += 1
+            if puzzle:
+                puzzle.update(key=key, source=source, ply=ply, blunder=played)
+                results.put(('puzzle', puzzle))
+    finally:
+        results.put(('verified', index, verified, busy))
+
+
+def mine(paths, out_path, screen_workers=2, verify_workers=1, screen_depth=SCREEN_DEPTH,
+         verify_depth=VERIFY_DEPTH, swing=SWING, log=print):
+    """
+    Mine every game in paths, appending new puzzles to out_path as JSON lines; returns the
+    totals. A file that can't be read ends the input early, and a game or candidate that
+    fails is skipped; both are listed in totals['errors'], as is a worker that died.
+    """
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if missing:
+        raise FileNotFoundError(f"no such file: {', '.join(missing)}")
+    games = multiprocessing.Queue(QUEUE_SIZE)
+    candidates = multiprocessing.Queue(QUEUE_SIZE)
+    results = multiprocessing.Queue()
+    screeners = [multiprocessing.Process(target=screen_worker, args=(i, games, results, screen_depth, swing),
+                                         daemon=True) for i in range(screen_workers)]
+    verifiers = [multiprocessing.Process(target=verify_worker, args=(i, candidates, results, verify_depth),
+                                         daemon=True) for i in range(verify_workers)]
+    for process in screeners + verifiers:
+        process.start()
+
+    totals = {'games': 0, 'positions': 0, 'candidates': 0, 'verified': 0, 'puzzles': 0, 'duplicates': 0,
+              'screen_seconds': 0.0, 'verify_seconds': 0.0, 'errors': []}
+    seen = set()  # Keys of positions already passed on for verification
+    if os.path.exists(out_path):
+        # Puzzles from earlier runs are not mined again
+        with open(out_path, 'r') as f:
+            seen.update(json.loads(line)['key'] for line in f if line.strip())
+    start = time.time()
+
+    def feed():
+        # Blocks whenever the screeners fall behind
+        path = None
+        try:
+            for path in paths:
+                for game in read_games(path):
+                    games.put(game)
+                    totals['games'] += 1
+        except Exception as e:
+            results.put(('error', f"stopped reading {path}: {type(e).__name__}: {e}"))
+        finally:
+            # Without these the screeners, and so the main loop, would wait forever
+            for _ in screeners:
+                games.put(DONE)
+
+    reader = threading.Thread(target=feed, daemon=True)
+    reader.start()
+
+    # Workers that haven't sent their totals yet, by kind and index
+    running = {('screened', i): process for i, process in enumerate(screeners)}
+    running.update({('verified', i): process for i, process in enumerate(verifiers)})
+    suspects = set()  # Found dead without totals; lost if nothing arrives by the next poll
+
+    def finished(kind):
+        # Once every screener is done, every candidate has been passed on: let the verifiers finish
+        if kind == 'screened' and not any(name == 'screened' for name, _ in running):
+            for _ in verifiers:
+                candidates.put(DONE)
+
+    with open(out_path, 'a') as out:
+        while any(name == 'verified' for name, _ in running):
+            try:
+                message = results.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                # A worker flushes its totals before exiting, so one that is still missing a
+                # whole poll after it was found dead was killed (out of memory, say)
+                for worker in suspects & set(running):
+                    del running[worker]
+                    name = f"{'screen' if worker[0] == 'screened' else 'verify'} worker {worker[1]}"
+                    totals['errors'].append(f"{name} died")
+                    log(f"Error: {name} died")
+                    finished(worker[0])
+                suspects = {worker for worker, process in running.items() if not process.is_alive()}
+                continue
+            kind = message[0]
+            if kind == 'candidate':
+                totals['candidates'] += 1
+                if message[3] in seen:
+                    totals['duplicates'] += 1
+                    continue
+                seen.add(message[3])
+                candidates.put(message[1:])
+            elif kind == 'puzzle':
+                puzzle = message[1]
+                totals['puzzles'] += 1
+                out.write(json.dumps(puzzle) + "\n")
+                out.flush()
+                log(f"{puzzle['source']} ply {puzzle['ply']}: {puzzle['theme']} {' '.join(puzzle['solution'])}")
+            elif kind == 'error':
+                totals['errors'].append(message[1])
+                log(f"Error: {message[1]}")
+            elif running.pop((kind, message[1]), None) is not None:
+                if kind == 'screened':
+                    totals['positions'] += message[2]
+                    totals['screen_seconds'] += message[3]
+                else:
+                    totals['verified'] += message[2]
+                    totals['verify_seconds'] += message[3]
+                finished(kind)
+
+    # With every screener lost the reader may be stuck on a full queue; it is a daemon thread
+    reader.join(POLL_SECONDS)
+    for process in screeners + verifiers:
+        process.join()
+    totals['wall_seconds'] = time.time() - start
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mine tactics puzzles from saved games")
+    parser.add_argument('inputs', nargs='+', help="chess_games.json, .pgn or .bcg files")
+    parser.add_argument('--out', default="puzzles.jsonl")
+    parser.add_argument('--screen-workers', type=int, default=max(1, multiprocessing.cpu_count() - 1))
+    parser.add_argument('--verify-workers', type=int, default=1)
+    parser.add_argument('--screen-depth', type=int, default=SCREEN_DEPTH)
+    parser.add_argument('--verify-depth', type=int, default=VERIFY_DEPTH)
+    parser.add_argument('--swing', type=int, default=SWING, help="Centipawns a blunder must lose")
+    args = parser.parse_args()
+
+    try:
+        totals = mine(args.inputs, args.out, args.screen_workers, args.verify_workers,
+                      args.screen_depth, args.verify_depth, args.swing)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    share = 100 * totals['verified'] / totals['positions'] if totals['positions'] else 0.0
+    print(f"\n{totals['games']} games, {totals['positions']} positions screened "
+          f"({totals['screen_seconds']:.1f}s), {totals['candidates']} candidates, "
+          f"{totals['verified']} verified ({share:.1f}% of positions, {totals['verify_seconds']:.1f}s)")
+    print(f"{totals['puzzles']} new puzzles, {totals['duplicates']} duplicate candidates skipped -> {args.out} "
+          f"in {totals['wall_seconds']:.1f}s")
+    if totals['errors']:
+        parser.exit(1, f"{len(totals['errors'])} error(s) while mining; some games were not screened\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Game Replay - Steps through a recorded game using cached position snapshots.
+
+A snapshot is taken every `interval` plies while the game is first replayed, so
+jumping to any ply costs at most `interval` makeMove/undoMove calls.
+"""
+
+import ChessEngine
+
+SNAPSHOT_INTERVAL = 8
+
+
+class GameReplay:
+    """Navigates back and forth through a finished list of moves"""
+
+    def __init__(self, move_notations, interval=SNAPSHOT_INTERVAL, gs=None):
+        self.interval = interval
+        self.gs = gs if gs is not None else ChessEngine.GameState()
+        self.moves = []
+        self.snapshots = [self.gs.getSnapshot()]
+
+        # Replay once to resolve notation into Move objects and fill the cache
+        for notation in move_notations:
+            move = self.gs.get_move_from_notation(notation)
+            if move is None:
+                print(f"⚠ Could not replay move: {notation}")
+                break
+            self.gs.makeMove(move)
+            self.moves.append(move)
+            if len(self.moves) % self.interval == 0:
+                self.snapshots.append(self.gs.getSnapshot())
+
+        self.ply = len(self.moves)
+
+    @property
+    def length(self):
+        return len(self.moves)
+
+    @property
+    def last_move(self):
+        """Move that led to the current position"""
+        return self.moves[self.ply - 1] if self.ply > 0 else None
+
+    def go_to(self, ply):
+        """Move the game state to the given ply (0 is the starting position)"""
+        ply = max(0, min(ply, self.length))
+        if ply == self.ply:
+            return
+
+        # Take whichever is cheaper: walking from the current ply or
+        # restoring the nearest snapshot at or before the target
+        distance = ply - self.ply
+        nearest = ply - ply % self.interval
+        if distance > 0 and self.ply >= nearest:
+            self._step_forward(distance)
+        elif distance < 0 and -distance <= ply - nearest:
+            for _ in range(-distance):
+                self.gs.undoMove()
+            self.ply = ply
+        else:
+            self.gs.restoreSnapshot(self.snapshots[nearest // self.interval])
+            self.ply = nearest
+            self._step_forward(ply - nearest)
+
+    def _step_forward(self, count):
+        for move in self.moves[self.ply:self.ply + count]:
+            self.gs.makeMove(move)
+        self.ply += count
+
+    def first(self):
+        self.go_to(0)
+
+    def previous(self):
+        self.go_to(self.ply - 1)
+
+    def next(self):
+        self.go_to(self.ply + 1)
+
+    def last(self):
+        self.go_to(self.length)
+
+    def at_end(self):
+        return self.ply == self.length
@@ -0,0 +1,565 @@
+"""
+Chess Search - Iterative deepening alpha-beta search over GameState.
+
+On top of plain alpha-beta the searcher has a selective layer: principal
+variation search, aspiration windows at the root, null-move pruning,
+late-move reductions, futility pruning and static exchange evaluation (losing
+captures are skipped in quiescence and ordered last). Each can be switched off through
+the `features` of a Searcher, and every search counts how often each one
+fired (SearchResult.stats) so their effect can be measured.
+"""
+
+import struct
+import threading
+import time
+
+import ChessEval
+import ChessTablebase
+import ChessTime
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+MAX_DEPTH = 64
+
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2
+TT_DEFAULT_MB = 1
+_TT_ENTRY = struct.Struct('<QQ')
+_TT_SCORE_OFFSET = 1 << 31
+
+SELECTIVE_FEATURES = ('pvs', 'aspiration', 'null_move', 'lmr', 'futility', 'see')
+SELECTIVE_COUNTERS = ('pvs_researches', 'pvs_research_nodes', 'aspiration_researches',
+                      'aspiration_research_nodes', 'null_move_tries', 'null_move_cutoffs', 'null_move_nodes',
+                      'lmr_reductions', 'lmr_researches', 'futility_prunes', 'see_prunes', 'tablebase_hits')
+
+ASPIRATION_WINDOW = 50  # Centipawns either side of the previous iteration's score
+ASPIRATION_MIN_DEPTH = 3
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_REDUCTION = 2  # One more from depth 7
+LMR_MIN_DEPTH = 3
+LMR_MIN_INDEX = 3  # Moves searched at full depth before reductions start
+FUTILITY_MARGINS = [0, 200, 500]  # By remaining depth; deeper nodes are never pruned
+
+
+class SearchStopped(Exception):
+    """Raised inside the tree when the search runs out of time or is told to stop"""
+
+
+class SearchLimits:
+    """Limits for one search, mirroring the arguments of the UCI go command (times in ms)"""
+
+    def __init__(self, depth=None, movetime=None, nodes=None, wtime=None, btime=None,
+                 winc=0, binc=0, movestogo=None, infinite=False, multipv=1, ponder=False, mate=None):
+        self.depth = depth
+        self.movetime = movetime
+        self.nodes = nodes
+        self.wtime = wtime
+        self.btime = btime
+        self.winc = winc
+        self.binc = binc
+        self.movestogo = movestogo
+        self.infinite = infinite
+        self.multipv = multipv  # Number of ranked lines to search
+        self.ponder = ponder  # Untimed until Searcher.ponderhit(), then timed as usual
+        self.mate = mate  # Mate in this many moves to look for first (ChessSolver)
+
+    def time_budget(self, white_to_move):
+        """
+        Most seconds this move may take (the hard limit of ChessTime.allocate), or None
+        when the search is not timed
+        """
+        if self.infinite:
+            return None
+        if self.movetime is not None:
+            return self.movetime / 1000
+        remaining = self.wtime if white_to_move else self.btime
+        if remaining is None:
+            return None
+        increment = self.winc if white_to_move else self.binc
+        return ChessTime.allocate(remaining / 1000, increment / 1000, self.movestogo)[1]
+
+
+class SearchResult:
+    """
+    Outcome of a search: best move, score from the mover's side and principal variation.
+    `lines` holds the (score, pv) of every ranked line, best first, for multi-PV searches.
+    """
+
+    def __init__(self, best_move=None, score=0, depth=0, pv=None, nodes=0, elapsed=0.0, lines=None, stats=None):
+        self.best_move = best_move
+        self.score = score
+        self.depth = depth
+        self.pv = pv or []
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.lines = lines if lines is not None else [(score, self.pv)]
+        self.stats = stats or {}  # SELECTIVE_COUNTERS name -> count
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.elapsed) if self.elapsed > 0 else 0
+
+
+def is_mate_score(score):
+    return abs(score) > MATE_SCORE - MAX_DEPTH * 2
+
+
+def move_order_key(move):
+    """Sort key putting captures (most valuable victim, least valuable attacker) and promotions first"""
+    key = 0
+    if move.pieceCaptured != '--':
+        key += 10 * ChessEval.PIECE_VALUES[move.pieceCaptured[1]] - ChessEval.PIECE_VALUES[move.pieceMoved[1]] + 10000
+    if move.isPawnPromotion:
+        key += ChessEval.PIECE_VALUES['Q']
+    return -key
+
+
+def is_losing_capture(gs, move):
+    """Capture that loses material once the exchange on its square is played out"""
+    if move.isPawnPromotion:
+        return False
+    if ChessEval.PIECE_VALUES[move.pieceCaptured[1]] >= ChessEval.PIECE_VALUES[move.pieceMoved[1]]:
+        return False  # Taking a piece worth at least the capturer can't lose material
+    return gs.staticExchangeEvaluation(move) < 0
+
+
+def tablebase_score(result, plies, ply):
+    """Search score for a tablebase result (1, 0 or -1) with mate `plies` away from `ply`"""
+    if result == 0:
+        return 0
+    score = MATE_SCORE - ply - plies
+    return score if result > 0 else -score
+
+
+def has_pieces(gs):
+    """
+    Whether the side to move has a knight, bishop, rook or queen. Null-move pruning is
+    skipped without one: in king and pawn endings zugzwang is common, and passing would
+    often be the best move if it were legal.
+    """
+    color = 'w' if gs.whiteToMove else 'b'
+    return any(piece[0] == color and piece[1] in 'NBRQ' for row in gs.board for piece in row)
+
+
+def score_to_tt(score, ply):
+    """Mate scores are stored relative to the node, not the root"""
+    if is_mate_score(score):
+        return score + ply if score > 0 else score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if is_mate_score(score):
+        return score - ply if score > 0 else score + ply
+    return score
+
+
+class TranspositionTable:
+    """
+    Search results keyed by Zobrist key in a flat buffer of 16-byte entries.
+
+    Each entry holds (key ^ data, data), with the best move's moveID, depth,
+    bound type and score packed into data. Readers verify the key by XOR-ing
+    the two words back, so an entry torn by a concurrent writer in another
+    process looks like a miss. That lets processes share the buffer (e.g. a
+    multiprocessing.shared_memory block) without locks.
+    """
+
+    def __init__(self, size_mb=TT_DEFAULT_MB, buffer=None):
+        self.buffer = buffer if buffer is not None else bytearray(size_mb * 1024 * 1024)
+        self.entries = len(self.buffer) // _TT_ENTRY.size
+
+    def probe(self, key):
+        """(move_id, score, depth, flag) stored for key, or None"""
+        check, data = _TT_ENTRY.unpack_from(self.buffer, (key % self.entries) * _TT_ENTRY.size)
+        if data == 0 or check ^ data != key:
+            return None
+        return data & 0xFFFF, (data >> 32) - _TT_SCORE_OFFSET, (data >> 16) & 0xFF, (data >> 24) & 0x3
+
+    def store(self, key, move_id, score, depth, flag):
+        """Save a result, keeping a deeper one already stored for the same position"""
+        offset = (key % self.entries) * _TT_ENTRY.size
+        check, old = _TT_ENTRY.unpack_from(self.buffer, offset)
+        if old and check ^ old == key and (old >> 16) & 0xFF > depth:
+            return
+        data = move_id | depth << 16 | flag << 24 | (score + _TT_SCORE_OFFSET) << 32
+        _TT_ENTRY.pack_into(self.buffer, offset, key ^ data, data)
+
+    def clear(self):
+        self.buffer[:] = bytes(len(self.buffer))
+
+
+class Searcher:
+    """
+    Alpha-beta searcher that can be stopped from another thread.
+
+    The transposition table, killer moves and history scores live as long as the
+    searcher, so reusing one Searcher for a whole game carries what earlier
+    searches learned over to the next move.
+
+    `features` is the set of SELECTIVE_FEATURES to use (all of them by default), and
+    `time_manager` a ChessTime.TimeManager that decides how long timed searches run.
+    `ponderhit_event`, when given, is polled during a ponder search so that another
+    process can signal the ponderhit (Lazy SMP workers).
+    """
+
+    def __init__(self, tt=None, stop_event=None, features=None, time_manager=None, ponderhit_event=None):
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.features = set(SELECTIVE_FEATURES if features is None else features)
+        self.stats = dict.fromkeys(SELECTIVE_COUNTERS, 0)
+        self.time_manager = time_manager if time_manager is not None else ChessTime.TimeManager.from_environment()
+        self.killers = [[0, 0] for _ in range(MAX_DEPTH + 1)]  # Two quiet cutoff moves per ply
+        self.history = {}  # moveID -> bonus for quiet moves that caused cutoffs
+        self.nodes = 0
+        self.start_time = 0.0
+        self.deadline = None
+        self.node_limit = None
+        self.pondering = False
+        self.ponder_budget = None
+        self.ponderhit_event = ponderhit_event
+        self.root_best = None
+        self.partial_lines = []
+
+    def stop(self):
+        """Ask a running search to return as soon as possible"""
+        self.stop_event.set()
+
+    def ponderhit(self):
+        """
+        The expected move was played: put a ponder search on the clock. Time already
+        spent pondering counts towards the budget, so a long ponder answers at once.
+        """
+        if self.pondering:
+            self.pondering = False
+            if self.ponder_budget is not None:
+                self.deadline = self.start_time + self.ponder_budget
+
+    def poll_ponderhit(self):
+        """Pick up a ponderhit signalled through ponderhit_event"""
+        if self.pondering and self.ponderhit_event is not None and self.ponderhit_event.is_set():
+            self.ponderhit()
+
+    def search(self, gs, limits=None, info_callback=None, start_depth=1):
+        """Search the position by iterative deepening and return a SearchResult"""
+        limits = limits or SearchLimits()
+        self.stop_event.clear()
+        self.nodes = 0
+        self.start_time = time.time()
+        budget = self.time_manager.start(limits, gs.whiteToMove)
+        self.pondering = limits.ponder
+        self.ponder_budget = budget
+        self.deadline = self.start_time + budget if budget is not None and not limits.ponder else None
+        self.node_limit = limits.nodes
+        self.partial_lines = []
+        self.stats = dict.fromkeys(SELECTIVE_COUNTERS, 0)
+        # Old history still orders well, but should not outweigh what this search finds
+        self.history = {move_id: bonus // 2 for move_id, bonus in self.history.items() if bonus > 1}
+        max_depth = min(limits.depth or MAX_DEPTH, MAX_DEPTH)
+        multipv = max(1, limits.multipv)
+
+        root_moves = gs.getValidMoves()
+        if not root_moves:
+            return SearchResult(score=-MATE_SCORE if gs.checkMate else 0)
+
+        # With a table for the position there is nothing left to search
+        probed = ChessTablebase.tablebases.best_move(gs) if multipv == 1 else None
+        if probed is not None:
+            move, outcome, plies = probed
+            self.stats['tablebase_hits'] += 1
+            result = SearchResult(move, tablebase_score(outcome, plies, 0), 1,
+                                  ChessTablebase.tablebases.principal_variation(gs) or [move], self.nodes,
+                                  time.time() - self.start_time, stats=dict(self.stats))
+            if info_callback:
+                info_callback(result)
+            self.time_manager.finish(result, 'tablebase')
+            return result
+
+        result = SearchResult(best_move=root_moves[0], pv=[root_moves[0]])
+        reason = 'depth'
+        for depth in range(min(start_depth, max_depth), max_depth + 1):
+            # Previous ranking first, so every line starts from its best known move
+            ranks = {pv[0].moveID: rank for rank, (_, pv) in enumerate(result.lines) if pv}
+            root_moves.sort(key=lambda m: (ranks.get(m.moveID, len(ranks)), move_order_key(m)))
+            self.root_best = None
+            try:
+                if multipv > 1:
+                    lines = self.search_multipv(gs, root_moves, depth, multipv, info_callback)
+                    score, pv = lines[0]
+                else:
+                    score, pv = self.search_aspiration(gs, root_moves, depth, result.score)
+                    lines = [(score, pv)]
+            except SearchStopped:
+                reason = 'hard limit' if self.deadline and time.time() > self.deadline else 'stopped'
+                # Moves finished in an interrupted iteration are still better informed,
+                # but a partial set of lines is only used when there is nothing else
+                if self.root_best is not None and multipv == 1:
+                    score, pv = self.root_best
+                    result = SearchResult(pv[0], score, depth, pv)
+                elif self.partial_lines and result.depth == 0:
+                    score, pv = self.partial_lines[0]
+                    result = SearchResult(pv[0], score, depth, pv, lines=self.partial_lines)
+                break
+
+            result = SearchResult(pv[0], score, depth, pv, self.nodes, time.time() - self.start_time, lines,
+                                  dict(self.stats))
+            if info_callback and multipv == 1:
+                info_callback(result)
+
+            # A forced mate will not get any better with more depth
+            if is_mate_score(score) and MATE_SCORE - abs(score) <= depth:
+                reason = 'mate'
+                break
+            # A ponder search has no clock to stop on until ponderhit
+            self.poll_ponderhit()
+            if self.time_manager.iteration_done(depth, pv[0].moveID, score, time.time() - self.start_time) \
+                    and not self.pondering:
+                reason = self.time_manager.reason
+                break
+
+        result.nodes = self.nodes
+        result.elapsed = time.time() - self.start_time
+        result.stats = dict(self.stats)
+        self.time_manager.finish(result, reason)
+        return result
+
+    def search_aspiration(self, gs, root_moves, depth, guess):
+        """
+        Search the root in a narrow window around the previous iteration's score. A
+        score on the window's edge is only a bound, so the window is widened on that
+        side and the root searched again.
+        """
+        if 'aspiration' not in self.features or depth < ASPIRATION_MIN_DEPTH or is_mate_score(guess):
+            return self.search_root(gs, root_moves, depth)
+        delta = ASPIRATION_WINDOW
+        alpha, beta = guess - delta, guess + delta
+        while True:
+            nodes = self.nodes
+            score, pv = self.search_root(gs, root_moves, depth, alpha, beta)
+            if alpha < score < beta or (alpha == -INFINITY and beta == INFINITY):
+                return score, pv
+            self.stats['aspiration_researches'] += 1
+            self.stats['aspiration_research_nodes'] += self.nodes - nodes
+            delta *= 4
+            if score <= alpha:
+                alpha = max(-INFINITY, score - delta) if delta < MATE_SCORE else -INFINITY
+            else:
+                beta = min(INFINITY, score + delta) if delta < MATE_SCORE else INFINITY
+
+    def search_root(self, gs, root_moves, depth, alpha=-INFINITY, beta=INFINITY):
+        """Search every root move to the given depth and return the best score and line"""
+        best_pv = []
+        for index, move in enumerate(root_moves):
+            gs.makeMove(move)
+            try:
+                child_pv = []
+                score = self.search_move(gs, depth - 1, alpha, beta, 1, child_pv, index == 0)
+            finally:
+                gs.undoMove()
+            if score > alpha:
+                alpha = score
+                best_pv = [move] + child_pv
+                self.root_best = (alpha, best_pv)
+                if score >= beta:
+                    break
+        return alpha, best_pv
+
+    def search_multipv(self, gs, root_moves, depth, count, info_callback=None):
+        """
+        Search the best `count` lines one at a time, each excluding the root moves of
+        the lines before it. Later lines reuse the transposition table filled by the
+        earlier ones. info_callback gets a result as soon as each line is found.
+        """
+        lines = self.partial_lines = []
+        remaining = list(root_moves)
+        while remaining and len(lines) < count:
+            self.root_best = None
+            score, pv = self.search_root(gs, remaining, depth)
+            lines.append((score, pv))
+            remaining = [move for move in remaining if move.moveID != pv[0].moveID]
+            if info_callback:
+                info_callback(SearchResult(lines[0][1][0], lines[0][0], depth, lines[0][1], self.nodes,
+                                           time.time() - self.start_time, list(lines)))
+        return lines
+
+    def negamax(self, gs, depth, alpha, beta, ply, pv, allow_null=True):
+        """Fail-hard alpha-beta; fills pv with the best line found below this node"""
+        if depth <= 0:
+            return self.quiescence(gs, alpha, beta)
+        self.count_node()
+
+        # A repeated position is scored as a draw; the opponent can repeat it again
+        if gs.repetitionCount() >= 2 or gs.isFiftyMoveRule() or gs.isInsufficientMaterial():
+            return 0
+        probed = ChessTablebase.tablebases.probe(gs)
+        if probed is not None:
+            self.stats['tablebase_hits'] += 1
+            return max(alpha, min(beta, tablebase_score(probed[0], probed[1], ply)))
+
+        key = gs.zobristKey
+        tt_move = 0
+        entry = self.tt.probe(key)
+        if entry:
+            tt_move, tt_score, tt_depth, tt_flag = entry
+            if tt_depth >= depth:
+                tt_score = score_from_tt(tt_score, ply)
+                if tt_flag == TT_EXACT or (tt_flag == TT_LOWER and tt_score >= beta) \
+                        or (tt_flag == TT_UPPER and tt_score <= alpha):
+                    return max(alpha, min(beta, tt_score))
+
+        features = self.features
+        in_check = bool(features.intersection(('null_move', 'lmr', 'futility'))) and gs.inCheck()
+        # Pruning on a static score is unsound in check and pointless when mates are in the window
+        prune = not in_check and not is_mate_score(alpha) and not is_mate_score(beta)
+
+        if prune and allow_null and depth >= NULL_MOVE_MIN_DEPTH and 'null_move' in features \
+                and has_pieces(gs) and ChessEval.evaluate(gs) >= beta:
+            # If passing still fails high, a real move would too (barring zugzwang)
+            self.stats['null_move_tries'] += 1
+            nodes = self.nodes
+            reduction = NULL_MOVE_REDUCTION + (depth >= 7)
+            gs.makeNullMove()
+            try:
+                score = -self.negamax(gs, depth - 1 - reduction, -beta, -beta + 1, ply + 1, [], False)
+            finally:
+                gs.undoNullMove()
+            self.stats['null_move_nodes'] += self.nodes - nodes
+            if score >= beta:
+                self.stats['null_move_cutoffs'] += 1
+                return beta
+
+        # Quiet moves can't lift a hopeless static score above alpha this close to the horizon
+        futile = prune and depth < len(FUTILITY_MARGINS) and 'futility' in features \
+            and ChessEval.evaluate(gs) + FUTILITY_MARGINS[depth] <= alpha
+        reduce_late = not in_check and depth >= LMR_MIN_DEPTH and 'lmr' in features
+
+        moves = gs.getValidMoves()
+        if not moves:
+            return -MATE_SCORE + ply if gs.checkMate else 0
+
+        moves.sort(key=lambda m: self.order_key(gs, m, tt_move, ply))
+        best_move = 0
+        flag = TT_UPPER
+        for index, move in enumerate(moves):
+            # Late quiet moves are pruned or reduced, unless they are killers or give check
+            late = index > 0 and move.pieceCaptured == '--' and not move.isPawnPromotion \
+                and move.moveID not in self.killers[ply]
+            gs.makeMove(move)
+            try:
+                reduction = 0
+                if late and (futile or (reduce_late and index >= LMR_MIN_INDEX)) and not gs.inCheck():
+                    if futile:
+                        self.stats['futility_prunes'] += 1
+                        continue
+                    reduction = min(1 if index < 2 * LMR_MIN_INDEX else 2, depth - 2)
+                child_pv = []
+                score = self.search_move(gs, depth - 1, alpha, beta, ply + 1, child_pv, index == 0, reduction)
+            finally:
+                gs.undoMove()
+            if score >= beta:
+                self.tt.store(key, move.moveID, score_to_tt(beta, ply), depth, TT_LOWER)
+                if move.pieceCaptured == '--' and not move.isPawnPromotion:
+                    self.record_cutoff(move, depth, ply)
+                return beta
+            if score > alpha:
+                alpha = score
+                best_move = move.moveID
+                flag = TT_EXACT
+                pv[:] = [move] + child_pv
+        self.tt.store(key, best_move, score_to_tt(alpha, ply), depth, flag)
+        return alpha
+
+    def search_move(self, gs, depth, alpha, beta, ply, pv, first, reduction=0):
+        """
+        Score of the move just made, from the mover's side. With PVS only the first move
+        gets the full window; the rest are searched with a null window that just proves
+        them no better than alpha, and again with the full window when that fails. A
+        reduced (LMR) search that beats alpha is repeated at full depth.
+        """
+        if reduction:
+            self.stats['lmr_reductions'] += 1
+            score = -self.negamax(gs, depth - reduction, -alpha - 1, -alpha, ply, [])
+            if score <= alpha:
+                return score
+            self.stats['lmr_researches'] += 1
+        if first or 'pvs' not in self.features:
+            return -self.negamax(gs, depth, -beta, -alpha, ply, pv)
+        score = -self.negamax(gs, depth, -alpha - 1, -alpha, ply, pv)
+        if alpha < score < beta:
+            self.stats['pvs_researches'] += 1
+            nodes = self.nodes
+            pv[:] = []
+            score = -self.negamax(gs, depth, -beta, -alpha, ply, pv)
+            self.stats['pvs_research_nodes'] += self.nodes - nodes
+        return score
+
+    def order_key(self, gs, move, tt_move, ply):
+        """
+        Hash move, then captures and promotions, then killer moves, then quiet moves by
+        history, then captures that lose material
+        """
+        if move.moveID == tt_move:
+            return 0, 0
+        if move.pieceCaptured != '--' or move.isPawnPromotion:
+            if 'see' in self.features and is_losing_capture(gs, move):
+                return 4, move_order_key(move)
+            return 1, move_order_key(move)
+        if move.moveID in self.killers[ply]:
+            return 2, 0
+        return 3, -self.history.get(move.moveID, 0)
+
+    def record_cutoff(self, move, depth, ply):
+        """Remember a quiet move that refuted the position for ordering its siblings and later searches"""
+        killers = self.killers[ply]
+        if killers[0] != move.moveID:
+            killers[1] = killers[0]
+            killers[0] = move.moveID
+        self.history[move.moveID] = self.history.get(move.moveID, 0) + depth * depth
+
+    def quiescence(self, gs, alpha, beta):
+        """Resolve captures so the static evaluation is only taken in quiet positions"""
+        self.count_node()
+        stand_pat = ChessEval.evaluate(gs)
+        if stand_pat >= beta:
+            return beta
+        alpha = max(alpha, stand_pat)
+
+        for move in sorted(self.legal_captures(gs, 'see' in self.features), key=move_order_key):
+            gs.makeMove(move)
+            try:
+                score = -self.quiescence(gs, -beta, -alpha)
+            finally:
+                gs.undoMove()
+            if score >= beta:
+                return beta
+            alpha = max(alpha, score)
+        return alpha
+
+    def legal_captures(self, gs, skip_losing=False):
+        """Captures and promotions that don't leave the mover's king in check, optionally without losing ones"""
+        captures = []
+        for move in gs.getAllPossibleMoves():
+            if move.pieceCaptured == '--' and not move.isPawnPromotion:
+                continue
+            if skip_losing and is_losing_capture(gs, move):
+                self.stats['see_prunes'] += 1
+                continue
+            gs.makeMove(move)
+            gs.whiteToMove = not gs.whiteToMove
+            legal = not gs.inCheck()
+            gs.whiteToMove = not gs.whiteToMove
+            gs.undoMove()
+            if legal:
+                captures.append(move)
+        return captures
+
+    def count_node(self):
+        """Count a visited node and stop the search once a limit is reached"""
+        self.nodes += 1
+        if self.stop_event.is_set():
+            raise SearchStopped()
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchStopped()
+        if self.pondering and self.nodes & 255 == 0:
+            self.poll_ponderhit()
+        if self.deadline is not None and self.nodes & 7 == 0 and time.time() > self.deadline:
+            raise SearchStopped()
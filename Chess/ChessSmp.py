@@ -0,0 +1,163 @@
+"""
+Lazy SMP - Several processes search the same root position and share one transposition table.
+
+Each worker owns a copy of the GameState and runs the normal iterative deepening
+search; odd workers start one ply deeper so the processes spread over different
+depths. The only thing they share is a TranspositionTable living in a
+multiprocessing.shared_memory block, whose entries are verified by key on read
+instead of being locked. The parent process enforces the time budget, keeps the
+deepest completed iteration reported by any worker and collects per-worker nps.
+A ponderhit is passed on to the workers through a shared event, which puts
+their own soft limits back on the clock.
+"""
+
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+
+import ChessSearch
+import ChessTime
+
+DEFAULT_HASH_MB = 16
+
+
+def moves_from_notation(gs, notations):
+    """Turn a worker's pv (as notation) back into Move objects for gs"""
+    moves = []
+    for notation in notations:
+        move = gs.get_move_from_notation(notation)
+        if move is None:
+            break
+        moves.append(move)
+        gs.makeMove(move)
+    for _ in moves:
+        gs.undoMove()
+    return moves
+
+
+def _worker_main(worker_id, gs, limits, features, shm_name, stop_event, ponderhit_event, results):
+    # Workers share the parent's resource tracker, so only the parent unlinks the block
+    block = shared_memory.SharedMemory(name=shm_name)
+    try:
+        tt = ChessSearch.TranspositionTable(buffer=block.buf)
+        # Each worker stops on its own soft limit; the parent logs the move and enforces the hard one
+        searcher = ChessSearch.Searcher(tt, stop_event, features, ChessTime.TimeManager(), ponderhit_event)
+
+        def report(result, kind='iteration'):
+            lines = [(score, [move.getChessNotation() for move in pv]) for score, pv in result.lines]
+            results.put((kind, worker_id, result.depth, lines, result.nodes, result.elapsed, result.stats))
+
+        report(searcher.search(gs, limits, report, start_depth=1 + worker_id % 2), 'done')
+    finally:
+        block.close()
+
+
+class ParallelSearcher:
+    """Drop-in replacement for ChessSearch.Searcher that searches with several processes"""
+
+    def __init__(self, workers=None, hash_mb=DEFAULT_HASH_MB, features=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.features = set(ChessSearch.SELECTIVE_FEATURES if features is None else features)
+        self.time_manager = ChessTime.TimeManager.from_environment()
+        self.block = shared_memory.SharedMemory(create=True, size=hash_mb * 1024 * 1024)
+        self.tt = ChessSearch.TranspositionTable(buffer=self.block.buf)
+        self.stop_event = multiprocessing.Event()
+        self.ponderhit_event = multiprocessing.Event()
+        self.start_time = 0.0
+        self.deadline = None
+        self.pondering = False
+        self.ponder_budget = None
+        self.worker_nodes = {}
+        self.worker_counters = {}  # Worker id -> selective search counters
+        self.worker_stats = []  # (worker id, depth, nodes, seconds, nps) from the last search
+
+    def close(self):
+        """Release the shared transposition table"""
+        self.tt = None
+        self.block.close()
+        self.block.unlink()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def ponderhit(self):
+        """Put a ponder search on the clock, counting the time already spent pondering"""
+        if self.pondering:
+            self.pondering = False
+            self.ponderhit_event.set()
+            if self.ponder_budget is not None:
+                self.deadline = self.start_time + self.ponder_budget
+
+    def search(self, gs, limits=None, info_callback=None):
+        """Search gs with every worker and return the deepest completed result"""
+        limits = limits or ChessSearch.SearchLimits()
+        self.stop_event.clear()
+        self.ponderhit_event.clear()
+        start = self.start_time = time.time()
+        budget = self.time_manager.start(limits, gs.whiteToMove)
+        self.pondering = limits.ponder
+        self.ponder_budget = budget
+        self.deadline = start + budget if budget is not None and not limits.ponder else None
+
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_worker_main, daemon=True,
+                                             args=(i, gs, limits, self.features, self.block.name,
+                                                   self.stop_event, self.ponderhit_event, results))
+                     for i in range(self.workers)]
+        for process in processes:
+            process.start()
+
+        best = None  # (depth, [(score, pv notation)])
+        # Unless the parent has to interrupt them, timed workers stop on their own soft limits
+        reason = 'depth' if budget is None else 'soft limit'
+        self.worker_nodes = {}
+        self.worker_counters = {}
+        self.worker_stats = []
+        while len(self.worker_stats) < len(processes):
+            deadline = self.deadline
+            timeout = 0.05 if deadline is None else max(0.0, min(0.05, deadline - time.time()))
+            try:
+                message = results.get(timeout=timeout)
+            except queue.Empty:
+                if deadline is not None and time.time() >= deadline:
+                    self.stop_event.set()  # Hard stop; workers return at their next node
+                    reason = 'hard limit'
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    break
+                continue
+
+            kind, worker_id, depth, lines, nodes, seconds, counters = message
+            self.worker_nodes[worker_id] = nodes
+            self.worker_counters[worker_id] = counters
+            # Multi-PV lines stream in one at a time, so more lines at the same depth is better
+            if lines[0][1] and (best is None or (depth, len(lines)) > (best[0], len(best[1]))):
+                best = (depth, lines)
+                if info_callback and kind == 'iteration':
+                    info_callback(self.make_result(gs, best, start))
+            if kind == 'done':
+                self.worker_stats.append((worker_id, depth, nodes, seconds, int(nodes / seconds) if seconds else 0))
+            elif depth >= (limits.depth or ChessSearch.MAX_DEPTH) and len(lines) >= limits.multipv:
+                self.stop_event.set()
+
+        self.stop_event.set()
+        for process in processes:
+            process.join()
+
+        if best is None:
+            return ChessSearch.Searcher(self.tt).search(gs, ChessSearch.SearchLimits(depth=1))
+        result = self.make_result(gs, best, start)
+        self.time_manager.finish(result, reason)
+        return result
+
+    def make_result(self, gs, best, start):
+        depth, notation_lines = best
+        lines = [(score, moves_from_notation(gs, notations)) for score, notations in notation_lines]
+        score, pv = lines[0]
+        nodes = sum(self.worker_nodes.values())
+        stats = dict.fromkeys(ChessSearch.SELECTIVE_COUNTERS, 0)
+        for counters in self.worker_counters.values():
+            for name, count in counters.items():
+                stats[name] += count
+        return ChessSearch.SearchResult(pv[0] if pv else None, score, depth, pv, nodes, time.time() - start,
+                                        lines, stats)
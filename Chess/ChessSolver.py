@@ -0,0 +1,270 @@
+"""
+Mate Solver - Proves or refutes "mate in N" with depth-first proof-number search.
+
+Alpha-beta spreads its effort evenly over a depth; proof-number search instead
+follows the moves that are closest to deciding the question. Every node has a
+proof number (how many leaves still have to be shown mated to prove a mate)
+and a disproof number (how many to refute it). The attacker needs one proved
+move and the defender has to be mated after all of its replies, so the search
+keeps descending into the attacker move with the smallest proof number and the
+defender reply with the smallest disproof number, until a threshold inherited
+from the parent is crossed (df-pn, Nagai 2002).
+
+Nodes are keyed by Zobrist key and the plies left, and kept in a table of
+bounded size: when it fills up, the entries that took the least work to
+search are dropped. The attacker's checks are tried first, and on its last
+move only checks are generated; the defender's legal moves are only
+evasions whenever it is in check.
+
+    python ChessSolver.py "<fen>" 5
+"""
+
+import argparse
+import threading
+import time
+
+import ChessEngine
+
+INFINITY = 10 ** 9
+DEFAULT_TABLE_SIZE = 1 << 19  # Entries
+DEFAULT_NODE_LIMIT = 2_000_000
+QUIET_PROOF = 3  # Initial proof number of an attacker move that doesn't give check
+
+
+class SolverStopped(Exception):
+    """Raised inside the search when the node limit is reached or it is told to stop"""
+
+
+class MateResult:
+    """
+    Outcome of a mate search: mate is True with the forced line in moves, False when
+    no mate in max_moves exists, or None when the search stopped before deciding.
+    """
+
+    def __init__(self, mate, max_moves, moves=None, nodes=0, elapsed=0.0):
+        self.mate = mate
+        self.max_moves = max_moves
+        self.moves = moves or []
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    @property
+    def mate_in(self):
+        """Moves until mate along the line found, or None"""
+        return (len(self.moves) + 1) // 2 if self.mate else None
+
+    def __str__(self):
+        if self.mate:
+            line = " ".join(move.getChessNotation() for move in self.moves)
+            return f"Mate in {self.mate_in}: {line}"
+        if self.mate is False:
+            return f"No mate in {self.max_moves}"
+        return f"Undecided after {self.nodes} nodes"
+
+
+class MateSolver:
+    """
+    Depth-first proof-number search for the side to move mating within a number of
+    moves. The table lives as long as the solver, so solving the same position for
+    a growing N reuses the shallower proofs.
+    """
+
+    def __init__(self, table_size=DEFAULT_TABLE_SIZE, stop_event=None):
+        self.table_size = table_size
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.table = {}  # (zobrist key, plies left) -> [proof, disproof, work, children]
+        self.nodes = 0
+        self.node_limit = None
+
+    def stop(self):
+        self.stop_event.set()
+
+    def solve(self, gs, max_moves, node_limit=DEFAULT_NODE_LIMIT):
+        """
+        MateResult for the side to move mating in at most max_moves. Each N up to
+        max_moves is proved in turn, so a mate found is also the shortest one.
+        """
+        self.stop_event.clear()
+        self.nodes = 0
+        self.node_limit = node_limit
+        start = time.time()
+        result = MateResult(False, max_moves)
+        try:
+            for moves in range(1, max_moves + 1):
+                plies = 2 * moves - 1
+                proof, _ = self.search(gs, plies, INFINITY, INFINITY)
+                if proof == 0:
+                    result = MateResult(True, max_moves, self.principal_variation(gs, plies))
+                    break
+        except SolverStopped:
+            result = MateResult(None, max_moves)
+        result.nodes = self.nodes
+        result.elapsed = time.time() - start
+        return result
+
+    def search(self, gs, plies, proof_threshold, disproof_threshold):
+        """
+        Expand the node for the position in gs until its proof or disproof number reaches
+        its threshold; returns the (proof, disproof) numbers it ends with
+        """
+        self.nodes += 1
+        if self.stop_event.is_set() or (self.node_limit is not None and self.nodes > self.node_limit):
+            raise SolverStopped()
+        key = (gs.zobristKey, plies)
+        entry = self.table.get(key)
+        if entry is None:
+            entry = self.expand(gs, plies)
+            self.store(key, entry)
+        if entry[0] == 0 or entry[1] == 0:
+            return entry[0], entry[1]
+
+        attacker = plies % 2 == 1
+        nodes = self.nodes
+        children = entry[3]
+        while True:
+            proof, disproof, best, second = self.summarize(children, plies - 1, attacker)
+            if proof >= proof_threshold or disproof >= disproof_threshold:
+                break
+            move, child_key, _, _ = children[best]
+            child_proof, child_disproof = self.lookup(children[best], plies - 1)
+            if attacker:
+                # Switch to the second best move once this one gets worse than it
+                child_thresholds = (min(proof_threshold, second + 1),
+                                    disproof_threshold - disproof + child_disproof)
+            else:
+                child_thresholds = (proof_threshold - proof + child_proof,
+                                    min(disproof_threshold, second + 1))
+            gs.makeMove(move)
+            try:
+                self.search(gs, plies - 1, *child_thresholds)
+            finally:
+                gs.undoMove()
+
+        entry[0], entry[1] = proof, disproof
+        entry[2] += self.nodes - nodes
+        if proof == 0 or disproof == 0:
+            entry[3] = children if proof == 0 else None  # Keep proved moves for the line
+        self.store(key, entry)
+        return proof, disproof
+
+    def expand(self, gs, plies):
+        """New table entry: terminal numbers, or the moves to search with their initial numbers"""
+        attacker = plies % 2 == 1
+        moves = gs.getValidMoves()
+        if not moves:
+            # Mated defender is proved; a stalemate, or the attacker out of moves, disproved
+            return [0, INFINITY, 0, None] if gs.checkMate and not attacker else [INFINITY, 0, 0, None]
+        if plies == 0:
+            return [INFINITY, 0, 0, None]  # Out of moves without a mate
+
+        children = []
+        for move in moves:
+            gs.makeMove(move)
+            gives_check = gs.inCheck()
+            child_key = gs.zobristKey
+            gs.undoMove()
+            if attacker and plies == 1 and not gives_check:
+                continue  # Only a check can mate on the last move
+            proof = 1 if gives_check or not attacker else QUIET_PROOF
+            children.append((move, child_key, proof, 1))
+        if not children:
+            return [INFINITY, 0, 0, None]
+        # Checks first, so ties go to them
+        children.sort(key=lambda child: child[2])
+        return [1, 1, 0, children]
+
+    def lookup(self, child, plies):
+        """(proof, disproof) of a child from the table, or its initial numbers"""
+        entry = self.table.get((child[1], plies))
+        if entry is None:
+            return child[2], child[3]
+        return entry[0], entry[1]
+
+    def summarize(self, children, plies, attacker):
+        """
+        (proof, disproof, best index, second best) for a node from its children. The
+        attacker picks the smallest proof number and the defender the smallest disproof
+        number; `second` is the runner-up's, for the threshold that leaves the best child.
+        """
+        total = 0
+        best = 0
+        smallest = second = INFINITY
+        for index, child in enumerate(children):
+            proof, disproof = self.lookup(child, plies)
+            chosen, summed = (proof, disproof) if attacker else (disproof, proof)
+            total = min(INFINITY, total + summed)
+            if chosen < smallest:
+                best, smallest, second = index, chosen, smallest
+            elif chosen < second:
+                second = chosen
+        if attacker:
+            return smallest, total, best, second
+        return total, smallest, best, second
+
+    def store(self, key, entry):
+        self.table[key] = entry
+        if len(self.table) > self.table_size:
+            self.collect()
+
+    def collect(self):
+        """Drop the half of the table that took the least work to search"""
+        works = sorted(entry[2] for entry in self.table.values())
+        cutoff = works[len(works) // 2]
+        self.table = {key: entry for key, entry in self.table.items() if entry[2] > cutoff}
+
+    def principal_variation(self, gs, plies):
+        """
+        Forced line of a proved node: a proved attacker move, then the defender's reply
+        whose proof took the most work (the most stubborn defence)
+        """
+        line = []
+        while plies > 0:
+            entry = self.table.get((gs.zobristKey, plies))
+            if entry is None or entry[0] != 0 or not entry[3]:
+                break
+            proved = [child for child in entry[3] if self.lookup(child, plies - 1)[0] == 0]
+            if not proved:
+                break
+            if plies % 2 == 1:
+                # Quickest of the proved moves: the one that also mates with fewer plies left
+                child = min(proved, key=lambda c: self.proof_plies(c[1], plies - 1))
+            else:
+                child = max(proved, key=lambda c: self.table.get((c[1], plies - 1), [0, 0, 0])[2])
+            line.append(child[0])
+            gs.makeMove(child[0])
+            plies -= 1
+        for _ in line:
+            gs.undoMove()
+        return line
+
+    def proof_plies(self, key, plies):
+        """Fewest plies left at which the table holds a proof for this position"""
+        for left in range(plies % 2, plies + 1, 2):
+            entry = self.table.get((key, left))
+            if entry is not None and entry[0] == 0:
+                return left
+        return plies
+
+
+def solve(gs, max_moves, node_limit=DEFAULT_NODE_LIMIT, table_size=DEFAULT_TABLE_SIZE):
+    """MateResult for the side to move mating within max_moves"""
+    return MateSolver(table_size).solve(gs, max_moves, node_limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prove or refute a forced mate")
+    parser.add_argument('fen')
+    parser.add_argument('moves', type=int, help="Longest mate to look for, in moves")
+    parser.add_argument('--nodes', type=int, default=DEFAULT_NODE_LIMIT)
+    parser.add_argument('--table', type=int, default=DEFAULT_TABLE_SIZE, help="Table size in entries")
+    args = parser.parse_args()
+
+    gs = ChessEngine.GameState()
+    gs.loadFen(args.fen)
+    result = solve(gs, args.moves, args.nodes, args.table)
+    print(result)
+    print(f"{result.nodes} nodes in {result.elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Sound Bank - One place that maps moves to sound effects and loads them on demand.
+
+Clips are resolved relative to this package, decoded on first use and kept in a
+size-bounded LRU cache. Long clips (the sacrifice and stalemate sounds) are
+streamed through pygame.mixer.music instead of being decoded into memory.
+"""
+
+import os
+from collections import OrderedDict
+
+import pygame as p
+
+import ChessEngine
+
+SOUNDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sounds")
+
+SOUND_FILES = {
+    'move': 'move.wav',
+    'capture': 'capture.wav',
+    'check': 'check.wav',
+    'checkmate': 'checkmate.wav',
+    'stalemate': 'stalemate.wav',
+    'castle': 'castle.wav',
+    'promotion': 'promotion.wav',
+    'enpassant': 'enpassant.wav',
+    'queen_sacrifice': 'queen_sacrifice.wav',
+    'rook_sacrifice': 'rook_sacrifice.wav',
+    'bishop_sacrifice': 'bishop_sacrifice.wav',
+    'knight_sacrifice': 'knight_sacrifice.wav',
+    'game_start': 'game_start.wav',
+    'game_end': 'game_end.wav',
+}
+
+# Sound to fall back to when a clip has no file
+FALLBACKS = {
+    'game_end': 'checkmate',
+}
+
+SACRIFICE_SOUNDS = {
+    'Q': 'queen_sacrifice',
+    'R': 'rook_sacrifice',
+    'B': 'bishop_sacrifice',
+    'N': 'knight_sacrifice',
+}
+
+SACRIFICE_THRESHOLD = 200  # Material (centipawns) a move must give up to count as a sacrifice
+STREAM_THRESHOLD = 200 * 1024  # Files larger than this are streamed, not decoded
+MAX_CACHE_BYTES = 2 * 1024 * 1024  # Decoded PCM kept in memory
+
+
+def material_given_up(move, gs):
+    """
+    What a move just made on gs loses once the opponent wins the best exchange on its
+    target square, less anything it captured (negative for a winning capture)
+    """
+    captured = ChessEngine.SEE_PIECE_VALUES[move.pieceCaptured[1]] if move.pieceCaptured != '--' else 0
+    return gs.exchangeGain(move.endRow, move.endCol, gs.whiteToMove) - captured
+
+
+def sound_for_move(move, gs):
+    """Name of the sound for a move that has just been made on gs"""
+    if gs.inCheck():
+        return 'checkmate' if not gs.getValidMoves() else 'check'
+    if not gs.getValidMoves():
+        return 'stalemate'
+    if move.isCastleMove:
+        return 'castle'
+    if move.isPawnPromotion:
+        return 'promotion'
+    if move.isEnpassantMove:
+        return 'enpassant'
+    # A piece left to be won is a sacrifice; an even trade is just a capture
+    if move.pieceMoved[1] in SACRIFICE_SOUNDS and material_given_up(move, gs) >= SACRIFICE_THRESHOLD:
+        return SACRIFICE_SOUNDS[move.pieceMoved[1]]
+    if move.pieceCaptured != '--':
+        return 'capture'
+    return 'move'
+
+
+class SoundBank:
+    """Lazily decoded, size-bounded cache of sound effects"""
+
+    def __init__(self, sounds_dir=SOUNDS_DIR, max_cache_bytes=MAX_CACHE_BYTES):
+        self.sounds_dir = sounds_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.cache = OrderedDict()  # name -> (Sound, decoded size in bytes)
+        self.cache_bytes = 0
+        self.enabled = True
+
+    def path(self, name):
+        return os.path.join(self.sounds_dir, SOUND_FILES[name])
+
+    def available(self, name):
+        return name in SOUND_FILES and os.path.exists(self.path(name))
+
+    def ensure_mixer(self):
+        """Initialize the mixer on first use; disables sound if there is no audio device"""
+        if p.mixer.get_init():
+            return True
+        try:
+            p.mixer.pre_init(frequency=44100, size=-16, channels=2, buffer=512)
+            p.mixer.init()
+            return True
+        except p.error as e:
+            print(f"Sound system initialization failed: {e}")
+            self.enabled = False
+            return False
+
+    def play(self, name):
+        """Play a sound by name, silently skipping clips that don't exist"""
+        if not self.enabled or not self.ensure_mixer():
+            return
+        if not self.available(name):
+            if name in FALLBACKS:
+                self.play(FALLBACKS[name])
+            return
+
+        try:
+            if os.path.getsize(self.path(name)) > STREAM_THRESHOLD:
+                p.mixer.music.load(self.path(name))
+                p.mixer.music.play()
+            else:
+                self.get(name).play()
+        except p.error as e:
+            print(f"Error playing {name}: {e}")
+
+    def play_move(self, move, gs):
+        """Play the sound that matches a move just made on gs"""
+        self.play(sound_for_move(move, gs))
+
+    def get(self, name):
+        """Decoded Sound for a short clip, loading it into the cache if needed"""
+        if name in self.cache:
+            self.cache.move_to_end(name)
+            return self.cache[name][0]
+
+        sound = p.mixer.Sound(self.path(name))
+        frequency, bits, channels = p.mixer.get_init()
+        size = int(sound.get_length() * frequency * channels * abs(bits) // 8)
+        self.cache[name] = (sound, size)
+        self.cache_bytes += size
+
+        # Evict least recently played clips, always keeping the one just loaded
+        while self.cache_bytes > self.max_cache_bytes and len(self.cache) > 1:
+            _, (_, evicted_size) = self.cache.popitem(last=False)
+            self.cache_bytes -= evicted_size
+        return sound
@@ -0,0 +1,180 @@
+"""
+Engine Instrumentation - Opt-in call counters and timers for move generation, search and evaluation.
+
+Nothing is wrapped until enable() is called: the instrumented methods are swapped
+in on the classes and modules and swapped back out by disable(), so a disabled
+engine runs the original code with no overhead at all.
+
+Set CHESS_STATS_DUMP=<path> to enable instrumentation at startup and append a
+JSON-lines snapshot of stats() to <path> every CHESS_STATS_INTERVAL seconds.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+import ChessEngine
+import ChessEval
+import ChessPawns
+import ChessSearch
+
+# (owner, attribute) pairs that are counted and timed; the attribute is the stat name
+TIMED = [
+    (ChessEngine.GameState, 'getValidMoves'),
+    (ChessEngine.GameState, 'getAllPossibleMoves'),
+    (ChessEngine.GameState, 'squareUnderAttack'),
+    (ChessEngine.GameState, 'makeMove'),
+    (ChessEngine.GameState, 'undoMove'),
+    (ChessSearch.Searcher, 'search'),
+    (ChessSearch.Searcher, 'negamax'),
+    (ChessSearch.Searcher, 'quiescence'),
+    (ChessEval, 'evaluate'),
+    (ChessPawns, 'pawn_structure_score'),
+]
+
+# Only counted: called far too often for timing to be meaningful
+COUNTED = [
+    (ChessEngine.Move, '__init__', 'Move'),
+]
+
+
+class Stat:
+    """Call count and inclusive time for one instrumented function, summed over all threads"""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        # Recursion depth per thread; only each thread's outermost call is timed, so the
+        # analysis and opponent threads don't hide the UI thread's calls
+        self.local = threading.local()
+
+
+_stats = {}
+_originals = {}
+_enabled = False
+_started = time.time()
+_dump_thread = None
+_dump_stop = threading.Event()
+
+
+def _timed(stat, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stat.calls += 1
+        local = stat.local
+        if getattr(local, 'active', False):
+            return func(*args, **kwargs)
+        local.active = True
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stat.seconds += time.perf_counter() - start
+            local.active = False
+    return wrapper
+
+
+def _counted(stat, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stat.calls += 1
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable():
+    """Swap the instrumented functions in"""
+    global _enabled
+    if _enabled:
+        return
+    for owner, attribute in TIMED:
+        stat = _stats.setdefault(attribute, Stat())
+        _originals[(owner, attribute)] = getattr(owner, attribute)
+        setattr(owner, attribute, _timed(stat, getattr(owner, attribute)))
+    for owner, attribute, name in COUNTED:
+        stat = _stats.setdefault(name, Stat())
+        _originals[(owner, attribute)] = getattr(owner, attribute)
+        setattr(owner, attribute, _counted(stat, getattr(owner, attribute)))
+    _enabled = True
+
+
+def disable():
+    """Restore the original functions; collected stats are kept"""
+    global _enabled
+    for (owner, attribute), original in _originals.items():
+        setattr(owner, attribute, original)
+    _originals.clear()
+    _enabled = False
+
+
+def reset():
+    """Clear all counters"""
+    global _started
+    for stat in _stats.values():
+        stat.calls = 0
+        stat.seconds = 0.0
+    _started = time.time()
+
+
+def stats():
+    """Snapshot of every counter as plain data"""
+    snapshot = {
+        'enabled': _enabled,
+        'uptime_s': round(time.time() - _started, 3),
+        'pawn_cache_hit_rate': round(ChessPawns.pawn_cache.hit_rate(), 4),
+        'counters': {},
+    }
+    for name, stat in _stats.items():
+        snapshot['counters'][name] = {
+            'calls': stat.calls,
+            'total_ms': round(stat.seconds * 1000, 3),
+            'avg_us': round(stat.seconds * 1e6 / stat.calls, 3) if stat.calls else 0.0,
+        }
+    return snapshot
+
+
+def start_dump(path, interval=10.0):
+    """Append a JSON line with stats() to path every interval seconds"""
+    global _dump_thread
+    stop_dump()
+    _dump_stop.clear()
+
+    def run():
+        while not _dump_stop.wait(interval):
+            write_snapshot(path)
+        write_snapshot(path)
+
+    _dump_thread = threading.Thread(target=run, daemon=True)
+    _dump_thread.start()
+
+
+def stop_dump():
+    """Stop the periodic dump after writing one last snapshot"""
+    global _dump_thread
+    if _dump_thread:
+        _dump_stop.set()
+        _dump_thread.join()
+        _dump_thread = None
+
+
+def write_snapshot(path):
+    try:
+        with open(path, 'a') as f:
+            f.write(json.dumps(dict(stats(), timestamp=time.time())) + "\n")
+    except OSError as e:
+        print(f"Could not write engine stats: {e}")
+
+
+def enable_from_environment():
+    """Turn instrumentation and dumping on when CHESS_STATS_DUMP is set"""
+    path = os.environ.get('CHESS_STATS_DUMP')
+    if not path:
+        return
+    enable()
+    start_dump(path, float(os.environ.get('CHESS_STATS_INTERVAL', 10)))
@@ -0,0 +1,511 @@
+"""
+Endgame Tablebases - Distance-to-mate tables for king and pieces against a lone king.
+
+The generator works backwards from every checkmate (retrograde analysis): a
+position with White to move is won in n plies if some move reaches a Black to
+move position lost in n - 1, and a Black to move position is lost once every
+one of its king moves reaches a won position. Black only has a king, so every
+legal capture it can make is a draw. Pawns promote to a queen, like everywhere
+in GameState, so KPK is built on top of KQK. Finding the legal moves, checks
+and mates of every position is split over a multiprocessing pool; the
+retrograde passes then run over whole frontiers at once with NumPy.
+
+A table is a 16-byte header followed by one byte per position, indexed by side
+to move and the squares of the white king, black king and white pieces
+(square = row * 8 + col). A byte is 0 for a draw, 255 for an illegal position
+and otherwise the distance to mate in plies plus one. Tables are probed through
+mmap, so a probe is one index computation and one byte read, and the table
+pages stay in the OS page cache instead of this process's heap. Positions
+with the pieces on Black's side are probed colour-flipped.
+
+Generating needs NumPy; probing does not. Run from the Chess directory:
+
+    python ChessTablebase.py                    # KQK, KRK, KPK and KBNK into tablebases/
+    python ChessTablebase.py KQK KRK --workers 4
+"""
+
+import argparse
+import mmap
+import multiprocessing
+import os
+import struct
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+HEADER = struct.Struct('<4s8sI')  # magic, table name, longest distance to mate in plies
+MAGIC = b'CTB1'
+
+# White's pieces besides the king, in index order, for every table
+TABLES = {'KQK': 'Q', 'KRK': 'R', 'KPK': 'p', 'KBNK': 'BN'}
+PIECE_ORDER = 'QRBNp'  # Order of a position's pieces when matching it to a table
+DEPENDENCIES = {'KPK': 'KQK'}  # Table a pawn promotes into
+
+DRAW, ILLEGAL = 0, 255
+MAX_LINE = 16  # Plies of best play returned as a principal variation
+
+
+def table_name(pieces):
+    """'KBNK' style name for White's non-king pieces ('p' is written P)"""
+    return 'K' + pieces.upper() + 'K'
+
+
+def position_index(white_to_move, squares):
+    """Offset of a position in a table; squares are the white king, black king, then the pieces"""
+    index = 0 if white_to_move else 1
+    for square in squares:
+        index = index * 64 + square
+    return index
+
+
+# Probing
+
+class Tablebase:
+    """One table file, memory-mapped read-only"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, name, self.longest = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a tablebase")
+        self.name = name.rstrip(b'\0').decode('ascii')
+
+    def value(self, white_to_move, squares):
+        return self.data[HEADER.size + position_index(white_to_move, squares)]
+
+    def close(self):
+        self.data.close()
+
+
+class Tablebases:
+    """The tables found in a directory, opened on first use"""
+
+    def __init__(self, directory=TABLEBASE_DIR):
+        self.directory = directory
+        self.tables = {}  # Name -> Tablebase, or None when there is no file
+
+    def table(self, name):
+        if name not in self.tables:
+            path = os.path.join(self.directory, name + ".ctb")
+            self.tables[name] = Tablebase(path) if os.path.exists(path) else None
+        return self.tables[name]
+
+    def probe(self, gs):
+        """
+        (result, plies) for the side to move: result is 1 for a win, -1 for a loss and
+        0 for a draw, plies the distance to mate. None if no table covers the position.
+        """
+        white, black = [], []
+        kings = {}
+        for r, row in enumerate(gs.board):
+            for c, piece in enumerate(row):
+                if piece == "--":
+                    continue
+                if piece[1] == 'K':
+                    kings[piece[0]] = r * 8 + c
+                elif piece[0] == 'w':
+                    white.append((piece[1], r * 8 + c))
+                else:
+                    black.append((piece[1], r * 8 + c))
+                if len(white) + len(black) > 2:
+                    return None
+        if white and black:
+            return None
+        if not white and not black:
+            return 0, 0
+        if white:
+            pieces, strong_king, weak_king = white, kings['w'], kings['b']
+            strong_to_move = gs.whiteToMove
+        else:
+            # Flip colours: mirror the ranks so Black's pieces become White's
+            pieces = [(kind, square ^ 56) for kind, square in black]
+            strong_king, weak_king = kings['b'] ^ 56, kings['w'] ^ 56
+            strong_to_move = not gs.whiteToMove
+
+        pieces.sort(key=lambda piece: PIECE_ORDER.index(piece[0]))
+        table = self.table(table_name("".join(kind for kind, _ in pieces)))
+        if table is None:
+            return None
+        value = table.value(strong_to_move, [strong_king, weak_king] + [square for _, square in pieces])
+        if value == DRAW or value == ILLEGAL:
+            return 0, 0
+        return (1 if strong_to_move else -1), value - 1
+
+    def best_move(self, gs):
+        """(move, result, plies) of the quickest win, longest loss or a draw, or None without a table"""
+        root = self.probe(gs)
+        if root is None:
+            return None
+        best = None
+        for move in gs.getValidMoves():
+            gs.makeMove(move)
+            try:
+                child = self.probe(gs)
+            finally:
+                gs.undoMove()
+            if child is None:
+                # Leaving the tables can only be a capture into a bare-king draw
+                child = (0, 0)
+            result, plies = -child[0], child[1] + 1
+            # Win fast, lose slowly
+            key = (result, -plies if result > 0 else plies)
+            if best is None or key > best[0]:
+                best = (key, move, result, plies)
+        if best is None:
+            return None
+        return best[1], best[2], best[3]
+
+    def principal_variation(self, gs, max_plies=MAX_LINE):
+        """Moves of the table's best play from here, until mate, a draw or max_plies"""
+        line = []
+        while len(line) < max_plies:
+            found = self.best_move(gs)
+            if found is None or found[1] == 0:
+                break
+            line.append(found[0])
+            gs.makeMove(found[0])
+        for _ in line:
+            gs.undoMove()
+        return line
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+
+tablebases = Tablebases()
+
+
+def describe(gs):
+    """Sidebar hint like 'White mates in 12 (d1d7)', or None outside the tables"""
+    found = tablebases.best_move(gs)
+    if found is None:
+        return None
+    move, result, plies = found
+    if result == 0:
+        return f"Draw ({move.getChessNotation()})"
+    winner_is_white = gs.whiteToMove == (result > 0)
+    return (f"{'White' if winner_is_white else 'Black'} mates in {(plies + 1) // 2} "
+            f"({move.getChessNotation()})")
+
+
+# Generation
+
+def require_numpy():
+    if np is None:
+        raise ImportError("Generating tablebases needs NumPy (pip install numpy)")
+
+
+KING_STEPS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+KNIGHT_STEPS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+SLIDES = {'B': [(-1, -1), (-1, 1), (1, -1), (1, 1)],
+          'R': [(-1, 0), (1, 0), (0, -1), (0, 1)]}
+SLIDES['Q'] = SLIDES['B'] + SLIDES['R']
+
+_geometry = {}
+
+
+def geometry():
+    """Square-to-square lookup tables, built on first use"""
+    require_numpy()
+    if _geometry:
+        return _geometry
+
+    def step_table(steps, length=1):
+        table = np.full((64, len(steps), length), -1, dtype=np.int64)
+        for square in range(64):
+            r, c = divmod(square, 8)
+            for d, (dr, dc) in enumerate(steps):
+                for k in range(length):
+                    nr, nc = r + dr * (k + 1), c + dc * (k + 1)
+                    if not (0 <= nr < 8 and 0 <= nc < 8):
+                        break
+                    table[square, d, k] = nr * 8 + nc
+        return table
+
+    g = _geometry
+    g['king'] = step_table(KING_STEPS)[:, :, 0]
+    g['knight'] = step_table(KNIGHT_STEPS)[:, :, 0]
+    g['rays'] = {kind: step_table(steps, 7) for kind, steps in SLIDES.items()}
+    g['bit'] = np.array([1 << square for square in range(64)], dtype=np.uint64)
+
+    attacks = {kind: np.zeros((64, 64), dtype=bool) for kind in 'KNpBRQ'}
+    between = np.zeros((64, 64), dtype=np.uint64)
+    for s in range(64):
+        attacks['K'][s, g['king'][s][g['king'][s] >= 0]] = True
+        attacks['N'][s, g['knight'][s][g['knight'][s] >= 0]] = True
+        r, c = divmod(s, 8)
+        for dc in (-1, 1):
+            if r > 0 and 0 <= c + dc < 8:
+                attacks['p'][s, (r - 1) * 8 + c + dc] = True
+        for kind in 'BR':
+            for ray in g['rays'][kind][s]:
+                passed = 0
+                for t in ray[ray >= 0]:
+                    attacks[kind][s, t] = True
+                    between[s, t] = passed
+                    passed |= 1 << int(t)
+    attacks['Q'] = attacks['B'] | attacks['R']
+    g['attacks'] = attacks
+    g['between'] = between
+    return g
+
+
+def decode(indices, count):
+    """(white to move, [white king, black king, pieces...]) arrays for table indices"""
+    squares = []
+    for _ in range(count):
+        squares.append(indices % 64)
+        indices = indices // 64
+    return indices == 0, squares[::-1]
+
+
+def encode(white_to_move, squares):
+    index = np.where(white_to_move, 0, 1).astype(np.int64)
+    for square in squares:
+        index = index * 64 + square
+    return index
+
+
+def attacked(targets, kinds, squares, occupied):
+    """Whether White's pieces (king first) attack targets, with `occupied` the blocker bitboards"""
+    g = geometry()
+    hit = np.zeros(len(targets), dtype=bool)
+    for kind, square in zip(kinds, squares):
+        attack = g['attacks'][kind][square, targets]
+        if kind in SLIDES:
+            attack &= (g['between'][square, targets] & occupied) == 0
+        hit |= attack
+    return hit
+
+
+def analyse_slice(job):
+    """
+    Legality, check and Black's options for every position with one side to move and
+    one white king square. Returns (values, counts): values holds ILLEGAL, a mate (1)
+    or DRAW; counts the number of Black king moves that don't capture, or 255 when
+    Black has a legal capture (a draw however the rest goes).
+    """
+    pieces, white_to_move, white_king = job
+    g = geometry()
+    kinds = 'K' + pieces
+    size = 64 ** (1 + len(pieces))
+    _, squares = decode(np.arange(size, dtype=np.int64), 2 + len(pieces))
+    squares[0] = np.full(size, white_king, dtype=np.int64)
+    black_king, white_squares = squares[1], [squares[0]] + squares[2:]
+
+    legal = ~g['attacks']['K'][white_king, black_king] & (black_king != white_king)
+    for i, square in enumerate(squares[2:], start=2):
+        for other in squares[:i]:
+            legal &= square != other
+        if pieces[i - 2] == 'p':
+            legal &= (square >= 8) & (square < 56)
+    occupied = np.zeros(size, dtype=np.uint64)
+    for square in white_squares:
+        occupied |= g['bit'][square]
+    in_check = attacked(black_king, kinds, white_squares, occupied)
+
+    values = np.full(size, DRAW, dtype=np.uint8)
+    counts = np.zeros(size, dtype=np.uint8)
+    if white_to_move:
+        legal &= ~in_check  # Black can't be left in check
+        values[~legal] = ILLEGAL
+        return values.tobytes(), counts.tobytes()
+
+    escape = np.zeros(size, dtype=bool)
+    for d in range(8):
+        target = g['king'][black_king, d]
+        on_board = target >= 0
+        target = np.where(on_board, target, 0)
+        safe = on_board & ~attacked(target, kinds, white_squares, occupied)
+        capture = np.zeros(size, dtype=bool)
+        for square in squares[2:]:
+            capture |= square == target
+        counts += (safe & ~capture).astype(np.uint8)
+        escape |= safe & capture
+    values[legal & in_check & (counts == 0) & ~escape] = 1
+    values[~legal] = ILLEGAL
+    counts[escape] = 255
+    return values.tobytes(), counts.tobytes()
+
+
+def white_unmoves(pieces, squares):
+    """Table indices (White to move) of the positions White's last move came from"""
+    g = geometry()
+    found = []
+    # Slot 1 is the black king; White's pieces are slot 0 and 2 onwards
+    for i, kind in zip([0] + list(range(2, len(squares))), 'K' + pieces):
+        square = squares[i]
+        others = squares[:i] + squares[i + 1:]
+
+        def empty(target):
+            clear = target >= 0
+            for other in others:
+                clear &= target != other
+            return clear
+
+        def add(origin, keep):
+            moved = [other[keep] for other in squares]
+            moved[i] = origin[keep]
+            found.append(encode(True, moved))
+
+        if kind == 'p':
+            row = square // 8
+            single = square + 8
+            keep = (row + 1 <= 6) & empty(np.where(row + 1 <= 6, single, -1))
+            add(single, keep)
+            double = square + 16
+            keep &= (row == 4) & empty(np.where(row == 4, double, -1))
+            add(double, keep)
+        elif kind in SLIDES:
+            rays = g['rays'][kind][square]
+            for d in range(rays.shape[1]):
+                open_ray = np.ones(len(square), dtype=bool)
+                for k in range(7):
+                    origin = rays[:, d, k]
+                    open_ray &= empty(origin)
+                    if not open_ray.any():
+                        break
+                    add(origin, open_ray)
+        else:
+            steps = g['king' if kind == 'K' else 'knight'][square]
+            for d in range(8):
+                origin = steps[:, d]
+                add(origin, empty(origin))
+    return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+
+def black_unmoves(pieces, squares):
+    """Table indices (Black to move) of the positions Black's last king move came from"""
+    g = geometry()
+    found = []
+    for d in range(8):
+        origin = g['king'][squares[1], d]
+        keep = origin >= 0
+        for index, square in enumerate(squares):
+            if index != 1:
+                keep &= origin != square
+        moved = [square[keep] for square in squares]
+        moved[1] = origin[keep]
+        found.append(encode(False, moved))
+    return np.concatenate(found)
+
+
+def promotion_wins(pieces, half, values, directory):
+    """{ply: White to move indices} of positions won by promoting into a table already built"""
+    if 'p' not in pieces:
+        return {}
+    promoted = pieces.replace('p', 'Q')
+    target = Tablebase(os.path.join(directory, table_name(promoted) + ".ctb"))
+    promoted_values = np.frombuffer(target.data, dtype=np.uint8, offset=HEADER.size)
+    try:
+        pawn = 2 + pieces.index('p')
+        indices = np.nonzero(values[:half] == DRAW)[0]
+        _, squares = decode(indices, 2 + len(pieces))
+        queen = squares[pawn] - 8
+        keep = squares[pawn] < 16
+        for index, square in enumerate(squares):
+            if index != pawn:
+                keep &= square != queen
+        after = list(squares)
+        after[pawn] = queen
+        # Sort the promoted queen into its table's piece order
+        order = sorted(range(2, len(after)), key=lambda j: PIECE_ORDER.index(promoted[j - 2]))
+        after = after[:2] + [after[j] for j in order]
+        result = promoted_values[encode(False, [s[keep] for s in after])].astype(np.int64)
+        lost = (result != DRAW) & (result != ILLEGAL)
+        wins = {}
+        for index, value in zip(indices[keep][lost], result[lost]):
+            wins.setdefault(int(value), []).append(index)
+        return {ply: np.array(found, dtype=np.int64) for ply, found in wins.items()}
+    finally:
+        del promoted_values
+        target.close()
+
+
+def chunks(indices, size=1 << 18):
+    """Slices of a frontier small enough to expand without holding every predecessor at once"""
+    return [indices[start:start + size] for start in range(0, len(indices), size)]
+
+
+def generate(pieces, directory=TABLEBASE_DIR, workers=None, log=print):
+    """Build the table for White's king + pieces against the lone black king and write it"""
+    require_numpy()
+    name = table_name(pieces)
+    count = 2 + len(pieces)
+    half = 64 ** count  # Positions per side to move
+    start = time.time()
+
+    jobs = [(pieces, white_to_move, king) for white_to_move in (True, False) for king in range(64)]
+    with multiprocessing.Pool(workers) as pool:
+        slices = pool.map(analyse_slice, jobs)
+    values = np.frombuffer(b"".join(part for part, _ in slices), dtype=np.uint8).copy()
+    counts = np.frombuffer(b"".join(part for _, part in slices[64:]), dtype=np.uint8).copy()
+    del slices
+    log(f"{name}: analysed {2 * half} positions in {time.time() - start:.1f}s")
+
+    external = promotion_wins(pieces, half, values, directory)
+    black_values = values[half:]
+    lost = np.nonzero(black_values == 1)[0]
+    ply = 0
+    while len(lost) or any(p > ply for p in external):
+        # White to move: won when a move reaches a lost position (or promotes into one)
+        ply += 1
+        won = [white_unmoves(pieces, decode(chunk + half, count)[1]) for chunk in chunks(lost)]
+        if ply in external:
+            won.append(external.pop(ply))
+        won = np.unique(np.concatenate(won or [np.zeros(0, dtype=np.int64)]))
+        won = won[values[won] == DRAW]
+        values[won] = ply + 1
+
+        # Black to move: lost when every king move reaches a won position
+        ply += 1
+        before = np.concatenate([black_unmoves(pieces, decode(chunk, count)[1]) for chunk in chunks(won)]
+                                or [np.zeros(0, dtype=np.int64)]) - half
+        before = before[black_values[before] == DRAW]
+        np.subtract.at(counts, before, 1)
+        before = np.unique(before)
+        lost = before[(counts[before] == 0) & (black_values[before] == DRAW)]
+        black_values[lost] = ply + 1
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name + ".ctb")
+    with open(path + ".tmp", 'wb') as f:
+        f.write(HEADER.pack(MAGIC, name.encode('ascii'), int(values[values != ILLEGAL].max()) - 1))
+        f.write(values.tobytes())
+    os.replace(path + ".tmp", path)
+    legal = values != ILLEGAL
+    log(f"{name}: {int((legal & (values > 0)).sum())} of {int(legal.sum())} legal positions decisive, "
+        f"longest mate {int(values[legal].max()) - 1} plies, {time.time() - start:.1f}s -> {path}")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases")
+    parser.add_argument('tables', nargs='*', default=list(TABLES), help="Tables to build (default: all)")
+    parser.add_argument('--out', default=TABLEBASE_DIR)
+    parser.add_argument('--workers', type=int, default=None, help="Pool size (default: one per CPU)")
+    args = parser.parse_args()
+
+    wanted = [name.upper() for name in args.tables]
+    # Build what a pawn promotes into first, if it is not there yet
+    for name in list(wanted):
+        dependency = DEPENDENCIES.get(name)
+        if dependency and dependency not in wanted[:wanted.index(name)] \
+                and not os.path.exists(os.path.join(args.out, dependency + ".ctb")):
+            wanted.insert(wanted.index(name), dependency)
+    for name in wanted:
+        if name not in TABLES:
+            parser.error(f"unknown table {name} (choose from {', '.join(TABLES)})")
+        generate(TABLES[name], args.out, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Time Management - Game clocks and the engine's thinking time per move.
+
+A TimeControl is a base time plus an increment, optionally with a number of
+moves per period after which the base time is added again (e.g. 40/90+30).
+GameClock runs one for each side. TimeManager turns the time left on a clock
+into two limits for every move: a soft limit checked between iterations,
+stretched while the best move keeps changing and cut short once it has
+settled, and a hard limit at which the search is interrupted, kept well inside
+the clock so the engine never loses on time.
+
+Set CHESS_TIME_LOG=<path> to append every timed decision as a JSON line.
+"""
+
+import json
+import os
+import time
+
+DEFAULT_HORIZON = 30  # Moves assumed to be left in the game when the period length is unknown
+MOVE_OVERHEAD = 0.05  # Seconds kept back for GUI and process latency on every move
+MIN_THINK = 0.01
+MAX_STRETCH = 3.0  # Hard limit as a multiple of the soft one
+HARD_FRACTION = 0.5  # Of the remaining time; 0.9 when this is the last move of the period
+INCREMENT_USE = 0.8
+
+STABLE_ITERATIONS = 3  # Unchanged best moves after which the soft limit is cut
+STABLE_SCALE = 0.5
+INSTABILITY_WEIGHT = 0.6  # Soft limit stretch per recent change of the best move
+SCORE_DROP = 50  # Centipawns lost since the last iteration that call for more time
+SCORE_DROP_SCALE = 1.5
+ITERATION_GROWTH = 3.0  # How much longer the next iteration is expected to take than the last
+
+
+class TimeControl:
+    """Base time and increment in seconds, with the base added again every moves_per_period moves"""
+
+    def __init__(self, base, increment=0.0, moves_per_period=None):
+        self.base = base
+        self.increment = increment
+        self.moves_per_period = moves_per_period
+
+    @classmethod
+    def parse(cls, text):
+        """Build a control from '5+3' (minutes + seconds) or '40/90+30' (moves / minutes + seconds)"""
+        moves_per_period = None
+        if '/' in text:
+            moves, text = text.split('/', 1)
+            moves_per_period = int(moves)
+        minutes, _, increment = text.partition('+')
+        return cls(float(minutes) * 60, float(increment or 0), moves_per_period)
+
+    def __str__(self):
+        text = f"{self.base / 60:g}+{self.increment:g}"
+        return f"{self.moves_per_period}/{text}" if self.moves_per_period else text
+
+
+class GameClock:
+    """
+    Chess clock for both sides, keyed by white (True) or black (False). A side's clock
+    runs from start() or the opponent's press() until its own press().
+    """
+
+    def __init__(self, control):
+        self.control = control
+        self.remaining = {True: control.base, False: control.base}
+        self.moves = {True: 0, False: 0}
+        self.running = None  # Side whose clock is running, if any
+        self.turn_start = 0.0
+        self.flagged = None  # Side that ran out of time
+
+    def start(self, white):
+        """Run one side's clock, charging the time used so far to the side that was running"""
+        self.stop()
+        self.running = white
+        self.turn_start = time.time()
+
+    def stop(self):
+        if self.running is not None:
+            white, self.running = self.running, None
+            self.remaining[white] -= time.time() - self.turn_start
+            self.check_flag(white)
+
+    def press(self, white):
+        """White or black completed a move: add the increment and start the opponent's clock"""
+        if self.running == white:
+            self.remaining[white] -= time.time() - self.turn_start
+            self.running = None
+        if self.check_flag(white):
+            return
+        self.moves[white] += 1
+        self.remaining[white] += self.control.increment
+        period = self.control.moves_per_period
+        if period and self.moves[white] % period == 0:
+            self.remaining[white] += self.control.base
+        self.start(not white)
+
+    def time_left(self, white):
+        """Seconds left for a side, including the move in progress"""
+        left = self.remaining[white]
+        if self.running == white:
+            left -= time.time() - self.turn_start
+        return left
+
+    def check_flag(self, white):
+        """Mark a side that has run out of time; returns whether it has"""
+        if self.flagged is None and self.time_left(white) <= 0:
+            self.flagged = white
+            self.running = None
+        return self.flagged == white
+
+    def moves_to_go(self, white):
+        """Moves left in the side's current period, or None without periods"""
+        period = self.control.moves_per_period
+        return period - self.moves[white] % period if period else None
+
+    def search_limits(self, white):
+        """Keyword arguments for ChessSearch.SearchLimits describing this clock (times in ms)"""
+        return {
+            'wtime': max(0, int(self.time_left(True) * 1000)),
+            'btime': max(0, int(self.time_left(False) * 1000)),
+            'winc': int(self.control.increment * 1000),
+            'binc': int(self.control.increment * 1000),
+            'movestogo': self.moves_to_go(white),
+        }
+
+
+def format_clock(seconds):
+    """Clock display like 4:05, or 0:09.3 under ten seconds"""
+    seconds = max(0.0, seconds)
+    if seconds < 10:
+        return f"0:{seconds:04.1f}"
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def allocate(remaining, increment=0.0, moves_to_go=None):
+    """(soft, hard) seconds for one move with `remaining` seconds on the clock"""
+    usable = max(0.0, remaining - MOVE_OVERHEAD)
+    horizon = moves_to_go or DEFAULT_HORIZON
+    hard = usable * (0.9 if moves_to_go == 1 else HARD_FRACTION)
+    soft = usable / horizon + increment * INCREMENT_USE
+    hard = max(MIN_THINK, min(hard, soft * MAX_STRETCH))
+    return max(MIN_THINK, min(soft, hard)), hard
+
+
+class TimeManager:
+    """
+    Decides how long each search may run. start() sets the limits for a move,
+    iteration_done() is asked after every completed depth whether to stop, and
+    finish() logs the decision.
+    """
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self.soft = None
+        self.hard = None
+        self.record = None
+
+    @classmethod
+    def from_environment(cls):
+        """Manager logging to CHESS_TIME_LOG when it is set"""
+        return cls(os.environ.get('CHESS_TIME_LOG'))
+
+    def start(self, limits, white_to_move):
+        """Set the limits for a search; returns the hard limit in seconds, or None when untimed"""
+        self.best_move = None
+        self.best_score = None
+        self.stable = 0
+        self.instability = 0.0
+        self.changes = 0
+        self.last_elapsed = 0.0
+        self.scale = 1.0
+        self.reason = None
+        self.record = None
+        if limits.infinite:
+            self.soft = self.hard = None
+        elif limits.movetime is not None:
+            self.soft = self.hard = limits.movetime / 1000
+        elif (limits.wtime if white_to_move else limits.btime) is None:
+            self.soft = self.hard = None
+        else:
+            remaining = (limits.wtime if white_to_move else limits.btime) / 1000
+            increment = (limits.winc if white_to_move else limits.binc) / 1000
+            self.soft, self.hard = allocate(remaining, increment, limits.movestogo)
+            self.record = {'side': 'white' if white_to_move else 'black', 'remaining': remaining,
+                           'increment': increment, 'movestogo': limits.movestogo}
+        return self.hard
+
+    def iteration_done(self, depth, best_move, score, elapsed):
+        """Whether to stop after a completed iteration with this best move (moveID) and score"""
+        if self.best_move is not None and best_move != self.best_move:
+            self.changes += 1
+            self.stable = 0
+            self.instability = self.instability / 2 + 1
+        else:
+            self.stable += 1
+            self.instability /= 2
+        dropped = self.best_score is not None and score < self.best_score - SCORE_DROP
+        self.best_move, self.best_score = best_move, score
+        iteration = elapsed - self.last_elapsed
+        self.last_elapsed = elapsed
+        if self.soft is None:
+            return False
+
+        if self.record is None:  # A fixed movetime is used in full
+            scale = 1.0
+        else:
+            scale = 1 + INSTABILITY_WEIGHT * self.instability
+            if self.stable >= STABLE_ITERATIONS:
+                scale *= STABLE_SCALE
+            if dropped:
+                scale *= SCORE_DROP_SCALE
+        self.scale = scale
+        if elapsed >= min(self.soft * scale, self.hard):
+            self.reason = 'stable' if scale < 1 and elapsed < self.soft else 'soft limit'
+            return True
+        # Don't start an iteration the hard limit would cut off long before it finishes
+        if self.record is not None and elapsed + iteration * ITERATION_GROWTH > self.hard:
+            self.reason = 'next iteration'
+            return True
+        return False
+
+    def finish(self, result, reason):
+        """Log a timed search and why it ended ('stable', 'soft limit', 'hard limit', 'depth', ...)"""
+        if self.record is None or not self.log_path:
+            return
+        record = dict(self.record, soft=round(self.soft, 3), hard=round(self.hard, 3),
+                      scale=round(self.scale, 2), depth=result.depth, elapsed=round(result.elapsed, 3),
+                      nodes=result.nodes, best_changes=self.changes, reason=reason,
+                      timestamp=time.time())
+        try:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Could not write time log: {e}")
@@ -0,0 +1,265 @@
+"""
+Evaluation Tuning - Fits piece values and piece-square tables to game results (Texel's method).
+
+Quiet positions are taken from saved games together with how each game
+ended. The static evaluation turned into an expected result,
+1 / (1 + 10^(-k * eval / 400)), should match those results as closely as
+possible, so the weights are moved down the gradient of the mean squared
+error. Material plus piece-square terms are one lookup per square in
+ChessBatch's (13, 64) value table, so the whole set is scored, and the
+gradient for every table entry collected, by 64 NumPy lookups and bincounts
+per step; pawn structure is not tuned and is stored per position as a
+constant. Positions are extracted once, across a process pool, and can be
+kept in a .npz file for further runs.
+
+Run from the Chess directory (needs NumPy):
+
+    python ChessTune.py chess_games.json games.pgn --cache positions.npz --steps 500
+    python ChessTune.py --cache positions.npz --out eval_weights.json
+
+The weights file is picked up by ChessEval the next time the engine starts.
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import ChessBatch
+import ChessEngine
+import ChessEval
+import ChessExplorer
+import ChessPawns
+import ChessPuzzles
+
+KINDS = 'pNBRQK'  # Order of ChessBatch piece codes 1-6 (white) and 7-12 (black)
+RESULT_SCORES = {"1-0": 1.0, "1/2-1/2": 0.5, "0-1": 0.0}
+SKIP_PLIES = 8  # Opening moves left out; they say more about the book than the evaluation
+DEFAULT_STEPS = 300
+LEARNING_RATE = 1.0  # Centipawns per Adam step
+VALIDATION_SHARE = 0.1
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("Tuning needs NumPy (pip install numpy)")
+
+
+# Extraction
+
+def is_quiet(gs):
+    """Not in check, and no capture or promotion that gains material"""
+    if gs.inCheck():
+        return False
+    for move in gs.getAllPossibleMoves():
+        if move.isPawnPromotion:
+            return False
+        if move.pieceCaptured != '--' and gs.staticExchangeEvaluation(move) > 0:
+            return False
+    return True
+
+
+def extract_game(job):
+    """(board bytes, pawn scores) of a game's quiet positions; runs in a pool worker"""
+    fen, moves = job
+    gs = ChessEngine.GameState()
+    if fen:
+        gs.loadFen(fen)
+    boards = []
+    pawns = []
+    for ply, notation in enumerate(moves):
+        if ply >= SKIP_PLIES and is_quiet(gs):
+            boards.append("".join(map("".join, gs.board)))
+            pawns.append(ChessPawns.evaluate_pawns(gs))
+        # The games were legal when they were saved, so moves are replayed unchecked
+        move = ChessExplorer.trusted_move(gs, notation)
+        if move is None:
+            break
+        gs.makeMove(move)
+    return "".join(boards).encode('ascii'), pawns
+
+
+def extract(paths, workers=None, log=print):
+    """
+    Dict of arrays for every quiet position of the decided and drawn games in paths:
+    'codes' (N, 64) int8 ChessBatch piece codes, 'pawns' (N,) white's pawn-structure
+    score and 'results' (N,) white's result
+    """
+    require_numpy()
+    games = [(fen, moves, RESULT_SCORES[result])
+             for path in paths for _, fen, moves, result in ChessPuzzles.read_games(path)
+             if result in RESULT_SCORES]
+    start = time.time()
+    chunks, pawns, results = [], [], []
+    with multiprocessing.Pool(workers) as pool:
+        jobs = [(fen, moves) for fen, moves, _ in games]
+        for (fen, moves, result), (boards, game_pawns) in zip(games, pool.imap(extract_game, jobs, chunksize=16)):
+            chunks.append(boards)
+            pawns.extend(game_pawns)
+            results.extend([result] * len(game_pawns))
+    names = np.frombuffer(b"".join(chunks), dtype='<u2')
+    codes = ChessBatch.tables()['codes'][names].reshape(-1, 64)
+    log(f"{len(codes)} quiet positions from {len(games)} games in {time.time() - start:.1f}s")
+    return {'codes': codes, 'pawns': np.array(pawns, dtype=np.float64),
+            'results': np.array(results, dtype=np.float64)}
+
+
+# Tuning
+
+class TexelTuner:
+    """
+    Weights of the linear evaluation: values (6,) by KINDS and piece-square tables
+    (6, 64) from white's side, square r * 8 + c as in GameState.board. Black uses the
+    vertically mirrored square (square ^ 56) with the opposite sign.
+    """
+
+    def __init__(self, codes, pawns, results):
+        require_numpy()
+        self.columns = np.ascontiguousarray(codes.T)  # (64, N): one square of every position per row
+        self.pawns = pawns
+        self.results = results
+        self.values = np.array([ChessEval.PIECE_VALUES[kind] for kind in KINDS], dtype=np.float64)
+        self.tables = np.array([np.ravel(ChessEval.PIECE_SQUARE_TABLES[kind]) for kind in KINDS], dtype=np.float64)
+        self.k = 1.0
+        self.mirror = np.arange(64) ^ 56
+
+    def value_table(self):
+        """(13, 64) ChessBatch value table for the current weights"""
+        table = np.zeros((13, 64))
+        table[1:7] = self.values[:, None] + self.tables
+        table[7:13] = -(self.values[:, None] + self.tables[:, self.mirror])
+        return table
+
+    def evaluate(self, columns=None, pawns=None):
+        """(N,) white's scores in centipawns"""
+        columns = self.columns if columns is None else columns
+        table = self.value_table()
+        scores = (self.pawns if pawns is None else pawns).copy()
+        for square in range(64):
+            scores += table[columns[square], square]
+        return scores
+
+    def expected(self, scores, k=None):
+        return 1 / (1 + 10 ** (-(self.k if k is None else k) * scores / 400))
+
+    def loss(self, scores=None, results=None, k=None):
+        scores = self.evaluate() if scores is None else scores
+        results = self.results if results is None else results
+        return float(np.mean((results - self.expected(scores, k)) ** 2))
+
+    def fit_k(self):
+        """Scale of the sigmoid that best explains the results with the starting weights"""
+        scores = self.evaluate()
+        candidates = np.linspace(0.1, 3.0, 59)
+        self.k = float(min(candidates, key=lambda k: self.loss(scores, k=k)))
+        return self.k
+
+    def gradient(self):
+        """(loss, value gradient, table gradient) over the whole set"""
+        scores = self.evaluate()
+        expected = self.expected(scores)
+        error = self.results - expected
+        # d loss / d score for every position
+        slope = -2 * error * expected * (1 - expected) * self.k * np.log(10) / 400 / len(scores)
+        by_entry = np.zeros((13, 64))
+        for square in range(64):
+            by_entry[:, square] = np.bincount(self.columns[square], weights=slope, minlength=13)
+        value_gradient = by_entry[1:7].sum(axis=1) - by_entry[7:13].sum(axis=1)
+        value_gradient[KINDS.index('K')] = 0  # Both sides always have a king
+        table_gradient = by_entry[1:7] - by_entry[7:13][:, self.mirror]
+        return float(np.mean(error ** 2)), value_gradient, table_gradient
+
+    def tune(self, steps=DEFAULT_STEPS, learning_rate=LEARNING_RATE, log=print):
+        """Adam steps over the whole set; returns the loss after each step"""
+        parameters = [self.values, self.tables]
+        moments = [np.zeros_like(p) for p in parameters]
+        squares = [np.zeros_like(p) for p in parameters]
+        beta1, beta2, epsilon = 0.9, 0.999, 1e-12
+        history = []
+        for step in range(1, steps + 1):
+            loss, *gradients = self.gradient()
+            history.append(loss)
+            for parameter, gradient, moment, square in zip(parameters, gradients, moments, squares):
+                moment *= beta1
+                moment += (1 - beta1) * gradient
+                square *= beta2
+                square += (1 - beta2) * gradient ** 2
+                step_size = learning_rate * np.sqrt(1 - beta2 ** step) / (1 - beta1 ** step)
+                parameter -= step_size * moment / (np.sqrt(square) + epsilon)
+            if step % 50 == 0 or step == steps:
+                log(f"step {step}: loss {loss:.6f}")
+        return history
+
+    def weights(self):
+        """
+        Rounded weights in the eval_weights.json layout. Each table is shifted to average
+        zero over the squares its piece can stand on, the shift going into the value.
+        """
+        values = {}
+        tables = {}
+        for index, kind in enumerate(KINDS):
+            table = self.tables[index].reshape(8, 8).copy()
+            rows = slice(1, 7) if kind == 'p' else slice(0, 8)
+            mean = table[rows].mean()
+            table[rows] -= mean
+            values[kind] = 0 if kind == 'K' else int(round(self.values[index] + mean))
+            tables[kind] = np.rint(table).astype(int).tolist()
+        return {'piece_values': values, 'piece_square_tables': tables}
+
+
+def split(data, share=VALIDATION_SHARE, seed=0):
+    """(training, validation) dicts of a random split of the positions"""
+    order = np.random.default_rng(seed).permutation(len(data['results']))
+    cut = int(len(order) * (1 - share))
+    pick = lambda rows: {name: array[rows] for name, array in data.items()}
+    return pick(order[:cut]), pick(order[cut:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune evaluation weights on game results")
+    parser.add_argument('inputs', nargs='*', help="chess_games.json, .pgn or .bcg files to extract positions from")
+    parser.add_argument('--cache', help="Positions .npz: written after extracting, read when no inputs are given")
+    parser.add_argument('--out', default=ChessEval.WEIGHTS_PATH)
+    parser.add_argument('--steps', type=int, default=DEFAULT_STEPS)
+    parser.add_argument('--rate', type=float, default=LEARNING_RATE)
+    parser.add_argument('--workers', type=int, default=None, help="Extraction pool size (default: one per CPU)")
+    args = parser.parse_args()
+    require_numpy()
+
+    if args.inputs:
+        data = extract(args.inputs, args.workers)
+        if args.cache:
+            np.savez_compressed(args.cache, **data)
+    elif args.cache:
+        with np.load(args.cache) as cached:
+            data = {name: cached[name] for name in cached.files}
+    else:
+        parser.error("give game files to extract positions from, or --cache")
+    if not len(data['results']):
+        parser.error("no quiet positions from decided or drawn games")
+
+    training, validation = split(data)
+    tuner = TexelTuner(**training)
+    print(f"k = {tuner.fit_k():.2f}, training on {len(training['results'])} positions")
+    validation_before = tuner.loss(tuner.evaluate(validation['codes'].T, validation['pawns']), validation['results'])
+    start = time.time()
+    tuner.tune(args.steps, args.rate)
+    elapsed = time.time() - start
+    validation_after = tuner.loss(tuner.evaluate(validation['codes'].T, validation['pawns']), validation['results'])
+
+    weights = tuner.weights()
+    weights.update(k=tuner.k, positions=len(data['results']), validation_loss=validation_after)
+    with open(args.out, 'w') as f:
+        json.dump(weights, f)
+    print(f"{args.steps} steps in {elapsed:.1f}s; validation loss {validation_before:.6f} -> {validation_after:.6f}")
+    print("Piece values: " + ", ".join(f"{kind} {value}" for kind, value in weights['piece_values'].items()))
+    print(f"Weights written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+UCI front end - Drives GameState and the searcher over stdin/stdout for headless play.
+
+Run from the Chess directory:  python ChessUci.py
+"""
+
+import sys
+import threading
+
+import ChessEngine
+import ChessSearch
+import ChessSmp
+import ChessSolver
+import ChessStats
+
+ENGINE_NAME = "BadChessEngine"
+ENGINE_AUTHOR = "hsikelias"
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+MAX_THREADS = 64
+MAX_HASH_MB = 1024
+MAX_MULTIPV = 10
+
+# Check options switching the selective search features on and off
+FEATURE_OPTIONS = {"PVS": 'pvs', "AspirationWindows": 'aspiration', "NullMove": 'null_move',
+                   "LMR": 'lmr', "Futility": 'futility', "SEE": 'see'}
+
+
+def format_score(score):
+    """UCI score field for a centipawn or mate score"""
+    if ChessSearch.is_mate_score(score):
+        plies = ChessSearch.MATE_SCORE - abs(score)
+        moves = (plies + 1) // 2
+        return f"mate {moves if score > 0 else -moves}"
+    return f"cp {score}"
+
+
+class UciEngine:
+    """Parses UCI commands and runs searches in a background thread"""
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.gs = ChessEngine.GameState()
+        self.threads = 1
+        self.hash_mb = ChessSearch.TT_DEFAULT_MB
+        self.multipv = 1
+        self.features = set(ChessSearch.SELECTIVE_FEATURES)
+        self.searcher = ChessSearch.Searcher()
+        self.mate_solver = ChessSolver.MateSolver()  # For 'go mate N'
+        self.search_thread = None
+        self.ponder_wait = threading.Event()  # Holds back bestmove until ponderhit or stop
+
+    def send(self, line):
+        """Write one line to the GUI"""
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self, stream=sys.stdin):
+        """Read commands until 'quit' or end of input"""
+        for line in stream:
+            if not self.handle(line.strip()):
+                break
+        self.stop_search()
+        if isinstance(self.searcher, ChessSmp.ParallelSearcher):
+            self.searcher.close()
+
+    def handle(self, line):
+        """Handle one command line; returns False when the engine should exit"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self.send(f"option name Hash type spin default {ChessSearch.TT_DEFAULT_MB} min 1 max {MAX_HASH_MB}")
+            self.send(f"option name MultiPV type spin default 1 min 1 max {MAX_MULTIPV}")
+            self.send("option name Ponder type check default false")
+            for option in FEATURE_OPTIONS:
+                self.send(f"option name {option} type check default true")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.stop_search()
+            self.set_option(args)
+        elif command == "ucinewgame":
+            self.stop_search()
+            self.gs = ChessEngine.GameState()
+            self.make_searcher()
+        elif command == "position":
+            self.stop_search()
+            self.set_position(args)
+        elif command == "go":
+            self.stop_search()
+            self.start_search(self.parse_limits(args))
+        elif command == "ponderhit":
+            self.searcher.ponderhit()
+            self.ponder_wait.set()
+        elif command == "stop":
+            self.stop_search()
+        elif command == "quit":
+            return False
+        return True
+
+    def set_option(self, args):
+        """Handle 'setoption name <name> value <value>' for Threads, Hash, MultiPV, Ponder and the features"""
+        if "name" not in args or "value" not in args:
+            return
+        name = " ".join(args[args.index("name") + 1:args.index("value")]).lower()
+        if name == "ponder":
+            return  # Only tells us the GUI may send 'go ponder'; nothing to configure
+        features = {option.lower(): feature for option, feature in FEATURE_OPTIONS.items()}
+        if name in features:
+            enabled = args[args.index("value") + 1:] == ["true"]
+            if enabled:
+                self.features.add(features[name])
+            else:
+                self.features.discard(features[name])
+            self.searcher.features = set(self.features)
+            return
+        try:
+            value = int(args[args.index("value") + 1])
+        except (IndexError, ValueError):
+            self.send(f"info string bad value for {name}")
+            return
+        if name == "threads":
+            self.threads = max(1, min(MAX_THREADS, value))
+        elif name == "hash":
+            self.hash_mb = max(1, min(MAX_HASH_MB, value))
+        elif name == "multipv":
+            self.multipv = max(1, min(MAX_MULTIPV, value))
+            return
+        else:
+            self.send(f"info string unknown option {name}")
+            return
+        self.make_searcher()
+
+    def make_searcher(self):
+        """Replace the searcher (and its hash table) to match the current options"""
+        if isinstance(self.searcher, ChessSmp.ParallelSearcher):
+            self.searcher.close()
+        if self.threads > 1:
+            self.searcher = ChessSmp.ParallelSearcher(self.threads, self.hash_mb, self.features)
+        else:
+            self.searcher = ChessSearch.Searcher(ChessSearch.TranspositionTable(self.hash_mb), features=self.features)
+
+    def set_position(self, args):
+        """Handle 'position startpos|fen <fen> [moves ...]'; a bad FEN or move keeps the previous position"""
+        if "moves" in args:
+            split = args.index("moves")
+            setup, moves = args[:split], args[split + 1:]
+        else:
+            setup, moves = args, []
+
+        gs = ChessEngine.GameState()
+        if setup and setup[0] == "fen":
+            try:
+                gs.loadFen(" ".join(setup[1:]))
+            except (ValueError, IndexError, KeyError):
+                gs = None
+            # The search needs exactly one king a side on a board of known pieces
+            if gs is None or any(sum(row.count(king) for row in gs.board) != 1 for king in ("wK", "bK")) \
+                    or any(piece != "--" and piece[1] not in "pRNBQK" for row in gs.board for piece in row):
+                self.send("info string bad fen")
+                return
+
+        for notation in moves:
+            # Promotions always make a queen in GameState, so the suffix is ignored
+            move = gs.get_move_from_notation(notation[:4])
+            if move is None:
+                self.send(f"info string illegal move {notation}")
+                return
+            gs.makeMove(move)
+        self.gs = gs
+
+    def parse_limits(self, args):
+        """Turn the arguments of 'go' into SearchLimits; a limit without a usable number is skipped"""
+        limits = ChessSearch.SearchLimits(multipv=self.multipv)
+        fields = {"wtime", "btime", "winc", "binc", "movestogo", "movetime", "depth", "nodes", "mate"}
+        i = 0
+        while i < len(args):
+            name = args[i]
+            if name in fields:
+                try:
+                    setattr(limits, name, int(args[i + 1]))
+                except (IndexError, ValueError):
+                    self.send(f"info string bad value for {name}")
+                    i += 1
+                    continue
+                i += 2
+                continue
+            if name == "infinite":
+                limits.infinite = True
+            elif name == "ponder":
+                limits.ponder = True
+            i += 1
+        return limits
+
+    def start_search(self, limits):
+        """Search the current position in a background thread"""
+        self.ponder_wait.clear()
+        self.search_thread = threading.Thread(target=self.search, args=(limits,), daemon=True)
+        self.search_thread.start()
+
+    def stop_search(self):
+        """Stop a running search and wait for its bestmove to be sent"""
+        if self.search_thread and self.search_thread.is_alive():
+            self.searcher.stop()
+            self.mate_solver.stop()
+            self.ponder_wait.set()
+            self.search_thread.join()
+        self.search_thread = None
+
+    def search(self, limits):
+        if limits.mate:
+            found = self.mate_solver.solve(self.gs, limits.mate)
+            # The table may have dropped the proof's children, leaving no line to play
+            if found.mate and found.moves:
+                self.send(f"info depth {len(found.moves)} score mate {found.mate_in} nodes {found.nodes} "
+                          f"time {int(found.elapsed * 1000)} pv {' '.join(m.getUciNotation() for m in found.moves)}")
+                self.send_bestmove(found.moves[0], found.moves[1] if len(found.moves) > 1 else None)
+                return
+            if found.mate:
+                self.send("info string mate found but its line was dropped from the table, searching")
+            else:
+                self.send(f"info string {found}")
+            if found.mate is None and self.mate_solver.stop_event.is_set():
+                limits = ChessSearch.SearchLimits(depth=1)  # Stopped: just find a move to play
+            elif not (limits.depth or limits.movetime or limits.nodes or limits.wtime or limits.btime
+                      or limits.infinite):
+                # A mate in N lies within 2N plies, and nothing else bounds this search
+                limits.depth = 2 * limits.mate
+        result = self.searcher.search(self.gs, limits, self.send_info)
+        if limits.ponder:
+            # UCI forbids bestmove while pondering, even when the search has finished
+            self.ponder_wait.wait()
+        for index in range(len(result.lines)):
+            self.send_info(result, index)
+        for worker_id, depth, nodes, seconds, nps in getattr(self.searcher, 'worker_stats', []):
+            self.send(f"info string worker {worker_id} depth {depth} nodes {nodes} nps {nps}")
+        if result.stats:
+            counters = " ".join(f"{name} {count}" for name, count in result.stats.items())
+            self.send(f"info string selective {counters}")
+        self.send_bestmove(result.best_move, result.pv[1] if len(result.pv) > 1 else None)
+
+    def send_bestmove(self, best_move, ponder_move=None):
+        best = best_move.getUciNotation() if best_move else "0000"
+        if ponder_move:
+            self.send(f"bestmove {best} ponder {ponder_move.getUciNotation()}")
+        else:
+            self.send(f"bestmove {best}")
+
+    def send_info(self, result, index=-1):
+        """Report one line of a result, by default the newest (multi-PV lines arrive one at a time)"""
+        score, pv = result.lines[index]
+        number = index + 1 if index >= 0 else len(result.lines)
+        multipv = f"multipv {number} " if self.multipv > 1 else ""
+        moves = " ".join(move.getUciNotation() for move in pv)
+        self.send(f"info depth {result.depth} {multipv}score {format_score(score)} nodes {result.nodes} "
+                  f"nps {result.nps} time {int(result.elapsed * 1000)} pv {moves}")
+
+
+def main():
+    ChessStats.enable_from_environment()
+    UciEngine().run()
+    ChessStats.stop_dump()
+
+
+if __name__ == "__main__":
+    main()
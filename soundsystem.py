@@ -1,5 +1,11 @@
 import pygame
 import os
+import sys
+
+# The Chess modules import each other by plain name, so their folder goes on the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Chess"))
+
+from ChessSounds import SOUND_FILES, SoundBank, sound_for_move
 
 
 def test_sound_system():
@@ -10,111 +16,47 @@ def test_sound_system():
     pygame.mixer.init()
     pygame.init()
 
+    bank = SoundBank()
     print("Pygame mixer initialized:", pygame.mixer.get_init())
-    print("Sound folder exists:", os.path.exists("sounds"))
+    print("Sound folder exists:", os.path.exists(bank.sounds_dir))
 
-    # List all files in sounds folder
-    if os.path.exists("sounds"):
-        sound_files = os.listdir("sounds")
-        print("Files in sounds folder:", sound_files)
+    # Try to play every known sound
+    for sound_name, filename in SOUND_FILES.items():
+        if not bank.available(sound_name):
+            print(f"✗ Missing: {filename}")
+            continue
+        bank.play(sound_name)
+        print(f"✓ Played: {filename}")
+        pygame.time.wait(500)  # Wait 500ms
 
-        # Try to load each sound file
-        for file in sound_files:
-            if file.endswith('.wav'):
-                try:
-                    sound_path = os.path.join("sounds", file)
-                    sound = pygame.mixer.Sound(sound_path)
-                    print(f"✓ Successfully loaded: {file}")
 
-                    # Test playing the sound
-                    sound.play()
-                    pygame.time.wait(500)  # Wait 500ms
+class SoundManager:
+    """Compatibility wrapper around the shared ChessSounds sound bank"""
 
-                except Exception as e:
-                    print(f"✗ Failed to load {file}: {e}")
-    else:
-        print("Sounds folder not found!")
+    def __init__(self):
+        self.bank = SoundBank()
 
+    @property
+    def sound_enabled(self):
+        return self.bank.enabled
 
-# Proper sound loading class
-class SoundManager:
-    def __init__(self):
-        self.sounds = {}
-        self.sound_enabled = True
-        self.load_sounds()
+    @sound_enabled.setter
+    def sound_enabled(self, enabled):
+        self.bank.enabled = enabled
 
     def load_sounds(self):
-        """Load all chess sound effects"""
-        try:
-            # Make sure mixer is initialized
-            if not pygame.mixer.get_init():
-                pygame.mixer.pre_init(frequency=44100, size=-16, channels=2, buffer=512)
-                pygame.mixer.init()
-
-            sound_files = {
-                'move': 'move.wav',
-                'capture': 'capture.wav',
-                'check': 'check.wav',
-                'checkmate': 'checkmate.wav',
-                'stalemate': 'stalemate.wav',
-                'castle': 'castle.wav',
-                'promotion': 'promotion.wav',
-                'queen_sacrifice': 'queen_sacrifice.wav',
-                'rook_sacrifice': 'rook_sacrifice.wav',
-                'bishop_sacrifice': 'bishop_sacrifice.wav',
-                'knight_sacrifice': 'knight_sacrifice.wav',
-                'enpassant': 'enpassant.wav'
-            }
-
-            for sound_name, filename in sound_files.items():
-                try:
-                    sound_path = os.path.join("sounds", filename)
-                    if os.path.exists(sound_path):
-                        self.sounds[sound_name] = pygame.mixer.Sound(sound_path)
-                        print(f"Loaded: {filename}")
-                    else:
-                        print(f"Warning: {sound_path} not found")
-
-                except pygame.error as e:
-                    print(f"Error loading {filename}: {e}")
-                    self.sound_enabled = False
-
-        except Exception as e:
-            print(f"Sound system initialization failed: {e}")
-            self.sound_enabled = False
+        """Sounds are decoded on first use; this only makes sure the mixer is ready"""
+        self.bank.ensure_mixer()
 
     def play_sound(self, sound_name):
         """Play a sound effect"""
-        if self.sound_enabled and sound_name in self.sounds:
-            try:
-                self.sounds[sound_name].play()
-            except Exception as e:
-                print(f"Error playing {sound_name}: {e}")
+        self.bank.play(sound_name)
 
     def play_move_sound(self, move, game_state):
         """Play appropriate sound for the move made"""
-        if not self.sound_enabled:
-            return
-
-        # Check for piece sacrifices (when you lose a valuable piece)
-        if move.pieceCaptured != '--':
-            captured_piece = move.pieceCaptured[1]  # Get piece type (R, Q, B, N, p)
-
-            if captured_piece == 'Q':  # Queen captured - OH NO!
-                self.play_sound('queen_sacrifice')
-            elif captured_piece == 'R':  # Rook captured
-                self.play_sound('rook_sacrifice')
-            elif captured_piece == 'B':  # Bishop captured
-                self.play_sound('bishop_sacrifice')
-            elif captured_piece == 'N':  # Knight captured
-                self.play_sound('knight_sacrifice')
-            else:  # Regular capture (pawn)
-                self.play_sound('capture')
-        else:
-            # Regular move
-            self.play_sound('move')
+        self.bank.play(sound_for_move(move, game_state))
 
 
 # Test function - add this to your main file temporarily
 if __name__ == "__main__":
-    test_sound_system()
\ No newline at end of file
+    test_sound_system()